@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Measures cost of deadzone and curve modifiers, both per input and for
+creating them, as paid every time profile is parsed.
+
+LINEAR deadzone is computed without trigonometry; it's compared with
+previous computation through angle, and both are checked to give same
+results. curve() modifier is compared with its function computed for
+every input, together with time needed to sample it into table.
+
+Then, for every mode, deadzone applied to trigger and by gyroabs to
+gamepad axis is computed and looked up in TriggerTable and AxisTable.
+
+Usage: python3 benchmarks/bench_curves.py [input_count]
+"""
+import os, sys, time, random
+from math import sqrt, atan2, sin, cos
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import scc.actions
+from scc.constants import STICK_PAD_MIN, STICK_PAD_MAX, TRIGGER_MAX
+from scc.constants import CUT, ROUND, LINEAR, MINIMUM, POWER, SCURVE, POINTS
+from scc.modifiers import DeadzoneModifier, CurveModifier
+from scc.curves import AxisTable, SharedTable
+from scc.parser import ActionParser
+from scc.actions import Action, NoAction
+
+
+class Trigger(Action):
+	def trigger(self, mapper, position, old_position):
+		pass
+
+
+def old_linear(lower, upper):
+	""" LINEAR deadzone as computed before, 2D input only """
+	def convert(x, y, range):
+		distance = min(max(lower, sqrt(x*x + y*y)), upper)
+		distance = (distance - lower) / (upper - lower) * range
+		angle = atan2(x, y)
+		return distance * sin(angle), distance * cos(angle)
+	return convert
+
+
+def timed(fn, inputs):
+	start = time.perf_counter()
+	for x, y in inputs:
+		fn(x, y, STICK_PAD_MAX)
+	return time.perf_counter() - start
+
+
+def created(source):
+	""" Returns time needed to parse and compress action, in ms """
+	SharedTable._cache.clear()
+	start = time.perf_counter()
+	ActionParser(source).parse().compress()
+	return (time.perf_counter() - start) * 1000
+
+
+def main(count=200000):
+	rnd = random.Random(0)
+	inputs_2d = [ (rnd.randint(STICK_PAD_MIN, STICK_PAD_MAX),
+		rnd.randint(STICK_PAD_MIN, STICK_PAD_MAX)) for i in range(count) ]
+	inputs_2d = [ (x, y) for x, y in inputs_2d if y != 0 ]
+
+	for source in ("deadzone(LINEAR, 3000, 32767, XY(axis(ABS_X), axis(ABS_Y)))",
+			"curve(2, XY(axis(ABS_X), axis(ABS_Y)))"):
+		print("%-60s %6.2fms" % (source, created(source)))
+
+	old = old_linear(2000, 30000)
+	new = DeadzoneModifier(LINEAR, 2000, 30000, NoAction()).compress()
+	for x, y in inputs_2d[0:10000]:
+		a, b = old(x, y, STICK_PAD_MAX), new._convert(x, y, STICK_PAD_MAX)
+		if abs(a[0] - b[0]) > 1e-6 or abs(a[1] - b[1]) > 1e-6:
+			print("LINEAR: different results for %s, %s" % (x, y), file=sys.stderr)
+			return 1
+	t_old = timed(old, inputs_2d)
+	t_new = timed(new._convert, inputs_2d)
+	print("LINEAR  2D: angle %7.1fns   scaled %7.1fns   speedup %5.2fx" % (
+		t_old / len(inputs_2d) * 1e9, t_new / len(inputs_2d) * 1e9, t_old / t_new))
+
+	for params in ((POWER, 2.0), (SCURVE, 3.0), (POINTS, 0.2, 0.1, 0.5, 0.6)):
+		curve = CurveModifier(*(params + (NoAction(),)))
+		fn = CurveModifier._make_function(*params)
+		def exact(x, y):
+			# As table would do it without table
+			d = sqrt(x * x + y * y)
+			scale = fn(d) / d
+			return x * scale, y * scale
+		start = time.perf_counter()
+		curve._table.apply2(0, 1)
+		t_build = time.perf_counter() - start
+		t_exact = timed(lambda x, y, r: exact(x, y), inputs_2d)
+		t_table = timed(lambda x, y, r: curve._table.apply2(x, y), inputs_2d)
+		print("%-7s 2D: exact %7.1fns   table %7.1fns   speedup %5.2fx   (table built in %.2fms)" % (
+			params[0], t_exact / len(inputs_2d) * 1e9, t_table / len(inputs_2d) * 1e9,
+			t_exact / t_table, t_build * 1000))
+
+	triggers = [ rnd.randint(0, TRIGGER_MAX) for i in range(count) ]
+	axes = [ x for x, y in inputs_2d ]
+	for mode in (CUT, ROUND, LINEAR, MINIMUM):
+		exact = DeadzoneModifier(mode, 2000, 30000, Trigger())
+		table = DeadzoneModifier(mode, 2000, 30000, Trigger()).compress()
+		start = time.perf_counter()
+		for p in triggers:
+			exact.trigger(None, p, 0)
+		t_exact = time.perf_counter() - start
+		start = time.perf_counter()
+		for p in triggers:
+			table.trigger(None, p, 0)
+		t_table = time.perf_counter() - start
+		print("%-7s trigger: exact %7.1fns   table %7.1fns   speedup %5.2fx" % (
+			mode, t_exact / count * 1e9, t_table / count * 1e9, t_exact / t_table))
+
+		# As done by GyroAbsAction for every axis
+		convert = exact._convert
+		axis_table = AxisTable.get(DeadzoneModifier._make_axis_function, mode, 2000, 30000)
+		for x in axes[0:10000]:
+			if int(convert(x, 0, STICK_PAD_MAX)[0]) != int(axis_table.apply(x)):
+				print("%s: different results for %s" % (mode, x), file=sys.stderr)
+				return 1
+		start = time.perf_counter()
+		for x in axes:
+			val, trash = convert(x, 0, STICK_PAD_MAX)
+			val = int(val)
+		t_exact = time.perf_counter() - start
+		apply = axis_table.apply
+		start = time.perf_counter()
+		for x in axes:
+			val = int(apply(x))
+		t_table = time.perf_counter() - start
+		print("%-7s gyroabs: exact %7.1fns   table %7.1fns   speedup %5.2fx" % (
+			mode, t_exact / len(axes) * 1e9, t_table / len(axes) * 1e9, t_exact / t_table))
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main(*[ int(x) for x in sys.argv[1:2] ]))
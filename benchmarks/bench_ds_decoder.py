@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Measures how many input reports per second can be decoded by drivers for
+DualSense connected over bluetooth (hidraw) and DualShock 4 connected by
+cable.
+
+DualSense reports are decoded by decoder that DS5HidRawController used
+before report was unpacked at once and looked up in tables, and by
+current one. Both have to produce same states. DS4 reports are decoded by
+libhiddrv, measured for comparison.
+
+Without argument, reports with random sticks, buttons, gyro and touchpad
+are generated. Captured reports can be passed as file with raw reports
+read from hidraw device, for example with
+'dd if=/dev/hidrawX of=ds5.bin bs=78 count=10000'.
+
+Needs libhiddrv.so built by 'python3 setup.py build_ext --inplace'.
+
+Usage: python3 benchmarks/bench_ds_decoder.py [ds5_capture.bin]
+"""
+import os, sys, time, ctypes, random
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from scc.constants import SCButtons
+from scc.gyro import GyroProcessor
+from scc.drivers.ds5drv import DS5HidRawController, DualSenseBTControllerInput
+from scc.drivers.ds4drv import DS4Controller, VENDOR_ID, PRODUCT_ID
+
+DS5_REPORT_SIZE = 78
+DS4_REPORT_SIZE = 64
+COUNT = 20000
+FIELDS = [ name for name, t in DualSenseBTControllerInput._fields_ ]
+
+
+def generate(size, first, count=COUNT):
+	rnd = random.Random(0)
+	reports = []
+	for i in range(count):
+		report = bytearray(rnd.getrandbits(8) for x in range(size))
+		report[0] = first
+		reports.append(bytes(report))
+	return reports
+
+
+def load(filename):
+	with open(filename, "rb") as f:
+		data = f.read()
+	return [ data[i:i + DS5_REPORT_SIZE] for i in range(0, len(data), DS5_REPORT_SIZE)
+		if data[i] == 0x31 and len(data) - i >= DS5_REPORT_SIZE ]
+
+
+class OldDecoder(object):
+	""" Decoding done by DS5HidRawController before tables were added """
+
+	def __init__(self, controller):
+		self.controller = controller
+
+	def decode(self, data):
+		state = DualSenseBTControllerInput()
+		state.stick_x = DS5HidRawController._stick_axis_scale(data[2], False)
+		state.stick_y = DS5HidRawController._stick_axis_scale(data[3], True)
+		state.rpad_x = DS5HidRawController._stick_axis_scale(data[4], False)
+		state.rpad_y = DS5HidRawController._stick_axis_scale(data[5], True)
+		state.ltrig = data[6]
+		state.rtrig = data[7]
+		tempbyte = data[9]
+		if (tempbyte & (1 << 7)) != 0:
+			state.buttons |= SCButtons.Y
+		if (tempbyte & (1 << 6)) != 0:
+			state.buttons |= SCButtons.B
+		if (tempbyte & (1 << 5)) != 0:
+			state.buttons |= SCButtons.A
+		if (tempbyte & (1 << 4)) != 0:
+			state.buttons |= SCButtons.X
+		dpad_state = data[9] & 0x0F
+		if (dpad_state != 8):
+			state.buttons |= SCButtons.LPAD | SCButtons.LPADTOUCH
+			tempDPad = DS5HidRawController.DPAD_STATE_TYPES.get(dpad_state,
+				DS5HidRawController.DPAD_CENTERED_STATE)
+			state.lpad_x = tempDPad.x
+			state.lpad_y = tempDPad.y
+
+		tempbyte = data[10]
+		if (tempbyte & (1 << 7)) != 0:
+			state.buttons |= SCButtons.RPAD
+		if (tempbyte & (1 << 6)) != 0:
+			state.buttons |= SCButtons.STICKPRESS
+		if (tempbyte & (1 << 5)) != 0:
+			state.buttons |= SCButtons.START
+		if (tempbyte & (1 << 4)) != 0:
+			state.buttons |= SCButtons.BACK
+		if (tempbyte & (1 << 3)) != 0:
+			state.buttons |= SCButtons.RT
+		if (tempbyte & (1 << 2)) != 0:
+			state.buttons |= SCButtons.LT
+		if (tempbyte & (1 << 1)) != 0:
+			state.buttons |= SCButtons.RB
+		if (tempbyte & (1 << 0)) != 0:
+			state.buttons |= SCButtons.LB
+
+		tempbyte = data[11]
+		if (tempbyte & (1 << 0)) != 0:
+			state.buttons |= SCButtons.C
+		if (tempbyte & (1 << 1)) != 0:
+			state.buttons |= SCButtons.CPADPRESS
+
+		# Change gyro dir values to match Steam Controller
+		state.gpitch = ctypes.c_int16((data[18] << 8) | data[17]).value
+		state.gyaw = ctypes.c_int16((data[20] << 8) | data[19]).value * -1
+		state.groll = ctypes.c_int16((data[22] << 8) | data[21]).value * -1
+
+		# Change accel axes to match Steam Controller (flip pitch and roll)
+		# Scale values for 2G instead of 1G
+		state.accel_x = ctypes.c_int16((data[24] << 8) | data[23]).value * 2
+		# Invert pitch
+		state.accel_y = ctypes.c_int16((data[28] << 8) | data[27]).value * -2
+		state.accel_z = ctypes.c_int16((data[26] << 8) | data[25]).value * 2
+		# Calculate quaternion for gyro data. Needed for tilt controls output.
+		self.controller._calculate_quaternion(state)
+
+		# Check for CPAD touch
+		if (data[34] & 0x80) == 0:
+			state.buttons |= SCButtons.CPADTOUCH
+
+		state.cpad_x = ((data[36] & 0x0F) << 8) | data[35]
+		state.cpad_y = ((data[37] & 0x0F) << 4) | ((data[36] & 0xF0) >> 4)
+
+		return state
+
+
+def make_ds5():
+	""" Creates controller with only what decoding needs """
+	c = DS5HidRawController.__new__(DS5HidRawController)
+	c._gyro = GyroProcessor()
+	c._delta_time = 0.004
+	c._old_state = DualSenseBTControllerInput()
+	c._state = DualSenseBTControllerInput()
+	return c
+
+
+def make_ds4():
+	c = DS4Controller.__new__(DS4Controller)
+	c.mapper = None
+	c._load_hid_descriptor(None, DS4_REPORT_SIZE, VENDOR_ID, PRODUCT_ID, False)
+	return c
+
+
+def timed(fn, reports):
+	start = time.perf_counter()
+	for report in reports:
+		fn(report)
+	return time.perf_counter() - start
+
+
+def main(filename=None):
+	ds5_reports = load(filename) if filename else generate(DS5_REPORT_SIZE, 0x31)
+	ds4_reports = [ bytearray(x) for x in generate(DS4_REPORT_SIZE, 0x01) ]
+
+	# Both DS5 decoders have to produce same states
+	old, new = OldDecoder(make_ds5()), make_ds5()
+	for report in ds5_reports:
+		a, b = old.decode(report), new._convert_input_data(report)
+		assert [ getattr(a, x) for x in FIELDS ] == [ getattr(b, x) for x in FIELDS ], report
+
+	print("%s DS5 reports, %s DS4 reports" % (len(ds5_reports), len(ds4_reports)))
+	old, new = OldDecoder(make_ds5()), make_ds5()
+	ds4 = make_ds4()
+	results = (
+		("DS5 old", timed(old.decode, ds5_reports), len(ds5_reports)),
+		("DS5 tables", timed(new._convert_input_data, ds5_reports), len(ds5_reports)),
+		("DS4 libhiddrv", timed(lambda r: ds4.input(0, r), ds4_reports), len(ds4_reports)),
+	)
+	for name, t, count in results:
+		print("%-14s %9.0f reports/s  %6.2fus/report" % (name, count / t, t / count * 1e6))
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main(*sys.argv[1:2]))
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Measures accuracy and per-sample cost of computing orientation from gyro
+samples, as done for DualSense connected over bluetooth.
+
+Compared are integration that DS5 driver used before (no bias removal,
+no normalization), GyroProcessor alone, with bias learning and with both
+bias learning and fusion. Without argument, trace is generated: 1kHz samples of controller
+resting, being turned around in all directions and resting again, with
+gyro bias and noise added. As true orientation is known, error is
+reported as angle between true and computed orientation, in degrees,
+and as tilt (pitch and roll) error separately.
+
+Recorded trace can be passed as CSV file with 'dt, gx, gy, gz, ax, ay, az'
+rows, rates in rad/s and z pointing up in rest; Controller has to rest in
+same position at start and end of recording and difference between
+orientation computed at start and end is reported.
+
+Usage: python3 benchmarks/bench_gyro.py [trace.csv]
+"""
+import os, sys, time, random
+from math import sin, cos, sqrt, acos, degrees
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from scc.gyro import GyroProcessor
+
+RATE = 1000
+BIAS = (0.015, -0.01, 0.02)		# rad/s
+GYRO_NOISE = 0.01				# rad/s
+ACCEL_NOISE = 0.03				# g
+
+
+def qmul(a, b):
+	aw, ax, ay, az = a
+	bw, bx, by, bz = b
+	return (aw * bw - ax * bx - ay * by - az * bz,
+			aw * bx + ax * bw + ay * bz - az * by,
+			aw * by - ax * bz + ay * bw + az * bx,
+			aw * bz + ax * by - ay * bx + az * bw)
+
+
+def qnormalize(q):
+	n = sqrt(sum(x * x for x in q))
+	return tuple(x / n for x in q)
+
+
+def qangle(a, b):
+	""" Angle between two orientations in degrees """
+	dot = abs(sum(x * y for x, y in zip(a, b)))
+	return degrees(2 * acos(min(1.0, dot)))
+
+
+def up_in_sensor(q):
+	""" Direction of 'up' in sensor frame of orientation q """
+	w, x, y, z = q
+	return 2 * (x * z - w * y), 2 * (y * z + w * x), w * w - x * x - y * y + z * z
+
+
+def tilt_error(a, b):
+	ua, ub = up_in_sensor(a), up_in_sensor(b)
+	dot = sum(x * y for x, y in zip(ua, ub))
+	return degrees(acos(max(-1.0, min(1.0, dot))))
+
+
+def generate(seconds=60):
+	"""
+	Returns list of (dt, gx, gy, gz, ax, ay, az) samples and list of true
+	orientations after every sample
+	"""
+	rnd = random.Random(0)
+	dt = 1.0 / RATE
+	q = (1.0, 0.0, 0.0, 0.0)
+	samples, truth = [], []
+	for i in range(seconds * RATE):
+		t = i * dt
+		if 5 < t < seconds - 10:
+			rates = (1.5 * sin(t * 1.3), 2.0 * sin(t * 0.7 + 1), 1.0 * cos(t * 2.1))
+		else:
+			rates = (0.0, 0.0, 0.0)
+		# Integrated in fine steps to get true orientation
+		for j in range(4):
+			half = [ r * dt / 8 for r in rates ]
+			q = qnormalize(qmul(q, (1.0, half[0], half[1], half[2])))
+		up = up_in_sensor(q)
+		samples.append((dt,
+			rates[0] + BIAS[0] + rnd.gauss(0, GYRO_NOISE),
+			rates[1] + BIAS[1] + rnd.gauss(0, GYRO_NOISE),
+			rates[2] + BIAS[2] + rnd.gauss(0, GYRO_NOISE),
+			up[0] + rnd.gauss(0, ACCEL_NOISE),
+			up[1] + rnd.gauss(0, ACCEL_NOISE),
+			up[2] + rnd.gauss(0, ACCEL_NOISE),
+		))
+		truth.append(q)
+	return samples, truth
+
+
+def load(filename):
+	samples = []
+	with open(filename, "r") as f:
+		for line in f:
+			line = line.strip()
+			if line and not line.startswith("#"):
+				samples.append(tuple(float(x) for x in line.split(",")))
+	return samples
+
+
+class OldIntegration(object):
+	""" Integration done by DS5HidRawController before GyroProcessor was added """
+
+	def __init__(self):
+		self.q = [1.0, 0.0, 0.0, 0.0]
+
+	def update(self, gx, gy, gz, ax, ay, az, dt):
+		roll, pitch, yaw = gx * dt, gy * dt, gz * dt
+		cr, sr = cos(roll / 2), sin(roll / 2)
+		cp, sp = cos(pitch / 2), sin(pitch / 2)
+		cy, sy = cos(yaw / 2), sin(yaw / 2)
+		q = (cr * cp * cy + sr * sp * sy,
+			sr * cp * cy - cr * sp * sy,
+			cr * sp * cy + sr * cp * sy,
+			cr * cp * sy - sr * sp * cy)
+		self.q = qmul(self.q, q)
+
+	def get_quaternion(self):
+		return self.q
+
+
+def run(factory, samples):
+	""" Returns (orientations, seconds per sample) """
+	processor = factory()
+	update = processor.update
+	start = time.perf_counter()
+	for dt, gx, gy, gz, ax, ay, az in samples:
+		update(gx, gy, gz, ax, ay, az, dt)
+	t = (time.perf_counter() - start) / len(samples)
+	# Second run collects orientations and is not timed
+	processor = factory()
+	rv = []
+	for dt, gx, gy, gz, ax, ay, az in samples:
+		processor.update(gx, gy, gz, ax, ay, az, dt)
+		rv.append(processor.get_quaternion())
+	return rv, t
+
+
+def main(filename=None):
+	if filename:
+		samples, truth = load(filename), None
+	else:
+		samples, truth = generate()
+	print("%s samples, %.1fs" % (len(samples), sum(s[0] for s in samples)))
+	candidates = (
+		("old integration", OldIntegration),
+		("processor", lambda: GyroProcessor(False)),
+		("processor+bias", lambda: GyroProcessor(False, True)),
+		("processor+fusion", lambda: GyroProcessor(True, True)),
+	)
+	for name, factory in candidates:
+		result, t = run(factory, samples)
+		if truth:
+			errors = [ qangle(a, b) for a, b in zip(result, truth) ]
+			tilts = [ tilt_error(a, b) for a, b in zip(result, truth) ]
+			print("%-17s %6.2fus/sample   error: mean %6.2f final %6.2f   tilt: mean %6.2f final %6.2f" % (
+				name, t * 1e6, sum(errors) / len(errors), errors[-1],
+				sum(tilts) / len(tilts), tilts[-1]))
+		else:
+			print("%-17s %6.2fus/sample   start to end: %6.2f deg" % (
+				name, t * 1e6, qangle(result[0], result[-1])))
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main(*sys.argv[1:2]))
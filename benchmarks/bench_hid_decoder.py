@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Measures time from generic HID controller being connected to its first
+input being decoded, with decoder built from report descriptor and config
+every time and with decoder restored from cache.
+
+Connecting is simulated with report descriptor of common USB gamepad,
+stored in temporary directory that stands for sysfs node, and config like
+one created by GUI. Steps after decoder is ready (claiming device, creating
+mapper) don't depend on cache and are not included.
+
+Needs libhiddrv.so built by 'python3 setup.py build_ext --inplace'.
+
+Usage: python3 benchmarks/bench_hid_decoder.py [connect_count]
+"""
+import os, sys, time, ctypes, tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from scc.drivers.hiddrv import HIDController, _lib
+
+VID, PID = 0x0079, 0x0006
+# 5 axes, hatswitch, 12 buttons and vendor-specific bits, 8 byte packet
+DESCRIPTOR = bytes.fromhex(" ".join((
+	"05 01 09 04 a1 01 a1 02",
+	"75 08 95 05 15 00 26 ff 00 35 00 46 ff 00",
+	"09 30 09 31 09 32 09 32 09 35 81 02",
+	"75 04 95 01 25 07 46 3b 01 65 14 09 39 81 42",
+	"65 00 75 01 95 0c 25 01 45 01 05 09 19 01 29 0c 81 02",
+	"06 00 ff 75 01 95 08 25 01 45 01 09 01 81 02 c0",
+	"a1 02 75 08 95 07 46 ff 00 26 ff 00 09 02 91 02 c0 c0",
+)))
+CONFIG = {
+	"axes": {
+		"0": { "axis": "stick_x", "min": 0, "max": 255 },
+		"1": { "axis": "stick_y", "min": 255, "max": 0 },
+		"3": { "axis": "rpad_x", "min": 0, "max": 255 },
+		"4": { "axis": "rpad_y", "min": 255, "max": 0 },
+		"5": { "axis": "lpad_x", "min": 0, "max": 7 },
+	},
+	"buttons": { str(288 + i): name for i, name in enumerate((
+		"X", "A", "B", "Y", "LB", "RB", "LGRIP", "RGRIP", "BACK", "START",
+		"STICKPRESS", "RPAD")) },
+}
+PACKET = bytes((128, 128, 128, 20, 200, 0x1F, 0x00, 0x00))
+
+
+class FakeMonitor(object):
+
+	def __init__(self, path):
+		self.path = path
+
+	def get_report_descriptor_path(self, vid, pid):
+		return self.path
+
+
+class FakeDaemon(object):
+
+	def __init__(self, monitor):
+		self.monitor = monitor
+
+	def get_device_monitor(self):
+		return self.monitor
+
+
+def connect(daemon, config):
+	""" Does what HIDController does with descriptor and decodes first input """
+	c = HIDController.__new__(HIDController)
+	c.daemon, c.handle = daemon, None
+	c._load_hid_descriptor(config, 64, VID, PID, False)
+	_lib.decode(ctypes.byref(c._decoder), PACKET)
+	return c
+
+
+def measure(count, daemon, config, before=None):
+	""" Returns average time of single connect in seconds """
+	total = 0.0
+	for i in range(count):
+		if before:
+			before()
+		start = time.perf_counter()
+		connect(daemon, config)
+		total += time.perf_counter() - start
+	return total / count
+
+
+def main(count=2000):
+	count = int(count)
+	tmp = tempfile.mkdtemp()
+	os.environ["XDG_CACHE_HOME"] = os.path.join(tmp, "cache")
+	descriptor_file = os.path.join(tmp, "report_descriptor")
+	with open(descriptor_file, "wb") as f:
+		f.write(DESCRIPTOR)
+	daemon = FakeDaemon(FakeMonitor(descriptor_file))
+
+	def no_cache():
+		HIDController._decoder_cache.clear()
+		try:
+			os.unlink(HIDController._get_decoder_cache_filename(VID, PID))
+		except OSError:
+			pass
+
+	# Decoders have to be same
+	no_cache()
+	built = connect(daemon, CONFIG)
+	cached = connect(daemon, CONFIG)
+	assert bytes(built._decoder) == bytes(cached._decoder)
+
+	print("%s connects" % (count,))
+	results = (
+		("no cache", measure(count, daemon, CONFIG, no_cache)),
+		("cache file", measure(count, daemon, CONFIG,
+			HIDController._decoder_cache.clear)),
+		("memory cache", measure(count, daemon, CONFIG)),
+	)
+	for name, t in results:
+		print("%-13s %8.1fus per connect   %5.1fx" % (name, t * 1e6, results[0][1] / t))
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main(*sys.argv[1:2]))
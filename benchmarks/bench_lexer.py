@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Compares action string lexer used by ActionParser with lexing done by
+python's tokenize module, which parser used before.
+
+Every action string from profiles in default_profiles/ and
+profile_examples/ is lexed by both and results are checked to be same.
+Then both lexing alone and loading of whole profiles is timed.
+
+Usage: python3 benchmarks/bench_lexer.py [repeat_count]
+"""
+import os, sys, json, glob, time
+import token as TokenType
+from tokenize import TokenError, generate_tokens
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from scc.parser import ActionParser, ParseError, TalkingActionParser
+from scc.profile import Profile
+
+
+def tokenize_lex(s):
+	""" Lexer used by ActionParser before, based on tokenize module """
+	try:
+		return [
+			ActionParser.Token(token_type, string)
+			for token_type, string, *_
+			in generate_tokens( iter([s]).__next__ )
+			if token_type != TokenType.ENDMARKER
+		]
+	except TokenError:
+		raise ParseError("Syntax error")
+
+
+def find_profiles():
+	return sorted(
+		glob.glob(os.path.join(ROOT, "default_profiles", "*.sccprofile"))
+		+ glob.glob(os.path.join(ROOT, "profile_examples", "*.sccprofile"))
+	)
+
+
+def find_actions(data):
+	""" Yields every action string stored in profile data """
+	if isinstance(data, dict):
+		for key, value in data.items():
+			if key == "action" and isinstance(value, str):
+				yield value
+			else:
+				yield from find_actions(value)
+	elif isinstance(data, list):
+		for value in data:
+			yield from find_actions(value)
+
+
+def lex_all(lex, strings):
+	rv = []
+	for s in strings:
+		try:
+			rv.append(lex(s))
+		except ParseError:
+			rv.append(None)
+	return rv
+
+
+def timed(fn, repeat):
+	""" Returns best time of 'repeat' calls of fn """
+	best = None
+	for i in range(repeat):
+		start = time.perf_counter()
+		fn()
+		t = time.perf_counter() - start
+		best = t if best is None else min(best, t)
+	return best
+
+
+def load_profiles(filenames):
+	for filename in filenames:
+		Profile(TalkingActionParser()).load(filename).compress()
+
+
+def main(repeat=20):
+	filenames = find_profiles()
+	strings = []
+	for filename in filenames:
+		with open(filename, "r") as f:
+			strings += list(find_actions(json.load(f)))
+	print("%s profiles, %s action strings, %s characters" % (
+		len(filenames), len(strings), sum(len(s) for s in strings)))
+
+	if lex_all(ActionParser.lex, strings) != lex_all(tokenize_lex, strings):
+		print("Lexers produced different tokens!", file=sys.stderr)
+		return 1
+
+	t_lex = timed(lambda: lex_all(ActionParser.lex, strings), repeat)
+	t_tok = timed(lambda: lex_all(tokenize_lex, strings), repeat)
+	print("Lexing:          tokenize %8.2fms   lexer %8.2fms   speedup %5.2fx" % (
+		t_tok * 1000, t_lex * 1000, t_tok / t_lex))
+
+	# Compiled profiles would skip parsing entirely
+	Profile.USE_COMPILED = False
+	t_new = timed(lambda: load_profiles(filenames), repeat)
+	lex, ActionParser.lex = ActionParser.lex, staticmethod(tokenize_lex)
+	try:
+		t_old = timed(lambda: load_profiles(filenames), repeat)
+	finally:
+		ActionParser.lex = staticmethod(lex)
+	print("Loading profiles: tokenize %8.2fms   lexer %8.2fms   speedup %5.2fx" % (
+		t_old * 1000, t_new * 1000, t_old / t_new))
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main(*[ int(x) for x in sys.argv[1:2] ]))
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Measures how fast Mapper processes controller input.
+
+Pre-generated streams of controller inputs are replayed through
+Mapper.input using FakeController and Dummy virtual devices, so no hardware
+or uinput access is needed. Every scenario uses profile focused on one kind
+of actions commonly found in real profiles; profiles from default_profiles/
+are replayed as well.
+
+For each scenario, number of processed inputs per second is reported along
+with memory allocated while processing single input (peak, measured by
+tracemalloc) and number of memory blocks left allocated per input, which
+should stay at zero.
+
+Usage: python3 benchmarks/bench_mapper.py [frame_count] [scenario ...]
+"""
+import os, sys, io, gc, json, glob, math, time, tracemalloc
+from typing import NamedTuple
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from scc.constants import SCButtons, STICK_PAD_MAX, TRIGGER_MAX
+from scc.drivers.fake import FakeController
+from scc.mapper import Mapper
+from scc.parser import TalkingActionParser
+from scc.profile import Profile
+from scc.scheduler import Scheduler
+
+TICK = 0.01					# Time between two inputs, as with real controller
+DEFAULT_FRAMES = 20000
+
+
+class BenchInput(NamedTuple):
+	buttons: int = 0
+	ltrig: int = 0
+	rtrig: int = 0
+	stick_x: int = 0
+	stick_y: int = 0
+	lpad_x: int = 0
+	lpad_y: int = 0
+	rpad_x: int = 0
+	rpad_y: int = 0
+	cpad_x: int = 0
+	cpad_y: int = 0
+	dpad_x: int = 0
+	dpad_y: int = 0
+	accel_x: int = 0
+	accel_y: int = 0
+	accel_z: int = 0
+	gpitch: int = 0
+	groll: int = 0
+	gyaw: int = 0
+	q1: int = 0
+	q2: int = 0
+	q3: int = 0
+	q4: int = 0
+
+
+ZERO = BenchInput()
+
+
+class SAHandler(object):
+	""" Accepts and ignores all special actions, such as menus """
+	def __getattr__(self, name):
+		if name.startswith("on_sa_"):
+			return lambda *a: None
+		raise AttributeError(name)
+
+
+class Clock(object):
+	"""
+	Replaces time.time and time.monotonic while benchmark is running,
+	so actions see exactly TICK seconds between inputs regardless of
+	how fast they are processed.
+	"""
+	def __init__(self):
+		self.t = time.time()
+
+	def __call__(self):
+		return self.t
+
+	def __enter__(self):
+		self._time, self._monotonic = time.time, time.monotonic
+		time.time = time.monotonic = self
+		return self
+
+	def __exit__(self, *a):
+		time.time, time.monotonic = self._time, self._monotonic
+
+
+def circle(i, period, radius=STICK_PAD_MAX * 0.8):
+	""" Returns point on circle for i-th frame of movement """
+	a = 2 * math.pi * i / period
+	return int(math.cos(a) * radius), int(math.sin(a) * radius)
+
+
+def stream_trackpad(frames):
+	""" Finger swiping over right pad and lifted, so ball keeps rolling """
+	rv = []
+	for i in range(frames):
+		if i % 100 < 40:
+			x, y = circle(i, 160)
+			rv.append(ZERO._replace(buttons=SCButtons.RPADTOUCH, rpad_x=x, rpad_y=y))
+		else:
+			rv.append(ZERO)
+	return rv
+
+
+def stream_gyro(frames):
+	""" Controller slowly waved around with right trigger pulled from time to time """
+	rv = []
+	for i in range(frames):
+		a = 2 * math.pi * i / 500
+		pitch, yaw = int(math.sin(a) * 2000), int(math.cos(a * 0.7) * 2000)
+		q = [ int(math.cos(a * k) * 32767) for k in (0.5, 0.3, 0.2, 0.1) ]
+		pulled = i % 200 < 50
+		rv.append(ZERO._replace(gpitch=pitch, gyaw=yaw, groll=pitch // 4,
+			q1=q[0], q2=q[1], q3=q[2], q4=q[3],
+			rtrig=TRIGGER_MAX if pulled else 0,
+			buttons=SCButtons.RT if pulled else 0))
+	return rv
+
+
+def stream_buttons(frames):
+	""" Face buttons pressed in sequence while shoulder buttons switch modes """
+	face = (SCButtons.A, SCButtons.B, SCButtons.X, SCButtons.Y)
+	shoulder = (0, SCButtons.LB, SCButtons.RB, SCButtons.LGRIP)
+	rv = []
+	for i in range(frames):
+		buttons = shoulder[(i // 64) % len(shoulder)]
+		if i % 8 < 4:
+			buttons |= face[(i // 8) % len(face)]
+		x, y = circle(i, 90)
+		if i % 50 < 25:
+			buttons |= SCButtons.LPADTOUCH
+		else:
+			x, y = 0, 0
+		rv.append(ZERO._replace(buttons=buttons, lpad_x=x, lpad_y=y,
+			ltrig=(i * 16) % (TRIGGER_MAX + 1)))
+	return rv
+
+
+def stream_mixed(frames):
+	""" Everything from above at once """
+	rv = []
+	for a, b, c in zip(stream_trackpad(frames), stream_gyro(frames), stream_buttons(frames)):
+		rv.append(b._replace(buttons=a.buttons | c.buttons,
+			rpad_x=a.rpad_x, rpad_y=a.rpad_y,
+			lpad_x=c.lpad_x, lpad_y=c.lpad_y, ltrig=c.ltrig))
+	return rv
+
+
+MODE = "mode(LB, %s, RB, %s, LGRIP, %s, %s)"
+SCENARIOS = {
+	"trackpad" : (stream_trackpad, {
+		"pad_right" : "feedback(RIGHT, 256, ball(mouse()))",
+		"pad_left" : "feedback(LEFT, 4096, 16, ball(XY(mouse(Rels.REL_HWHEEL), mouse(Rels.REL_WHEEL))))",
+	}),
+	"gyro" : (stream_gyro, {
+		"gyro" : "mode(RT, gyroabs(Axes.ABS_RX, Axes.ABS_RY), None)",
+		"trigger_right" : "trigger(50, 255, button(Keys.BTN_RIGHT))",
+	}),
+	"modes" : (stream_buttons, {
+		"A" : MODE % ("button(Keys.KEY_1)", "button(Keys.KEY_2)", "button(Keys.KEY_3)", "button(Keys.KEY_A)"),
+		"B" : MODE % ("button(Keys.KEY_4)", "button(Keys.KEY_5)", "button(Keys.KEY_6)", "button(Keys.KEY_B)"),
+		"X" : MODE % ("button(Keys.KEY_7)", "button(Keys.KEY_8)", "button(Keys.KEY_9)", "button(Keys.KEY_X)"),
+		"Y" : MODE % ("button(Keys.KEY_F1)", "button(Keys.KEY_F2)", "button(Keys.KEY_F3)", "button(Keys.KEY_Y)"),
+		"pad_left" : MODE % ("dpad(button(Keys.KEY_UP), button(Keys.KEY_DOWN), button(Keys.KEY_LEFT), button(Keys.KEY_RIGHT))",
+			"XY(axis(Axes.ABS_X), axis(Axes.ABS_Y))", "mouse()",
+			"dpad8(button(Keys.KEY_W), button(Keys.KEY_S), button(Keys.KEY_A), button(Keys.KEY_D), "
+			"button(Keys.KEY_Q), button(Keys.KEY_E), button(Keys.KEY_Z), button(Keys.KEY_C))"),
+		"trigger_left" : "mode(LB, axis(Axes.ABS_Z), trigger(50, 255, button(Keys.BTN_LEFT)))",
+	}),
+	"menus" : (stream_buttons, {
+		"A" : "menu('Default.menu')",
+		"B" : "hold(menu('Default.menu'), button(Keys.KEY_LEFTALT))",
+		"X" : "mode(LB, gridmenu('Default.menu'), RB, radialmenu('Default.menu'), menu('Default.menu'))",
+		"Y" : "hold(position(10, 10, menu('Default.menu')), position(20, 20, menu('Default.menu')))",
+		"pad_left" : "radialmenu('Default.menu')",
+	}),
+}
+
+
+def make_profile(actions):
+	data = { "buttons" : {}, "version" : Profile.VERSION }
+	for key, action in actions.items():
+		if key in SCButtons.__members__:
+			data["buttons"][key] = { "action" : action }
+		else:
+			data[key] = { "action" : action }
+	profile = Profile(TalkingActionParser()).load_fileobj(io.StringIO(json.dumps(data)))
+	profile.compress()
+	return profile
+
+
+def make_mapper(profile):
+	mapper = Mapper(profile, Scheduler(), keyboard=False, mouse=False, gamepad=False)
+	mapper.set_special_actions_handler(SAHandler())
+	controller = FakeController(0)
+	mapper.set_controller(controller)
+	return mapper, controller
+
+
+def replay(mapper, controller, stream, clock, measure_memory=False):
+	"""
+	Passes all inputs from stream to mapper.
+	Returns peak of memory allocated during single input, if requested.
+	"""
+	old_state, peak = ZERO, 0
+	for state in stream:
+		clock.t += TICK
+		if measure_memory:
+			tracemalloc.reset_peak()
+			before = tracemalloc.get_traced_memory()[0]
+			mapper.input(controller, old_state, state)
+			peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+		else:
+			mapper.input(controller, old_state, state)
+		old_state = state
+	return peak
+
+
+def bench(name, profile, stream):
+	with Clock() as clock:
+		mapper, controller = make_mapper(profile)
+		# Warm up, so caches and compiled dispatch plan are not measured
+		replay(mapper, controller, stream[:1000], clock)
+
+		gc.collect()
+		start = time.perf_counter()
+		replay(mapper, controller, stream, clock)
+		elapsed = time.perf_counter() - start
+
+		gc.collect()
+		blocks = sys.getallocatedblocks()
+		tracemalloc.start()
+		try:
+			peak = replay(mapper, controller, stream, clock, measure_memory=True)
+		finally:
+			tracemalloc.stop()
+		gc.collect()
+		retained = sys.getallocatedblocks() - blocks
+
+	print("%-40s %12.0f %12.2f %14.1f %12.3f" % (name, len(stream) / elapsed,
+		elapsed / len(stream) * 1000000, peak / 1024.0, retained / len(stream)))
+
+
+def main(frames=DEFAULT_FRAMES, *names):
+	print("%-40s %12s %12s %14s %12s" % ("scenario", "inputs/s", "us/input",
+		"peak KiB/input", "blocks/input"))
+	for name, (generator, actions) in SCENARIOS.items():
+		if names and name not in names:
+			continue
+		bench(name, make_profile(actions), generator(frames))
+	if not names or "profiles" in names:
+		stream = stream_mixed(frames)
+		for filename in sorted(glob.glob(os.path.join(ROOT, "default_profiles", "*.sccprofile"))):
+			profile = Profile(TalkingActionParser()).load(filename)
+			profile.compress()
+			bench(os.path.basename(filename).split(".")[0], profile, stream)
+	return 0
+
+
+if __name__ == "__main__":
+	args = sys.argv[1:]
+	frames = int(args.pop(0)) if args and args[0].isdigit() else DEFAULT_FRAMES
+	sys.exit(main(frames, *args))
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Measures how slow action executed for one player affects latency of others,
+with and without 'threaded_mappers' mode.
+
+Several FakeControllers are fed with inputs at fixed rate, as if all of them
+were read at same time from one dongle. Profile of first player contains
+shell() action that takes SLOW_ACTION seconds to finish, every other player
+uses trackpad with ball(). Reported latency is time from input being
+"read" to events being generated, per player.
+
+Usage: python3 benchmarks/bench_workers.py [frame_count] [player_count]
+"""
+import os, sys, time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from bench_mapper import SAHandler, ZERO, make_profile, stream_buttons, stream_trackpad
+from scc.drivers.fake import FakeController
+from scc.latency import LatencyTracer
+from scc.mapper import Mapper
+from scc.scheduler import Scheduler
+from scc.worker import MapperWorker, WorkerScheduler
+from scc import latency
+
+TICK = 0.004				# 250 inputs per second from every controller
+SLOW_ACTION = 0.005			# Time spent in slow action
+DEFAULT_FRAMES = 1000
+DEFAULT_PLAYERS = 4
+
+
+class SlowSAHandler(SAHandler):
+	""" Simulates shell command or OSD daemon taking its time """
+	def on_sa_shell(self, *a):
+		time.sleep(SLOW_ACTION)
+
+
+def make_players(count, frames, threaded):
+	""" Returns list of (controller, mapper, stream, worker) """
+	shared = Scheduler()
+	players = []
+	for i in range(count):
+		if i == 0:
+			profile = make_profile({ "A" : "press(shell('slow'))" })
+			stream = stream_buttons(frames)
+		else:
+			profile = make_profile({ "pad_right" : "ball(mouse())" })
+			stream = stream_trackpad(frames)
+		mapper = Mapper(profile, WorkerScheduler() if threaded else shared,
+			keyboard=False, mouse=False, gamepad=False)
+		mapper.set_special_actions_handler(SlowSAHandler())
+		controller = FakeController(i)
+		controller.latency = LatencyTracer()
+		mapper.set_controller(controller)
+		worker = None
+		if threaded:
+			worker = MapperWorker(mapper, "Mapper-%s" % (i,))
+			worker.start()
+		players.append((controller, mapper, stream, worker))
+	return players
+
+
+def run(count, frames, threaded):
+	players = make_players(count, frames, threaded)
+	latency.enabled = True
+	next_tick = time.perf_counter()
+	for i in range(frames):
+		now = time.perf_counter()
+		if now < next_tick:
+			time.sleep(next_tick - now)
+		received = time.perf_counter()
+		for controller, mapper, stream, worker in players:
+			# All inputs are read at same time, as from one dongle
+			latency.mark_received(controller, received)
+			mapper.input(controller, stream[i - 1] if i else ZERO, stream[i])
+		next_tick += TICK
+	# Wait for workers to finish
+	while any(worker and worker._queue for c, m, s, worker in players):
+		time.sleep(0.01)
+	time.sleep(SLOW_ACTION * 2)
+	latency.enabled = False
+
+	print("%s mode:" % ("threaded" if threaded else "single-threaded"))
+	print("  %-12s %8s %10s %10s %10s" % ("player", "inputs", "p50 [us]", "p99 [us]", "max [us]"))
+	for controller, mapper, stream, worker in players:
+		stage, count, p50, p90, p99, maximum = [ x for x in controller.latency.report() ][-1]
+		name = "%s%s" % (controller.get_id(), " (slow)" if controller is players[0][0] else "")
+		print("  %-12s %8s %10.0f %10.0f %10.0f" % (name, count, p50, p99, maximum))
+
+
+def main(frames=DEFAULT_FRAMES, count=DEFAULT_PLAYERS):
+	run(count, frames, False)
+	run(count, frames, True)
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main(*[ int(x) for x in sys.argv[1:] ]))
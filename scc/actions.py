@@ -9,7 +9,7 @@ from scc.tools import _
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
 	from scc.mapper import Mapper
-from scc.tools import ensure_size, quat2euler, anglediff
+from scc.tools import ensure_size, quat2euler
 from scc.tools import circle_to_square, clamp, nameof
 from scc.uinput import Keys, Axes, Rels
 from scc.lib import xwrappers as X
@@ -903,6 +903,7 @@ class MouseAction(WholeHapticAction, Action):
 		dx, dy = dx * self.speed[0], dy * self.speed[1]
 		if self._mouse_axis is None:
 			mapper.mouse.moveEvent(dx, dy, mapper.time_elapsed)
+			mapper.syn_list.add(mapper.mouse)
 		elif self._mouse_axis == Rels.REL_X:
 			mapper.mouse_move(dx, 0)
 		elif self._mouse_axis == Rels.REL_Y:
@@ -1016,6 +1017,7 @@ class MouseAbsAction(Action):
 		dx = x * self.speed[0] * MouseAbsAction.MOUSE_FACTOR
 		dy = y * self.speed[0] * MouseAbsAction.MOUSE_FACTOR
 		mapper.mouse.moveEvent(dx, dy, mapper.time_elapsed)
+		mapper.syn_list.add(mapper.mouse)
 
 
 class AreaAction(Action, SpecialAction, OSDEnabledAction):
@@ -1245,7 +1247,11 @@ class GyroAbsAction(HapticEnabledAction, GyroAction):
 		HapticEnabledAction.__init__(self)
 		self.ir = [ 0, 0, None, 0 ]	# Initial rotation, last has to be determined
 		self._was_oor = False
-		self._deadzone_fn = None
+		self._deadzone_table = None	# AxisTable, set by DeadzoneModifier
+		self._values = [ 0, 0, 0 ]
+		# Axes that are sent to gamepad, as opposed to mouse movement
+		self._gamepad_axes = { axis for axis in self.axes
+			if axis in Axes.__members__.values() or type(axis) == int }
 
 
 	def reset(self):
@@ -1264,44 +1270,43 @@ class GyroAbsAction(HapticEnabledAction, GyroAction):
 	GYROAXES = (0, 1, 2)
 	def gyro(self, mapper: Mapper, pitch, yaw, roll, q1, q2, q3, q4):
 		if mapper.get_controller().flags & ControllerFlags.EUREL_GYROS:
-			pyr = [q1 / 10430.37, q2 / 10430.37, q3 / 10430.37]	# 2**15 / PI
+			pyr = q1 / 10430.37, q2 / 10430.37, q3 / 10430.37	# 2**15 / PI
 		else:
-			pyr = list(quat2euler(q1 / 32767.0, q2 / 32767.0, q3 / 32767.0, q4 / 32767.0))
+			pyr = quat2euler(q1 / 32767.0, q2 / 32767.0, q3 / 32767.0, q4 / 32767.0)
+		# Called for every gyro input; Values are stored in list kept
+		# between calls and anglediff is inlined
+		ir, values = self.ir, self._values
+		factor = (2**15) * self.speed[2] * 2 / PI
+		oor = False # oor - Out Of Range
 		for i in self.GYROAXES:
-			self.ir[i] = self.ir[i] or pyr[i]
-			pyr[i] = anglediff(self.ir[i], pyr[i]) * (2**15) * self.speed[2] * 2 / PI
+			ir[i] = ir[i] or pyr[i]
+			value = int(((pyr[i] - ir[i] + PI) % (2.0 * PI) - PI) * factor)
+			if value > STICK_PAD_MAX:
+				value = STICK_PAD_MAX
+				oor = True
+			elif value < STICK_PAD_MIN:
+				value = STICK_PAD_MIN
+				oor = True
+			values[i] = value
 		if self.haptic:
-			oor = False # oor - Out Of Range
-			for i in self.GYROAXES:
-				pyr[i] = int(pyr[i])
-				if pyr[i] > STICK_PAD_MAX:
-					pyr[i] = STICK_PAD_MAX
-					oor = True
-				elif pyr[i] < STICK_PAD_MIN:
-					pyr[i] = STICK_PAD_MIN
-					oor = True
 			if oor:
 				if not self._was_oor:
 					mapper.send_feedback(self.haptic)
 					self._was_oor = True
 			else:
 				self._was_oor = False
-		else:
-			for i in self.GYROAXES:
-				pyr[i] = int(clamp(STICK_PAD_MIN, pyr[i], STICK_PAD_MAX))
 		for i in self.GYROAXES:
 			axis = self.axes[i]
-			if axis in Axes.__members__.values() or type(axis) == int:
-				val = AxisAction.clamp_axis(axis, pyr[i] * self.speed[i])
-				if self._deadzone_fn:
-					val, trash = self._deadzone_fn(val, 0, STICK_PAD_MAX)
-					val = int(val)
+			if axis in self._gamepad_axes:
+				val = AxisAction.clamp_axis(axis, values[i] * self.speed[i])
+				if self._deadzone_table:
+					val = int(self._deadzone_table.apply(val))
 				mapper.gamepad.axisEvent(axis, val)
 				mapper.syn_list.add(mapper.gamepad)
 			elif axis == Rels.REL_X:
-				mapper.mouse_move(AxisAction.clamp_axis(axis, pyr[i] * GyroAbsAction.MOUSE_FACTOR * self.speed[i]), 0)
+				mapper.mouse_move(AxisAction.clamp_axis(axis, values[i] * GyroAbsAction.MOUSE_FACTOR * self.speed[i]), 0)
 			elif axis == Rels.REL_Y:
-				mapper.mouse_move(0, AxisAction.clamp_axis(axis, pyr[i] * GyroAbsAction.MOUSE_FACTOR * self.speed[i]))
+				mapper.mouse_move(0, AxisAction.clamp_axis(axis, values[i] * GyroAbsAction.MOUSE_FACTOR * self.speed[i]))
 
 
 class ResetGyroAction(Action):
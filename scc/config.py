@@ -1,14 +1,27 @@
 """SC-Controller - Config.
 
 Handles loading, storing and querying config file
+
+Every Config() instance reads file again. Daemon, which needs config on
+paths like connecting controller or handling client requests, uses instance
+shared by whole process instead, returned by Config.get_shared(). It's
+loaded once and replaced (never modified) when file changes; Change is
+noticed either by inotify, once Config.watch_shared() is called, or when
+Config.reload_shared() is called explicitly.
 """
 from scc.paths import get_config_path
 from scc.profile import Encoder
 from scc.special_actions import ChangeProfileAction
 
-import os, json, logging
+import os, json, struct, ctypes, threading, logging
 log = logging.getLogger("Config")
 
+IN_CLOSE_WRITE = 0x08
+IN_MOVED_TO = 0x80
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+INOTIFY_EVENT = struct.Struct("iIII")	# wd, mask, cookie, len
+
 
 class Config(object):
 	DEFAULTS = {
@@ -75,6 +88,26 @@ class Config(object):
 		# (or only some) inputs.
 		# This enables GUI to display which physical button was pressed to user.
 		"enable_sniffing" : False,
+		# latency_stats - If enabled, daemon measures how long it takes to
+		# process every input and reports it as response to 'Stats.' message.
+		"latency_stats" : False,
+		# threaded_mappers - If enabled, inputs from every controller are
+		# processed on separate thread. Applied only when daemon is started.
+		"threaded_mappers" : False,
+		# export_state - If enabled, latest state of every controller is
+		# published into memory-mapped file in $XDG_RUNTIME_DIR/scc, where
+		# other programs can read it. See scc/state_export.py.
+		# Applied only when daemon is started.
+		"export_state" : False,
+		# gyro_fusion - If enabled, accelerometer is used to correct
+		# orientation computed from gyroscope on controllers where daemon
+		# computes it (DualSense over bluetooth). See scc/gyro.py.
+		"gyro_fusion" : False,
+		# gyro_learn_bias - If enabled, gyroscope bias is measured while
+		# controller rests and subtracted on same controllers. Controller
+		# turned very slowly (under ~3 degrees per second) looks like resting
+		# one, so such movement may be lost.
+		"gyro_learn_bias" : False,
 		# Style and colors used by OSD
 		"osd_style": "Classic.gtkstyle.css",
 		"osd_colors": {
@@ -124,11 +157,130 @@ class Config(object):
 	}
 
 
+	_shared = None
+	_shared_lock = threading.Lock()
+	_listeners = []
+	_inotify_fd = None
+
 	def __init__(self):
 		self.filename = os.path.join(get_config_path(), "config.json")
+		self._frozen = False
 		self.reload()
 
 
+	@staticmethod
+	def get_shared():
+		"""
+		Returns Config instance shared by whole process. Returned instance
+		must not be modified; Setting values on it raises TypeError.
+		"""
+		config = Config._shared
+		if config is None:
+			with Config._shared_lock:
+				if Config._shared is None:
+					Config._shared = Config._load_frozen()
+				config = Config._shared
+		return config
+
+
+	@staticmethod
+	def _load_frozen():
+		config = Config()
+		config._frozen = True
+		return config
+
+
+	@staticmethod
+	def reload_shared():
+		"""
+		Loads config file again and, if anything was changed, replaces
+		shared instance and calls all listeners added by add_listener.
+		Returns True if config was changed.
+		"""
+		with Config._shared_lock:
+			old = Config._shared
+			config = Config._load_frozen()
+			if old is not None and old.encode() == config.encode():
+				return False
+			Config._shared = config
+			listeners = list(Config._listeners)
+		log.debug("Configuration reloaded")
+		for cb in listeners:
+			cb(config)
+		return True
+
+
+	@staticmethod
+	def add_listener(cb):
+		"""
+		Adds function that is called as cb(config) with new shared instance
+		every time when it's replaced.
+		"""
+		with Config._shared_lock:
+			if cb not in Config._listeners:
+				Config._listeners.append(cb)
+
+
+	@staticmethod
+	def remove_listener(cb):
+		with Config._shared_lock:
+			if cb in Config._listeners:
+				Config._listeners.remove(cb)
+
+
+	@staticmethod
+	def watch_shared(poller):
+		"""
+		Starts watching config file with inotify, reloading shared instance
+		when file is written or replaced. 'poller' is scc.poller.Poller
+		instance that reload is then done from.
+
+		Returns True on success. Without inotify, reload_shared has to be
+		called to notice changes.
+		"""
+		if Config._inotify_fd is not None:
+			return True
+		Config.get_shared()		# Creates config directory if needed
+		try:
+			libc = ctypes.CDLL(None, use_errno=True)
+			fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+			if fd < 0:
+				raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+			if libc.inotify_add_watch(fd, get_config_path().encode("utf-8"),
+					IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+				errno = ctypes.get_errno()
+				os.close(fd)
+				raise OSError(errno, os.strerror(errno))
+		except Exception as e:
+			log.warning("Failed to watch configuration file: %s", e)
+			return False
+		Config._inotify_fd = fd
+		poller.register(fd, poller.POLLIN, Config._on_inotify)
+		return True
+
+
+	@staticmethod
+	def _on_inotify(fd, event):
+		try:
+			data = os.read(fd, 4096)
+		except BlockingIOError:
+			return
+		changed = False
+		offset = 0
+		while offset + INOTIFY_EVENT.size <= len(data):
+			wd, mask, cookie, length = INOTIFY_EVENT.unpack_from(data, offset)
+			offset += INOTIFY_EVENT.size
+			name = data[offset:offset + length].rstrip(b"\0")
+			offset += length
+			if name == b"config.json":
+				changed = True
+		if changed:
+			try:
+				Config.reload_shared()
+			except Exception as e:
+				log.exception(e)
+
+
 	def reload(self):
 		""" (Re)loads configuration. Works as load(), but handles exceptions """
 		try:
@@ -179,8 +331,19 @@ class Config(object):
 	def get_controller_config(self, controller_id):
 		"""
 		Returns self['controllers'][controller_id], creating new node populated
-		with defaults if there is none.
+		with defaults if there is none. On shared instance, node is not stored.
 		"""
+		if self._frozen:
+			rv = dict(self.CONTROLLER_DEFAULTS)
+			if controller_id in self.values['controllers']:
+				stored = self.values['controllers'][controller_id]
+				for key in ("input_rotation_l", "input_rotation_r"):
+					# Same special case as bellow
+					rv[key] = 0
+				rv.update(stored)
+			else:
+				rv["name"] = controller_id
+			return rv
 		if controller_id in self.values['controllers']:
 			# Check values in existing config
 			rv = self.values['controllers'][controller_id]
@@ -211,15 +374,21 @@ class Config(object):
 		self.save()
 
 
+	def encode(self):
+		""" Returns configuration encoded as it's stored in file """
+		data = { k:self.values[k] for k in self.values }
+		return Encoder(sort_keys=True, indent=4).encode(data)
+
+
 	def save(self):
 		""" Saves configuration file """
+		if self._frozen:
+			raise TypeError("Shared configuration cannot be saved")
 		# Check & create directory
 		if not os.path.exists(get_config_path()):
 			os.makedirs(get_config_path())
 		# Save
-		data = { k:self.values[k] for k in self.values }
-		jstr = Encoder(sort_keys=True, indent=4).encode(data)
-		open(self.filename, "w").write(jstr)
+		open(self.filename, "w").write(self.encode())
 		log.debug("Configuration saved")
 
 
@@ -231,6 +400,8 @@ class Config(object):
 		return self.values.get(key, default)
 
 	def set(self, key, value):
+		if self._frozen:
+			raise TypeError("Shared configuration cannot be modified")
 		self.values[key] = value
 
 	__getitem__ = get
@@ -62,6 +62,12 @@ ROUND   = "ROUND"
 LINEAR  = "LINEAR"
 MINIMUM = "MINIMUM"
 
+# Response curve types
+POWER       = "POWER"
+EXPONENTIAL = "EXPONENTIAL"
+SCURVE      = "SCURVE"
+POINTS      = "POINTS"
+
 # Hipfire modes
 HIPFIRE_NORMAL    = "NORMAL"
 HIPFIRE_SENSIBLE  = "SENSIBLE"
@@ -69,6 +75,7 @@ HIPFIRE_EXCLUSIVE = "EXCLUSIVE"
 
 PARSER_CONSTANTS = ( LEFT, RIGHT, WHOLE, STICK, GYRO, PITCH,
 	YAW, ROLL, DEFAULT, SAME, CUT, ROUND, LINEAR, MINIMUM,
+	POWER, EXPONENTIAL, SCURVE, POINTS,
 	HIPFIRE_NORMAL, HIPFIRE_SENSIBLE, HIPFIRE_EXCLUSIVE )
 
 
@@ -2,12 +2,13 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING
 
-from scc.constants import HapticPos
+from scc.constants import STICK_PAD_MAX, STICK_PAD_MIN, HapticPos
 
 if TYPE_CHECKING:
 	from scc.controller import HapticData
 	from scc.mapper import Mapper
 import logging
+import math
 import time
 
 log = logging.getLogger("SCController")
@@ -29,6 +30,8 @@ class Controller(object):
 		next_id += 1
 		self.lastTime = time.time()
 		self.time_elapsed = 0.0
+		self.latency = None		# LatencyTracer, set by daemon when enabled
+		self.received = None	# Time of last input, see latency.mark_received
 
 
 	def get_type(self) -> None:
@@ -172,3 +175,41 @@ class HapticData(object):
 		position, amplitude, period, count = self.data
 		amplitude = min(amplitude * by, 0x8000)
 		return HapticData(position, amplitude, self.frequency, period, count)
+
+
+class PadRotation(object):
+	"""
+	Rotates pad coordinates by angle set in controller configuration
+	('input_rotation_l' and 'input_rotation_r' options).
+
+	Rotation matrix is computed only when angle is changed, so rotating
+	single input costs just few multiplications. Instance evaluates as
+	False when angle is zero and nothing has to be rotated.
+	"""
+	__slots__ = ("degrees", "_sin", "_cos")
+
+	def __init__(self, degrees=0.0):
+		self.set_angle(degrees)
+
+
+	def set_angle(self, degrees):
+		"""
+		Sets angle in degrees. Positive angle rotates input clockwise.
+		"""
+		self.degrees = float(degrees)
+		angle = self.degrees * math.pi / -180.0
+		self._sin, self._cos = math.sin(angle), math.cos(angle)
+
+
+	def rotate(self, x, y):
+		""" Returns rotated (x, y), clamped to range of pad values """
+		s, c = self._sin, self._cos
+		rx, ry = int(x * c - y * s), int(x * s + y * c)
+		return (
+			STICK_PAD_MIN if rx < STICK_PAD_MIN else STICK_PAD_MAX if rx > STICK_PAD_MAX else rx,
+			STICK_PAD_MIN if ry < STICK_PAD_MIN else STICK_PAD_MAX if ry > STICK_PAD_MAX else ry,
+		)
+
+
+	def __bool__(self):
+		return self.degrees != 0.0
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+SC-Controller - Response Curves
+
+Response curves are applied to every stick, pad or trigger input they are
+set for. Instead of computing them for each input, they are sampled into
+lookup tables, so applying them costs single square root (for 2D input)
+and lookup of two neighbouring values in table.
+
+Every function maps distance from center to output distance. ResponseTable
+samples it on coarse grid, once first input comes, and values in between
+are interpolated linearly. Segments where function bends too much for
+interpolation to be accurate (around points of 'points' curve, or near
+center of curve with exponent under 1) are computed exactly instead.
+2D input is then scaled radially and 1D input keeps its sign.
+
+Triggers and gamepad axes set by gyro always report integer position, so
+for those, TriggerTable and AxisTable store output for every possible
+position. Those are filled as positions are used, so creating them costs
+next to nothing and nothing has to be interpolated.
+
+Tables are shared by all modifiers (and all copies of profile) created
+with same parameters, for as long as any of them exists.
+"""
+from scc.constants import STICK_PAD_MIN, TRIGGER_MAX
+from math import sqrt, ceil, copysign, nan as NAN
+from array import array
+import threading, weakref
+
+# Distance of stick pushed to corner
+MAX_DISTANCE = int(ceil(sqrt(2.0) * -STICK_PAD_MIN))
+
+
+class SharedTable(object):
+	""" Base for tables that are shared by everything created with same parameters """
+	# Table is dropped from cache once nothing uses it
+	_cache = weakref.WeakValueDictionary()
+	_lock = threading.Lock()
+
+	@classmethod
+	def get(cls, factory, *args):
+		"""
+		Returns table for function returned by factory(*args), shared with
+		everything that requested table with same arguments before.
+		Factory has to be plain function or staticmethod, so table can be
+		pickled as reference to it.
+		"""
+		key = (cls, factory) + args
+		with SharedTable._lock:
+			table = SharedTable._cache.get(key)
+			if table is None:
+				table = cls(factory(*args))
+				table._key = key
+				SharedTable._cache[key] = table
+			return table
+
+
+	def __deepcopy__(self, memo):
+		# Immutable, there is no reason to copy it with profile
+		return self
+
+
+	def __reduce__(self):
+		# Pickled (in compiled profile) as arguments used to create table
+		return self._key[0].get, self._key[1:]
+
+
+class ResponseTable(SharedTable):
+	# Distance between two sampled points is 2 ** SHIFT
+	SHIFT = 5
+	# Segment is computed exactly if interpolating it may be off by more
+	# than this (in units of stick position)
+	MAX_ERROR = 0.5
+
+	def __init__(self, fn):
+		"""
+		'fn' is called as fn(distance) and has to return output distance.
+		It's sampled in 0 to MAX_DISTANCE range and called directly for
+		inputs that are out of that range or fall into segment that
+		can't be interpolated.
+		"""
+		self.fn = fn
+		self.offsets = None
+		self.slopes = None
+
+
+	def _build(self):
+		"""
+		Samples function, called when first input comes. Returns slopes;
+		If two threads get here at once, table is just built twice.
+
+		Every segment is stored as line, offset + slope * distance,
+		and slopes[i] is None if segment has to be computed exactly.
+		"""
+		step, fn = 1 << ResponseTable.SHIFT, self.fn
+		values = [ float(fn(d)) for d in range(0, MAX_DISTANCE + step, step) ]
+		slopes = [ (b - a) / step for a, b in zip(values, values[1:]) ]
+		# Linear interpolation is off by at most 1/8 of change of slope
+		# over segment, multiplied by its length; Change is estimated from
+		# neighbouring segments.
+		limit = ResponseTable.MAX_ERROR * 8 / step
+		bends = [ abs(b - a) > limit for a, b in zip(slopes, slopes[1:]) ]
+		slopes = [ None if a or b else slope for slope, a, b
+			in zip(slopes, [ True ] + bends, bends + [ True ]) ]
+		self.offsets = [ value - (slope or 0) * i * step
+			for i, (value, slope) in enumerate(zip(values, slopes)) ]
+		self.slopes = slopes
+		return slopes
+
+
+	def apply(self, x):
+		""" Applies function to 1D input """
+		slopes = self.slopes or self._build()
+		d = abs(x)
+		i = int(d) >> ResponseTable.SHIFT
+		if i < len(slopes):
+			slope = slopes[i]
+			if slope is not None:
+				return copysign(self.offsets[i] + slope * d, x)
+		return copysign(self.fn(d), x)
+
+
+	def apply2(self, x, y):
+		""" Applies function to 2D input. Returns (x, y) tuple """
+		slopes = self.slopes or self._build()
+		d = sqrt(x * x + y * y)
+		if d == 0:
+			return x, y
+		i = int(d) >> ResponseTable.SHIFT
+		if i < len(slopes):
+			slope = slopes[i]
+			if slope is not None:
+				scale = self.offsets[i] / d + slope
+				return x * scale, y * scale
+		scale = self.fn(d) / d
+		return x * scale, y * scale
+
+
+class TriggerTable(SharedTable):
+	"""
+	Stores output of function for every integer position from 0 to SIZE,
+	computed when position is used for first time. Function is called
+	directly for anything else. Negative input keeps its sign, fn(-x) is
+	taken as -fn(x).
+	"""
+	SIZE = TRIGGER_MAX
+
+	def __init__(self, fn):
+		self.fn = fn
+		# NaN marks position that was not computed yet. Array of doubles
+		# takes fraction of memory list of floats would.
+		self.values = array("d", [ NAN ]) * (self.SIZE + 1)
+
+
+	def apply(self, x):
+		try:
+			if x >= 0:
+				v = self.values[x]
+				if v != v:
+					v = self.values[x] = self.fn(x)
+				return v
+			v = self.values[-x]
+			if v != v:
+				v = self.values[-x] = self.fn(-x)
+			return -v
+		except (IndexError, TypeError):
+			# Out of range or not integer
+			return copysign(self.fn(abs(x)), x)
+
+
+class AxisTable(TriggerTable):
+	""" Same as TriggerTable, for whole range of gamepad stick axis """
+	SIZE = -STICK_PAD_MIN
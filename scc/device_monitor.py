@@ -2,6 +2,11 @@
 
 Extends eudevmonitor with options to register callbacks and
 manage plugging/releasing devices.
+
+Also keeps index of HID nodes, so node for given vendor and product ID or
+bluetooth address can be found without walking sysfs. Index is built from
+udev enumerator when monitor is started and updated by events for 'hid'
+subsystem after that.
 """
 from __future__ import annotations
 
@@ -44,6 +49,11 @@ class DeviceMonitor(Monitor):
 		self.dev_removed_cbs = {}
 		self.bt_addresses = {}
 		self.known_devs = {}
+		# (vendor, product) -> [syspath, ...] and ADDRESS -> syspath
+		self.hid_by_id = {}
+		self.hid_by_address = {}
+		# syspath -> ((vendor, product), ADDRESS), for removing from index
+		self._hid_nodes = {}
 
 # removed_cb type can be None
 	def add_callback(self, subsystem: str, vendor_id: int, product_id: int, added_cb, removed_cb) -> None:
@@ -76,7 +86,77 @@ class DeviceMonitor(Monitor):
 			log.warning("Failed to load libbluetooth.so, bluetooth support will be incomplete")
 		poller = self.daemon.poller
 		poller.register(self.fileno(), poller.POLLIN, self.on_data_ready)
+		self.match_subsystem("hid")
 		Monitor.start(self)
+		# Built after monitor is started so no node can be missed.
+		# Nodes reported by both enumerator and event are indexed twice,
+		# what is harmless.
+		self._build_hid_index()
+
+
+	def _build_hid_index(self) -> None:
+		"""(Re)builds index of HID nodes from udev database."""
+		self.hid_by_id, self.hid_by_address, self._hid_nodes = {}, {}, {}
+		for syspath in self._eudev.enumerate().match_subsystem("hid"):
+			self._index_hid(syspath)
+
+
+	def _index_hid(self, syspath: str) -> None:
+		"""Adds HID node to index. Node name is 'BUS:VENDOR:PRODUCT.NUMBER'."""
+		match = RE_BT_NUMBERS.match(os.path.basename(syspath))
+		if match is None:
+			return
+		self._unindex_hid(syspath)
+		key = tuple(int(x, 16) for x in match.groups())
+		address = None
+		try:
+			with open(os.path.join(syspath, "uevent"), "r") as f:
+				for line in f:
+					if line.startswith("HID_UNIQ="):
+						address = line[9:].strip().upper() or None
+						break
+		except OSError:
+			# Node removed before it could be read
+			return
+		self.hid_by_id.setdefault(key, []).append(syspath)
+		if address is not None:
+			self.hid_by_address[address] = syspath
+		self._hid_nodes[syspath] = (key, address)
+
+
+	def _unindex_hid(self, syspath: str) -> None:
+		if syspath not in self._hid_nodes:
+			return
+		key, address = self._hid_nodes.pop(syspath)
+		self.hid_by_id[key].remove(syspath)
+		if not self.hid_by_id[key]:
+			del self.hid_by_id[key]
+		if self.hid_by_address.get(address) == syspath:
+			del self.hid_by_address[address]
+
+
+	def get_hid_node(self, address: str) -> str | None:
+		"""Returns syspath of HID node for device with given bluetooth address or None.
+
+		Node may be created after event that caused this to be called, but
+		before event announcing it was processed. In such case, index is
+		rebuilt to find it.
+		"""
+		address = address.upper()
+		if address not in self.hid_by_address:
+			self._build_hid_index()
+		return self.hid_by_address.get(address)
+
+
+	def get_report_descriptor_path(self, vendor: int, product: int) -> str | None:
+		"""Returns path to 'report_descriptor' of HID node with given vendor and product ID or None."""
+		if (vendor, product) not in self.hid_by_id:
+			self._build_hid_index()
+		for syspath in self.hid_by_id.get((vendor, product), ()):
+			path = os.path.join(syspath, "report_descriptor")
+			if os.path.exists(path):
+				return path
+		return None
 
 
 	def _on_new_syspath(self, subsystem: str, syspath: str) -> None:
@@ -131,29 +211,19 @@ class DeviceMonitor(Monitor):
 		if ":" not in name:
 			return None
 		addr = self.bt_addresses.get(name)
-		for fname in os.listdir("/sys/bus/hid/devices/"):
-			node = os.path.join("/sys/bus/hid/devices/", fname)
-			try:
-				node_addr = DeviceMonitor._find_bt_address(node)
-				#Joe: somehow my node_addr is in lowercase
-				if node_addr is not None:
-					node_addr = str.upper(node_addr)
-			except OSError:
-				continue
-			try:
-				if node_addr is not None and addr is not None:
-					# SteamOS 3 "Holo" return caps
-					if node_addr.lower() == addr.lower():
-						return node
-			# None
-			except AttributeError:
-				pass
-		return None
+		if addr is None:
+			return None
+		return self.get_hid_node(addr)
 
 
 	def on_data_ready(self, *a) -> None:
 		event = self.receive_device()
 		if event:
+			if event.subsystem == "hid":
+				if event.action in ("add", "bind", "change"):
+					self._index_hid(event.syspath)
+				elif event.action == "remove":
+					self._unindex_hid(event.syspath)
 			if event.action == "bind" and event.initialized:
 				if event.syspath not in self.known_devs:
 					self._on_new_syspath(event.subsystem, event.syspath)
@@ -7,6 +7,7 @@ import ctypes
 import logging
 import math
 import os
+import struct
 import sys
 import time
 import zlib
@@ -23,6 +24,7 @@ from scc.constants import (
     HapticPos,
     SCButtons,
 )
+from scc import latency
 from scc.controller import Controller
 from scc.drivers.evdevdrv import (
     HAVE_EVDEV,
@@ -46,6 +48,7 @@ from scc.drivers.hiddrv import (
     hiddrv_test,
 )
 from scc.drivers.usb import register_hotplug_device
+from scc.gyro import GyroProcessor
 from scc.lib.hidraw import HIDRaw
 from scc.sccdaemon import SCCDaemon
 from scc.tools import init_logging, set_logging_level
@@ -354,6 +357,8 @@ class DS5Controller(HIDController):
                     self,
                     self._decoder.old_state, self._decoder.state
                 )
+        else:
+            latency.clear_received(self)
 
     def feedback(self, data):
         position, amplitude, period, count = data.data
@@ -550,14 +555,17 @@ class DS5HidRawController(Controller):
         )
         self._feedback_cancel_task = None
         self._outputs = {}
-        # Use empty struct for starting state
+        # Reports are decoded into one of two buffers, swapped on every
+        # report. Empty struct is used as starting state
         self._old_state = DualSenseBTControllerInput()
+        self._state = DualSenseBTControllerInput()
 
         self._device_name = hidrawdev.getName()
         self._hidrawdev = hidrawdev
         self._fileno = hidrawdev._device.fileno()
         self._id = self._generate_id() if driver else "-"
-        self._previous_quat = [1.0, 0.0, 0.0, 0.0]
+        self._gyro = GyroProcessor(fusion=driver.config["gyro_fusion"],
+                learn_bias=driver.config["gyro_learn_bias"])
         self._delta_time = time.time()
         self._previous_time = time.time()
 
@@ -711,12 +719,13 @@ class DS5HidRawController(Controller):
     def _input(self, *a):
         #log.debug("FOUND INPUT")
         tempdata = self._hidrawdev.read(78)
+        latency.mark_received(self)
         # Skip over packet if not a DS5 mode input packet
         if tempdata[0] != 0x31:
+            latency.clear_received(self)
             return
 
         #log.debug(tempdata)
-        old_state = self._old_state
         current_time = time.time()
         self._delta_time = current_time - self._previous_time
         #hamtaro = DualSenseHIDInputBT.from_buffer_copy(tempdata)
@@ -733,149 +742,85 @@ class DS5HidRawController(Controller):
         #self.flush()
         #self.close()
         if self.mapper:
-            self.mapper.input(self, old_state, state_data)
+            self.mapper.input(self, self._old_state, state_data)
 
-        self._old_state = state_data
         # Check for pending output data
         self.flush()
 
         self._previous_time = current_time
 
     def _convert_input_data(self, data):
-        state = DualSenseBTControllerInput()
-        state.stick_x = self._stick_axis_scale(data[2], False)
-        state.stick_y = self._stick_axis_scale(data[3], True)
-        state.rpad_x = self._stick_axis_scale(data[4], False)
-        state.rpad_y = self._stick_axis_scale(data[5], True)
-        state.ltrig = data[6]
-        state.rtrig = data[7]
-        tempbyte = data[9]
-        if (tempbyte & (1 << 7)) != 0:
-            state.buttons |= SCButtons.Y
-        if (tempbyte & (1 << 6)) != 0:
-            state.buttons |= SCButtons.B
-        if (tempbyte & (1 << 5)) != 0:
-            state.buttons |= SCButtons.A
-        if (tempbyte & (1 << 4)) != 0:
-            state.buttons |= SCButtons.X
-        dpad_state = data[9] & 0x0F
-        if (dpad_state != 8):
-            state.buttons |= SCButtons.LPAD | SCButtons.LPADTOUCH
-            tempDPad = DS5HidRawController.DPAD_STATE_TYPES.get(dpad_state,
-                DS5HidRawController.DPAD_CENTERED_STATE)
-            state.lpad_x = tempDPad.x
-            state.lpad_y = tempDPad.y
-
-        tempbyte = data[10]
-        if (tempbyte & (1 << 7)) != 0:
-            state.buttons |= SCButtons.RPAD
-        if (tempbyte & (1 << 6)) != 0:
-            state.buttons |= SCButtons.STICKPRESS
-        if (tempbyte & (1 << 5)) != 0:
-            state.buttons |= SCButtons.START
-        if (tempbyte & (1 << 4)) != 0:
-            state.buttons |= SCButtons.BACK
-        if (tempbyte & (1 << 3)) != 0:
-            state.buttons |= SCButtons.RT
-        if (tempbyte & (1 << 2)) != 0:
-            state.buttons |= SCButtons.LT
-        if (tempbyte & (1 << 1)) != 0:
-            state.buttons |= SCButtons.RB
-        if (tempbyte & (1 << 0)) != 0:
-            state.buttons |= SCButtons.LB
-
-        tempbyte = data[11]
-        if (tempbyte & (1 << 0)) != 0:
-            state.buttons |= SCButtons.C
-        if (tempbyte & (1 << 1)) != 0:
-            state.buttons |= SCButtons.CPADPRESS
+        """
+        Decodes report into buffer that held state before last one and
+        swaps buffers. Returns new state.
+        """
+        self._old_state, self._state = self._state, self._old_state
+        state = self._state
+        (lx, ly, rx, ry, state.ltrig, state.rtrig, b0, b1, b2,
+            gpitch, gyaw, groll, accel_x, accel_z, accel_y,
+            touch, t0, t1, t2) = BT_REPORT.unpack_from(data)
+        state.stick_x = BT_STICK[lx]
+        state.stick_y = BT_STICK_INVERTED[ly]
+        state.rpad_x = BT_STICK[rx]
+        state.rpad_y = BT_STICK_INVERTED[ry]
+        buttons = BT_BUTTONS_0[b0] | BT_BUTTONS_1[b1] | BT_BUTTONS_2[b2]
+        # Check for CPAD touch
+        if (touch & 0x80) == 0:
+            buttons |= SCButtons.CPADTOUCH
+        state.buttons = buttons
+        state.lpad_x = BT_DPAD_X[b0]
+        state.lpad_y = BT_DPAD_Y[b0]
 
         # Change gyro dir values to match Steam Controller
-        state.gpitch = ctypes.c_int16((data[18] << 8) | data[17]).value
-        state.gyaw = ctypes.c_int16((data[20] << 8) | data[19]).value * -1
-        state.groll = ctypes.c_int16((data[22] << 8) | data[21]).value * -1
+        state.gpitch = gpitch
+        state.gyaw = -gyaw
+        state.groll = -groll
 
         # Change accel axes to match Steam Controller (flip pitch and roll)
         # Scale values for 2G instead of 1G
-        state.accel_x = ctypes.c_int16((data[24] << 8) | data[23]).value * 2
+        state.accel_x = accel_x * 2
         # Invert pitch
-        state.accel_y = ctypes.c_int16((data[28] << 8) | data[27]).value * -2
-        state.accel_z = ctypes.c_int16((data[26] << 8) | data[25]).value * 2
-        #print("GYRO: {} {} {}".format(state.gyaw, state.gpitch, state.groll))
-        #print("ACCEL: {} | {} | {}".format(state.accel_x, state.accel_y, state.accel_z))
+        state.accel_y = accel_y * -2
+        state.accel_z = accel_z * 2
         # Calculate quaternion for gyro data. Needed for tilt controls output.
-        # TODO: Try to add sensor fusion and complementary filter later
         self._calculate_quaternion(state)
 
-        # Check for CPAD touch
-        if (data[34] & 0x80) == 0:
-            state.buttons |= SCButtons.CPADTOUCH
-
-        state.cpad_x = ((data[36] & 0x0F) << 8) | data[35]
-        state.cpad_y = ((data[37] & 0x0F) << 4) | ((data[36] & 0xF0) >> 4)
+        state.cpad_x = ((t1 & 0x0F) << 8) | t0
+        state.cpad_y = ((t2 & 0x0F) << 4) | ((t1 & 0xF0) >> 4)
 
         return state
 
-    def _stick_axis_scale(self, value, invert=False, test=False):
+    @staticmethod
+    def _stick_axis_scale(value, invert=False):
         result = value - 128
         tempRatio = (result / 127.0) if (value >= 128) else (result / (128.0))
         if invert:
             tempRatio = -tempRatio
 
         tempRatio = (tempRatio + 1.0) * 0.5
-
-        """if test:
-            print(tempRatio)
-            print("RES {}".format(STICK_PAD_RES))
-            print(tempRatio * STICK_PAD_RES + STICK_PAD_MIN)
-        """
         result = int(tempRatio * STICK_PAD_RES + STICK_PAD_MIN)
         return result
 
+    # Converts raw gyro values (16 per degree per second) to rad/s
+    GYRO_SCALE = math.pi / 180.0 / 16
+
     def _calculate_quaternion(self, state):
-        # Convert raw gyro values to degrees per second
-        GYRO_RES_IN_DEG_SEC = 16
-        (yaw, pitch, roll) = ((state.gyaw / GYRO_RES_IN_DEG_SEC),
-            (state.gpitch / GYRO_RES_IN_DEG_SEC),
-            (state.groll / GYRO_RES_IN_DEG_SEC))
-
-        # Remove time delta element to get gyro angles and convert to radians
-        old_yaw = yaw
-        yaw = yaw * self._delta_time
-        yaw_rad = yaw * math.pi / 180.0
-        pitch = pitch * self._delta_time
-        pitch_rad = pitch *  math.pi / 180.0
-        roll = roll * self._delta_time
-        roll_rad = roll * math.pi / 180.0
-        #print("GYRO: {} {} {}".format(yaw, pitch, roll))
-        #print("GYRO: {} | {} | {} | {} | {}".format(state.gyaw, old_yaw, yaw, yaw_rad, self._delta_time))
-
-        # Obtain current quaternion
-        # qx (Roll), qy (Pitch), qz (Yaw), qw (Theta)
-        qx = math.sin(roll_rad/2) * math.cos(pitch_rad/2) * math.cos(yaw_rad/2) - math.cos(roll_rad/2) * math.sin(pitch_rad/2) * math.sin(yaw_rad/2)
-        qy = math.cos(roll_rad/2) * math.sin(pitch_rad/2) * math.cos(yaw_rad/2) + math.sin(roll_rad/2) * math.cos(pitch_rad/2) * math.sin(yaw_rad/2)
-        qz = math.cos(roll_rad/2) * math.cos(pitch_rad/2) * math.sin(yaw_rad/2) - math.sin(roll_rad/2) * math.sin(pitch_rad/2) * math.cos(yaw_rad/2)
-        qw = math.cos(roll_rad/2) * math.cos(pitch_rad/2) * math.cos(yaw_rad/2) + math.sin(roll_rad/2) * math.sin(pitch_rad/2) * math.sin(yaw_rad/2)
-
-        # Multiply previous calculated quaternion by new quaternion
-        (old_qw, old_qx, old_qy, old_qz) = self._previous_quat
-        Q0Q1_w = old_qw * qw - old_qx * qx - old_qy * qy - old_qz * qz
-        Q0Q1_x = old_qw * qx + old_qx * qw + old_qy * qz - old_qz * qy
-        Q0Q1_y = old_qw * qy - old_qx * qz + old_qy * qw + old_qz * qx
-        Q0Q1_z = old_qw * qz + old_qx * qy - old_qy * qx + old_qz * qw
+        # Quaternion is computed in frame where x is roll, y pitch and
+        # z yaw axis. Accelerometer measures gravity along -z there, while
+        # GyroProcessor expects +z, so acceleration is negated.
+        scale = DS5HidRawController.GYRO_SCALE
+        gyro = self._gyro
+        gyro.update(state.groll * scale, state.gpitch * scale, state.gyaw * scale,
+            -state.accel_y, -state.accel_x, state.accel_z, self._delta_time)
 
         # Convert normalized values to mapper expected range and store
         # in state object
         # q1 (Theta), q2 (Pitch), q3 (Roll), q4 (Yaw)
-        state.q1 = int(Q0Q1_w * 32767.0)
-        state.q2 = int(Q0Q1_y * 32767.0)
-        state.q3 = int(Q0Q1_x * 32767.0)
+        state.q1 = int(gyro.qw * 32767.0)
+        state.q2 = int(gyro.qy * 32767.0)
+        state.q3 = int(gyro.qx * 32767.0)
         # Invert Yaw to match Steam Controller
-        state.q4 = int(Q0Q1_z * -32767.0)
-        # Store calculated quaternion for next poll
-        self._previous_quat = [Q0Q1_w, Q0Q1_x, Q0Q1_y, Q0Q1_z]
-        #print("TEST QUAT: {}".format(self._previous_quat))
-        #print("TEST QUAT Z: {}".format(self._previous_quat[3] * -1))
+        state.q4 = int(gyro.qz * -32767.0)
 
     def close(self):
         if self._poller:
@@ -997,6 +942,44 @@ class DS5HidRawController(Controller):
         return True
 
 
+# Input report received over bluetooth (type 0x31) is decoded with single
+# unpack: sticks, triggers, 3 bytes of buttons, gyro and accel and first
+# touch point. Everything that is not copied directly is looked up in
+# tables indexed by value of byte it's decoded from.
+BT_REPORT = struct.Struct("<2x4B2Bx3B5x6h5x4B")
+
+
+def _make_button_table(bits):
+    """
+    Returns table of SCButtons pressed for every value of byte, where
+    bits[n] is button reported by n-th bit.
+    """
+    table = []
+    for value in range(256):
+        buttons = 0
+        for bit, button in enumerate(bits):
+            if button and value & (1 << bit):
+                buttons |= button
+        table.append(buttons)
+    return table
+
+
+BT_STICK = [ DS5HidRawController._stick_axis_scale(x, False) for x in range(256) ]
+BT_STICK_INVERTED = [ DS5HidRawController._stick_axis_scale(x, True) for x in range(256) ]
+# Low 4 bits of first byte are dpad, high 4 are face buttons.
+# Dpad in any position but centered (8) presses LPAD.
+BT_BUTTONS_0 = [ buttons | (0 if value & 0x0F == 8 else SCButtons.LPAD | SCButtons.LPADTOUCH)
+    for value, buttons in enumerate(_make_button_table((
+        None, None, None, None, SCButtons.X, SCButtons.A, SCButtons.B, SCButtons.Y))) ]
+BT_BUTTONS_1 = _make_button_table((SCButtons.LB, SCButtons.RB, SCButtons.LT, SCButtons.RT,
+    SCButtons.BACK, SCButtons.START, SCButtons.STICKPRESS, SCButtons.RPAD))
+BT_BUTTONS_2 = _make_button_table((SCButtons.C, SCButtons.CPADPRESS))
+BT_DPAD_X = [ DS5HidRawController.DPAD_STATE_TYPES.get(value & 0x0F,
+    DS5HidRawController.DPAD_CENTERED_STATE).x for value in range(256) ]
+BT_DPAD_Y = [ DS5HidRawController.DPAD_STATE_TYPES.get(value & 0x0F,
+    DS5HidRawController.DPAD_CENTERED_STATE).y for value in range(256) ]
+
+
 class DS5EvdevController(EvdevController):
     TOUCH_FACTOR_X = STICK_PAD_MAX / 940.0
     TOUCH_FACTOR_Y = STICK_PAD_MAX / 470.0
@@ -1090,65 +1073,55 @@ class DS5EvdevController(EvdevController):
             self.poller.register(gyro.fd, self.poller.POLLIN, self._gyro_input)
 
     def _gyro_input(self, *a):
-        new_state = self._state
+        state = self._next_state
         try:
             for event in self._gyro.read():
                 if event.type == self.ECODES.EV_ABS:
                     axis, factor = DS5EvdevController.GYRO_MAP[event.code]
                     if axis:
-                        new_state = new_state._replace(
-                            **{axis: int(event.value * factor)}
-                        )
+                        setattr(state, axis, int(event.value * factor))
+                        self._changed = True
+                elif event.type == self.ECODES.EV_SYN and event.code == self.ECODES.SYN_REPORT:
+                    self._commit()
+                    state = self._next_state
         except OSError:
             # Errors here are not even reported, evdev class handles important ones
             return
 
-        if new_state is not self._state:
-            old_state, self._state = self._state, new_state
-            if self.mapper:
-                self.mapper.input(self, old_state, new_state)
-
     def _touchpad_input(self, *a):
-        new_state = self._state
+        state = self._next_state
         try:
             for event in self._touchpad.read():
                 if event.type == self.ECODES.EV_ABS:
                     if event.code == self.ECODES.ABS_MT_POSITION_X:
                         value = event.value * DS5EvdevController.TOUCH_FACTOR_X
-                        value = STICK_PAD_MIN + int(value)
-                        new_state = new_state._replace(cpad_x=value)
+                        state.cpad_x = STICK_PAD_MIN + int(value)
+                        self._changed = True
                     elif event.code == self.ECODES.ABS_MT_POSITION_Y:
                         value = event.value * DS5EvdevController.TOUCH_FACTOR_Y
-                        value = STICK_PAD_MAX - int(value)
-                        new_state = new_state._replace(cpad_y=value)
-                elif event.type == 0:
-                    pass
+                        state.cpad_y = STICK_PAD_MAX - int(value)
+                        self._changed = True
+                elif event.type == self.ECODES.EV_SYN:
+                    if event.code == self.ECODES.SYN_REPORT:
+                        self._commit()
+                        state = self._next_state
                 elif event.code == self.ECODES.BTN_LEFT:
                     if event.value == 1:
-                        b = new_state.buttons | SCButtons.CPADPRESS
-                        new_state = new_state._replace(buttons=b)
+                        state.buttons |= SCButtons.CPADPRESS
                     else:
-                        b = new_state.buttons & ~SCButtons.CPADPRESS
-                        new_state = new_state._replace(buttons=b)
+                        state.buttons &= ~SCButtons.CPADPRESS
+                    self._changed = True
                 elif event.code == self.ECODES.BTN_TOUCH:
                     if event.value == 1:
-                        b = new_state.buttons | SCButtons.CPADTOUCH
-                        new_state = new_state._replace(buttons=b)
+                        state.buttons |= SCButtons.CPADTOUCH
                     else:
-                        b = new_state.buttons & ~SCButtons.CPADTOUCH
-                        new_state = new_state._replace(
-                            buttons=b,
-                            cpad_x=0, cpad_y=0
-                            )
+                        state.buttons &= ~SCButtons.CPADTOUCH
+                        state.cpad_x, state.cpad_y = 0, 0
+                    self._changed = True
         except OSError:
             # Errors here are not even reported, evdev class handles important ones
             return
 
-        if new_state is not self._state:
-            old_state, self._state = self._state, new_state
-            if self.mapper:
-                self.mapper.input(self, old_state, new_state)
-
     def close(self):
         EvdevController.close(self)
         for device in (self._gyro, self._touchpad):
@@ -6,6 +6,7 @@ devices is read from config file.
 """
 
 from evdev import InputDevice
+from scc import latency
 from scc.constants import STICK_PAD_MAX, STICK_PAD_MIN, TRIGGER_MAX, TRIGGER_MIN, ControllerFlags, SCButtons
 from scc.controller import Controller
 from scc.paths import get_config_path
@@ -25,6 +26,7 @@ except ImportError:
 	ecodes = FakeECodes()
 
 import binascii
+import ctypes
 import json
 import logging
 import os
@@ -47,6 +49,25 @@ AxisCalibrationData = namedtuple('AxisCalibrationData',
 	'scale offset center clamp_min clamp_max deadzone'
 )
 
+
+class EvdevControllerState(ctypes.Structure):
+	"""
+	Mutable state with same fields as EvdevControllerInput. Every controller
+	keeps two instances; Events are written into one while other holds state
+	last passed to mapper and they are swapped on every SYN_REPORT.
+	"""
+	_fields_ = [ ("buttons", ctypes.c_uint32) ] + [
+		(name, ctypes.c_int32) for name in EvdevControllerInput._fields[1:] ]
+
+
+# Kinds of entries in dispatch table
+DISPATCH_BUTTON     = 0		# (kind, button)
+DISPATCH_KEY_AXIS   = 1		# (kind, axis)
+DISPATCH_KEY_DPAD   = 2		# (kind, axis, value, touch_check, touch_set)
+DISPATCH_ABS        = 3		# (kind, axis, table, min, calibration, touch_check, touch_set)
+# Axes with longer range are calibrated without table
+CALIBRATION_TABLE_LIMIT = 4096
+
 class EvdevController(Controller):
 	"""Wrapper around evdev device.
 
@@ -78,7 +99,12 @@ class EvdevController(Controller):
 			self.poller.register(self.device.fd, self.poller.POLLIN, self.input)
 			self.device.grab()
 			self._id = self._generate_id()
-		self._state = EvdevControllerInput( *[0] * len(EvdevControllerInput._fields) )
+		self._state = EvdevControllerState()
+		self._next_state = EvdevControllerState()
+		self._state_view = memoryview(self._state).cast("B")
+		self._next_view = memoryview(self._next_state).cast("B")
+		self._changed = False
+		self._need_cancel_padpressemu = False
 		self._padpressemu_task = None
 
 
@@ -87,6 +113,7 @@ class EvdevController(Controller):
 		self._axis_map = {}
 		self._dpad_map = {}
 		self._calibrations = {}
+		self._ranges = {}
 
 		for x, value in config.get("buttons", {}).items():
 			try:
@@ -102,13 +129,62 @@ class EvdevController(Controller):
 			code, axis = int(x), value.get("axis")
 			if axis in EvdevControllerInput._fields:
 				self._calibrations[code] = parse_axis(value)
+				self._ranges[code] = value.get("min", -127), value.get("max", 128)
 				self._axis_map[code] = axis
 		for x, value in config.get("dpads", {}).items():
 			code, axis = int(x), value.get("axis")
 			if axis in EvdevControllerInput._fields:
 				self._calibrations[code] = parse_axis(value)
+				self._ranges[code] = value.get("min", -127), value.get("max", 128)
 				self._dpad_map[code] = value.get("positive", False)
 				self._axis_map[code] = axis
+		self._dispatch = self._build_dispatch()
+
+
+	def _build_dispatch(self) -> dict:
+		"""
+		Returns dict of (event type, event code) -> entry, with everything
+		needed to apply event precomputed. Calibrated value of every position
+		that axis can report is stored in table, unless there is too many
+		of them.
+
+		Entries are added in reverse order of priority, so when code is
+		mapped as dpad and button (or button and trigger), dpad wins.
+		"""
+		dispatch = {}
+		for code, axis in self._axis_map.items():
+			dispatch[ecodes.EV_KEY, code] = (DISPATCH_KEY_AXIS, axis)
+			if code in self._calibrations:
+				cal = self._calibrations[code]
+				lo, hi = sorted(int(x) for x in self._ranges[code])
+				table = None
+				if hi - lo < CALIBRATION_TABLE_LIMIT:
+					table = [ calibrate(cal, x) for x in range(lo, hi + 1) ]
+				dispatch[ecodes.EV_ABS, code] = ((DISPATCH_ABS, axis, table, lo, cal)
+					+ EvdevController._get_touch_bits(axis))
+		for code, button in self._button_map.items():
+			dispatch[ecodes.EV_KEY, code] = (DISPATCH_BUTTON, button)
+		for code, positive in self._dpad_map.items():
+			axis, cal = self._axis_map[code], self._calibrations[code]
+			value = STICK_PAD_MAX if positive else STICK_PAD_MIN
+			# Clamped, as unlike namedtuple, state can't hold anything bigger
+			value = clamp(STICK_PAD_MIN, int(value * cal.scale * STICK_PAD_MAX), STICK_PAD_MAX)
+			dispatch[ecodes.EV_KEY, code] = ((DISPATCH_KEY_DPAD, axis, value)
+				+ EvdevController._get_touch_bits(axis))
+		return dispatch
+
+
+	@staticmethod
+	def _get_touch_bits(axis: str) -> tuple:
+		"""
+		Returns (touch_check, touch_set) for given axis. Moving axis mapped
+		to pad sets 'touch_set' buttons if 'touch_check' is not set already.
+		"""
+		if axis in ("lpad_x", "lpad_y"):
+			return SCButtons.LPADTOUCH, SCButtons.LPAD | SCButtons.LPADTOUCH
+		if axis in ("rpad_x", "rpad_y"):
+			return SCButtons.RPADTOUCH, SCButtons.RPADTOUCH
+		return 0, 0
 
 
 	def close(self):
@@ -160,76 +236,64 @@ class EvdevController(Controller):
 
 
 	def input(self, *a):
-		new_state = self._state
-		need_cancel_padpressemu = False
+		state = self._next_state
+		dispatch = self._dispatch
+		latency.mark_received(self)
 		try:
 			for event in self.device.read():
-				if event.type == ecodes.EV_KEY and event.code in self._dpad_map:
-					cal = self._calibrations[event.code]
-					if event.value:
-						if self._dpad_map[event.code]:
-							# Positive
-							value = STICK_PAD_MAX
-						else:
-							value = STICK_PAD_MIN
-						cal = self._calibrations[event.code]
-						value = int(value * cal.scale * STICK_PAD_MAX)
-					else:
-						value = 0
-					axis = self._axis_map[event.code]
-					if not new_state.buttons & SCButtons.LPADTOUCH and axis in ("lpad_x", "lpad_y"):
-						b = new_state.buttons | SCButtons.LPAD | SCButtons.LPADTOUCH
-						need_cancel_padpressemu = True
-						new_state = new_state._replace(buttons=b, **{ axis : value })
-					elif not new_state.buttons & SCButtons.RPADTOUCH and axis in ("rpad_x", "rpad_y"):
-						b = new_state.buttons | SCButtons.RPADTOUCH
-						need_cancel_padpressemu = True
-						new_state = new_state._replace(buttons=b, **{ axis : value })
-					else:
-						new_state = new_state._replace(**{ axis : value })
-				elif event.type == ecodes.EV_KEY and event.code in self._button_map:
-					if event.value:
-						b = new_state.buttons | self._button_map[event.code]
-						new_state = new_state._replace(buttons=b)
+				entry = dispatch.get((event.type, event.code))
+				if entry is None:
+					if event.type == ecodes.EV_SYN and event.code == ecodes.SYN_REPORT:
+						self._commit()
+						state = self._next_state
+					continue
+				kind = entry[0]
+				if kind == DISPATCH_ABS:
+					value = event.value - entry[3]
+					table = entry[2]
+					if table is not None and 0 <= value < len(table):
+						value = table[value]
 					else:
-						b = new_state.buttons & ~self._button_map[event.code]
-						new_state = new_state._replace(buttons=b)
-				elif event.type == ecodes.EV_KEY and event.code in self._axis_map:
-					axis = self._axis_map[event.code]
+						value = calibrate(entry[4], event.value)
+					if entry[5] and not state.buttons & entry[5]:
+						state.buttons |= entry[6]
+						self._need_cancel_padpressemu = True
+					setattr(state, entry[1], value)
+				elif kind == DISPATCH_BUTTON:
 					if event.value:
-						new_state = new_state._replace(**{ axis : TRIGGER_MAX })
-					else:
-						new_state = new_state._replace(**{ axis : TRIGGER_MIN })
-				elif event.type == ecodes.EV_ABS and event.code in self._axis_map:
-					cal = self._calibrations[event.code]
-					value = (float(event.value) * cal.scale) + cal.offset
-					if value >= -cal.deadzone and value <= cal.deadzone:
-						value = 0
+						state.buttons |= entry[1]
 					else:
-						value = clamp(cal.clamp_min,
-								int(value * cal.clamp_max), cal.clamp_max)
-					axis = self._axis_map[event.code]
-					if not new_state.buttons & SCButtons.LPADTOUCH and axis in ("lpad_x", "lpad_y"):
-						b = new_state.buttons | SCButtons.LPAD | SCButtons.LPADTOUCH
-						need_cancel_padpressemu = True
-						new_state = new_state._replace(buttons=b, **{ axis : value })
-					elif not new_state.buttons & SCButtons.RPADTOUCH and axis in ("rpad_x", "rpad_y"):
-						b = new_state.buttons | SCButtons.RPADTOUCH
-						need_cancel_padpressemu = True
-						new_state = new_state._replace(buttons=b, **{ axis : value })
-					else:
-						new_state = new_state._replace(**{ axis : value })
+						state.buttons &= ~entry[1]
+				elif kind == DISPATCH_KEY_AXIS:
+					setattr(state, entry[1], TRIGGER_MAX if event.value else TRIGGER_MIN)
+				else:	# DISPATCH_KEY_DPAD
+					if entry[3] and not state.buttons & entry[3]:
+						state.buttons |= entry[4]
+						self._need_cancel_padpressemu = True
+					setattr(state, entry[1], entry[2] if event.value else 0)
+				self._changed = True
 		except OSError as e:
 			# TODO: Maybe check e.errno to determine exact error
 			# all of them are fatal for now
 			log.error(e)
 			_evdevdrv.device_removed(self.device.path)
 
-		if new_state is not self._state:
-			# Something got changed
-			old_state, self._state = self._state, new_state
+
+	def _commit(self):
+		"""
+		Called on SYN_REPORT. If anything was written into back buffer since
+		last call, swaps buffers and passes both states to mapper. Back buffer
+		is then synced with new state, so next events are applied on top of it.
+		"""
+		if not self._changed:
+			return
+		self._changed = False
+		old_state, new_state = self._state, self._next_state
+		self._state, self._next_state = new_state, old_state
+		self._state_view, self._next_view = self._next_view, self._state_view
+		try:
 			if self.mapper:
-				if need_cancel_padpressemu:
+				if self._need_cancel_padpressemu:
 					if self._padpressemu_task:
 						self.mapper.cancel_task(self._padpressemu_task)
 					self._padpressemu_task = self.mapper.schedule(
@@ -237,6 +301,9 @@ class EvdevController(Controller):
 						self.cancel_padpress_emulation
 					)
 				self.mapper.input(self, old_state, new_state)
+		finally:
+			self._need_cancel_padpressemu = False
+			self._next_view[:] = self._state_view
 
 
 	def test_input(self, event):
@@ -264,26 +331,22 @@ class EvdevController(Controller):
 		"""
 
 		need_reschedule = False
-		new_state = self._state
-		if new_state.buttons & SCButtons.LPADTOUCH:
+		state = self._next_state
+		if state.buttons & SCButtons.LPADTOUCH:
 			if self._state.lpad_x == 0 and self._state.lpad_y == 0:
-				b = new_state.buttons & ~(SCButtons.LPAD | SCButtons.LPADTOUCH)
-				new_state = new_state._replace(buttons=b)
+				state.buttons &= ~(SCButtons.LPAD | SCButtons.LPADTOUCH)
+				self._changed = True
 			else:
 				need_reschedule = True
 
-		if new_state.buttons & SCButtons.RPADTOUCH:
+		if state.buttons & SCButtons.RPADTOUCH:
 			if self._state.rpad_x == 0 and self._state.rpad_y == 0:
-				b = new_state.buttons & ~SCButtons.RPADTOUCH
-				new_state = new_state._replace(buttons=b)
+				state.buttons &= ~SCButtons.RPADTOUCH
+				self._changed = True
 			else:
 				need_reschedule = True
 
-		if new_state is not self._state:
-			# Something got changed
-			old_state, self._state = self._state, new_state
-			if self.mapper:
-				self.mapper.input(self, old_state, new_state)
+		self._commit()
 
 		if need_reschedule:
 			self._padpressemu_task = mapper.schedule(
@@ -333,6 +396,14 @@ class EvdevController(Controller):
 		pass
 
 
+def calibrate(cal, value):
+	""" Converts raw axis value to value passed to mapper """
+	value = (float(value) * cal.scale) + cal.offset
+	if value >= -cal.deadzone and value <= cal.deadzone:
+		return 0
+	return clamp(cal.clamp_min, int(value * cal.clamp_max), cal.clamp_max)
+
+
 def parse_axis(axis):
 	min       = axis.get("min", -127)
 	max       = axis.get("max",  128)
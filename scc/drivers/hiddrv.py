@@ -5,10 +5,12 @@ Borrows bit of code and configuration from evdevdrv.
 from __future__ import annotations
 
 import ctypes
+import hashlib
 import json
 import logging
 import os
 import sys
+import tempfile
 from enum import IntEnum
 from typing import TYPE_CHECKING
 
@@ -18,6 +20,7 @@ if TYPE_CHECKING:
 	from scc.device_monitor import DeviceMonitor
 	from scc.sccdaemon import SCCDaemon
 
+from scc import latency
 from scc.constants import STICK_PAD_MAX, STICK_PAD_MIN, ControllerFlags, SCButtons
 from scc.controller import Controller
 from scc.drivers.evdevdrv import FIRST_BUTTON, TRIGGERS, parse_axis
@@ -36,7 +39,7 @@ from scc.lib.hidparse import (
 	UsagePage,
 	parse_report_descriptor,
 )
-from scc.paths import get_config_path
+from scc.paths import get_cache_path, get_config_path
 from scc.tools import find_library
 
 log = logging.getLogger("HID")
@@ -48,6 +51,7 @@ AXIS_COUNT = 20   # Must match number of axis fields in HIDControllerInput and v
 BUTTON_COUNT = 32 # Must match (or be less than) number of bits in HIDControllerInput.buttons
 ALLOWED_SIZES = [1, 2, 4, 8, 16, 32]
 SYS_DEVICES = "/sys/devices"
+DECODER_CACHE_VERSION = 1	# Bump when meaning of HIDDecoder fields changes
 
 
 BLACKLIST = [
@@ -211,6 +215,13 @@ class HIDController(USBDevice, Controller):
 			| ControllerFlags.HAS_DPAD
 			| ControllerFlags.NO_GRIPS )
 
+	# Decoders built from descriptor and config are stored in memory and in
+	# cache directory, as raw bytes of HIDDecoder structure. Header of cached
+	# decoder has to match header computed from descriptor, config file and
+	# code that builds it, otherwise decoder is built again.
+	_decoder_cache: dict[bytes, bytes] = {}
+	_code_version: str | None = None
+
 	def __init__(self, device: USBDevice, daemon: SCCDaemon, handle: USBDeviceHandle, config_file: str, config: dict, test_mode: bool = False):
 		USBDevice.__init__(self, device, handle)
 		self._ready = False
@@ -260,15 +271,97 @@ class HIDController(USBDevice, Controller):
 
 
 	def _load_hid_descriptor(self, config: dict, max_size: int, vid: int, pid: int, test_mode) -> None:
-		hid_descriptor = HIDController.find_sys_devices_descriptor(vid, pid)
+		# Daemon is not available in test mode
+		monitor = self.daemon.get_device_monitor() if self.daemon else None
+		hid_descriptor = HIDController.find_sys_devices_descriptor(vid, pid, monitor)
 		if hid_descriptor is None:
 			hid_descriptor = self.handle.getRawDescriptor(
 					LIBUSB_DT_REPORT, 0, 512)
-		open("report", "wb").write(bytes(list(hid_descriptor)))
-		self._build_hid_decoder(hid_descriptor, config, max_size)
+		header = HIDController._get_decoder_header(vid, pid,
+				bytes(list(hid_descriptor)), config, max_size)
+		self._decoder = HIDController._load_cached_decoder(vid, pid, header)
+		if self._decoder is None:
+			self._build_hid_decoder(hid_descriptor, config, max_size)
+			HIDController._save_cached_decoder(vid, pid, header, self._decoder)
 		self._packet_size = self._decoder.packet_size
 
 
+	@staticmethod
+	def _get_decoder_cache_filename(vid: int, pid: int) -> str:
+		return os.path.join(get_cache_path(), "hid", "%.4x-%.4x.decoder.bin" % (vid, pid))
+
+
+	@staticmethod
+	def _get_decoder_header(vid: int, pid: int, descriptor: bytes, config: dict | None, max_size: int) -> bytes:
+		"""Returns header that cached decoder built for given descriptor and config has to have."""
+		if HIDController._code_version is None:
+			parts = [ "%s.%s" % sys.version_info[0:2], str(ctypes.sizeof(HIDDecoder)) ]
+			for module in (__file__, sys.modules[parse_axis.__module__].__file__):
+				try:
+					stat = os.stat(module)
+					parts.append("%s:%s" % (stat.st_mtime_ns, stat.st_size))
+				except OSError:
+					parts.append("-")
+			HIDController._code_version = hashlib.sha1(
+				" ".join(parts).encode("utf-8")).hexdigest()
+		# Config is hashed as it was used to build decoder, file may
+		# have been changed since it was read
+		config_hash = hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8"))
+		return ("SCCHID %s %s %.4x:%.4x %s %s %s\n" % (
+			DECODER_CACHE_VERSION,
+			HIDController._code_version,
+			vid, pid,
+			hashlib.sha256(descriptor).hexdigest(),
+			config_hash.hexdigest(),
+			max_size,
+		)).encode("utf-8")
+
+
+	@staticmethod
+	def _load_cached_decoder(vid: int, pid: int, header: bytes) -> HIDDecoder | None:
+		"""Returns new decoder with tables copied from cache or None if there is no matching cached decoder."""
+		data = HIDController._decoder_cache.get(header)
+		if data is None:
+			filename = HIDController._get_decoder_cache_filename(vid, pid)
+			try:
+				with open(filename, "rb") as fileobj:
+					if fileobj.readline() != header:
+						return None
+					data = fileobj.read()
+			except FileNotFoundError:
+				return None
+			except Exception as e:
+				log.debug("Failed to load cached decoder '%s': %s", filename, e)
+				return None
+			if len(data) != ctypes.sizeof(HIDDecoder):
+				return None
+			HIDController._decoder_cache[header] = data
+		log.debug("Using cached decoder for %.4x:%.4x", vid, pid)
+		return HIDDecoder.from_buffer_copy(data)
+
+
+	@staticmethod
+	def _save_cached_decoder(vid: int, pid: int, header: bytes, decoder: HIDDecoder) -> None:
+		"""Stores freshly built decoder. Failure is not fatal, decoder will be just built again next time."""
+		data = bytes(decoder)
+		HIDController._decoder_cache[header] = data
+		filename = HIDController._get_decoder_cache_filename(vid, pid)
+		try:
+			path = os.path.dirname(filename)
+			os.makedirs(path, mode=0o700, exist_ok=True)
+			fd, tmp = tempfile.mkstemp(dir=path, suffix=".tmp")
+			try:
+				with os.fdopen(fd, "wb") as fileobj:
+					fileobj.write(header)
+					fileobj.write(data)
+				os.replace(tmp, filename)
+			except BaseException:
+				os.unlink(tmp)
+				raise
+		except Exception as e:
+			log.debug("Failed to save cached decoder '%s': %s", filename, e)
+
+
 	def _build_button_map(self, config: dict):
 		"""Return button map readed from configuration, in format situable for HIDDecoder.buttons.button_map field.
 
@@ -438,11 +531,13 @@ class HIDController(USBDevice, Controller):
 
 
 	@staticmethod
-	def find_sys_devices_descriptor(vid: int, pid: int) -> str | None:
+	def find_sys_devices_descriptor(vid: int, pid: int, monitor: DeviceMonitor | None = None) -> str | None:
 		"""Finds, loads and returns HID descriptor available somewhere deep in /sys/devices structure.
 
-		Done by walking /sys/devices recursivelly, searching for file named
-		'report_descriptor' in subdirectory with name contining vid and pid.
+		If device monitor is passed, file is looked up in its index of HID
+		nodes. Otherwise, it's done by walking /sys/devices recursivelly,
+		searching for file named 'report_descriptor' in subdirectory with
+		name contining vid and pid.
 
 		This is very much prefered before loading HID descriptor from device,
 		as some controllers are presenting descriptor that are completly
@@ -465,8 +560,11 @@ class HIDController(USBDevice, Controller):
 					pass
 			return None
 
-		pattern = ":%.4x:%.4x" % (vid, pid)
-		full_path = recursive_search(pattern, SYS_DEVICES)
+		if monitor is not None:
+			full_path = monitor.get_report_descriptor_path(vid, pid)
+		else:
+			pattern = ":%.4x:%.4x" % (vid, pid)
+			full_path = recursive_search(pattern, SYS_DEVICES)
 		try:
 			if full_path:
 				log.debug("Loading descriptor from '%s'", full_path)
@@ -551,6 +649,9 @@ class HIDController(USBDevice, Controller):
 			if self.mapper:
 				self.mapper.input(self,
 						self._decoder.old_state, self._decoder.state)
+		else:
+			# Nothing changed, packet is dropped
+			latency.clear_received(self)
 
 
 	def apply_config(self, config):
@@ -6,11 +6,11 @@ Shares a lot of classes with sc_dongle.py
 """
 
 from scc.lib.hidraw import HIDRaw
-from scc.constants import ControllerFlags, STICK_PAD_MIN, STICK_PAD_MAX
+from scc import latency
+from scc.constants import ControllerFlags
 from scc.tools import find_library
 from .sc_dongle import SCPacketType, SCPacketLength, SCConfigType
 from .sc_dongle import SCController
-from math import sin, cos
 import os
 import sys
 import struct
@@ -279,29 +279,13 @@ class SCByBt(SCController):
 		r = self.driver._lib.read_input(self._c_data_ptr)
 
 		if r == 1:
+			latency.mark_received(self)
 			if self.mapper is not None:
-				if self._input_rotation_l and (self._state.type & 0x0100) != 0:
-					lx, ly = self._state.lpad_x, self._state.lpad_y
-					s, c = sin(self._input_rotation_l), cos(self._input_rotation_l)
-
-					# Adjust LX for rotation and clamp
-					value = int(lx * c - ly * s)
-					self._state.lpad_x = max(STICK_PAD_MIN, min(STICK_PAD_MAX, value))
-
-					# Adjust LY for rotation and clamp
-					value = int(lx * s + ly * c)
-					self._state.lpad_y = max(STICK_PAD_MIN, min(STICK_PAD_MAX, value))
-				if self._input_rotation_r and (self._state.type & 0x0200) != 0:
-					rx, ry = self._state.rpad_x, self._state.rpad_y
-					s, c = sin(self._input_rotation_r), cos(self._input_rotation_r)
-
-					# Adjust RX for rotation and clamp
-					value = int(rx * c - ry * s)
-					self._state.rpad_x = max(STICK_PAD_MIN, min(STICK_PAD_MAX, value))
-
-					# Adjust RY for rotation and clamp
-					value = int(rx * s + ry * c)
-					self._state.rpad_y = max(STICK_PAD_MIN, min(STICK_PAD_MAX, value))
+				state = self._state
+				if self._input_rotation_l and (state.type & 0x0100) != 0:
+					state.lpad_x, state.lpad_y = self._input_rotation_l.rotate(state.lpad_x, state.lpad_y)
+				if self._input_rotation_r and (state.type & 0x0200) != 0:
+					state.rpad_x, state.rpad_y = self._input_rotation_r.rotate(state.rpad_x, state.rpad_y)
 
 				self.mapper.input(self, self._old_state, self._state)
 			self.flush()
@@ -6,13 +6,13 @@ Shares a lot of classes with sc_dongle.py
 """
 
 import logging
-import struct
 
 from usb1 import USBError
 
+from scc import latency
 from scc.drivers.usb import USBDevice, register_hotplug_device
 
-from .sc_dongle import TUP_FORMAT, ControllerInput, SCController, SCStatus
+from .sc_dongle import STATUS_OFFSET, SCController, SCStatus
 
 VENDOR_ID = 0x28de
 PRODUCT_ID = 0x1102
@@ -39,7 +39,7 @@ class SCByCable(USBDevice, SCController):
 		USBDevice.__init__(self, device, handle)
 		SCController.__init__(self, self, CONTROLIDX, ENDPOINT)
 		self._ready = False
-		self._last_tup = None
+		self._pending = False		# True if there is decoded input not yet passed to mapper
 		daemon.add_mainloop(self._timer)
 
 		self.claim_by(klass=3, subclass=0, protocol=0)
@@ -66,24 +66,33 @@ class SCByCable(USBDevice, SCController):
 
 
 	def _wait_input(self, endpoint, data):
-		tup = ControllerInput._make(struct.unpack(TUP_FORMAT, data))
 		if not self._ready:
 			self.daemon.add_controller(self)
 			self.configure()
 			self._ready = True
-		if tup.status == SCStatus.INPUT:
-			self._last_tup = tup
+		if data[STATUS_OFFSET] == SCStatus.INPUT:
+			if self._pending:
+				# Previous packet was not processed yet, overwrite it
+				self._state_view[:] = data
+			else:
+				self._decode(data)
+				self._pending = True
+		else:
+			latency.clear_received(self)
 
 
 	def _timer(self):
+		# Called on every mainloop iteration. Needs no timeout source, as
+		# it only passes input received from libusb (which poller waits
+		# for) and events generated by scheduled tasks (whose deadlines
+		# poller waits for as well) to mapper.
 		m = self.get_mapper()
 		if m:
-			if self._last_tup:
-				self.input(self._last_tup)
-				self._last_tup = None
+			if self._pending:
+				self._pending = False
+				self._process_input()
 			else:
-				m.generate_events()
-				m.generate_feedback()
+				m.flush_events()
 			try:
 				self.flush()
 			except USBError as e:
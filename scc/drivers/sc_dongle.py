@@ -5,55 +5,67 @@ Handles one or multiple controllers connected to dongle.
 """
 from __future__ import annotations
 
+import ctypes
 import logging
 import struct
-from collections import namedtuple
 from enum import IntEnum
-from math import cos, sin
-from math import pi as PI
 
+from scc import latency
 from scc.config import Config
-from scc.constants import STICK_PAD_MAX, STICK_PAD_MIN, STICKTILT, SCButtons
-from scc.controller import Controller
+from scc.constants import STICKTILT, SCButtons
+from scc.controller import Controller, PadRotation
 from scc.drivers.usb import USBDevice, register_hotplug_device
 
 VENDOR_ID  = 0x28de
 PRODUCT_ID = 0x1142
 FIRST_ENDPOINT = 2
 FIRST_CONTROLIDX = 1
-INPUT_FORMAT = [
-	('b',   'type'),
-	('x',   'ukn_01'),
-	('B',   'status'),
-	('x',   'ukn_02'),
-	('H',   'seq'),
-	('x',   'ukn_03'),
-	('I',   'buttons'),
-	('B',   'ltrig'),
-	('B',   'rtrig'),
-	('x',   'ukn_04'),
-	('x',   'ukn_05'),
-	('x',   'ukn_06'),
-	('h',   'lpad_x'),
-	('h',   'lpad_y'),
-	('h',   'rpad_x'),
-	('h',   'rpad_y'),
-	('4x',  'ukn_06'),
-	('h',   'accel_x'),
-	('h',   'accel_y'),
-	('h',   'accel_z'),
-	('h',   'gpitch'),
-	('h',   'groll'),
-	('h',   'gyaw'),
-	('h',   'q1'),
-	('h',   'q2'),
-	('h',   'q3'),
-	('h',   'q4'),
-	('16x', 'ukn_07')]
-FORMATS, NAMES = zip(*INPUT_FORMAT)
-TUP_FORMAT = '<' + ''.join(FORMATS)
-ControllerInput = namedtuple('ControllerInput', ' '.join([ x for x in NAMES if not x.startswith('ukn_') ]))
-SCI_NULL = ControllerInput._make(struct.unpack('<' + ''.join(FORMATS), b'\x00' * 64))
+
+
+class ControllerInput(ctypes.Structure):
+	"""
+	Input packet as sent by controller. Every controller keeps two instances
+	and received data are copied directly into them, so decoding doesn't
+	allocate anything.
+	"""
+	_pack_ = 1
+	_fields_ = [
+		('type', ctypes.c_int8),
+		('_ukn_01', ctypes.c_uint8),
+		('status', ctypes.c_uint8),
+		('_ukn_02', ctypes.c_uint8),
+		('seq', ctypes.c_uint16),
+		('_ukn_03', ctypes.c_uint8),
+		('buttons', ctypes.c_uint32),
+		('ltrig', ctypes.c_uint8),
+		('rtrig', ctypes.c_uint8),
+		('_ukn_04', ctypes.c_uint8 * 3),
+		('lpad_x', ctypes.c_int16),
+		('lpad_y', ctypes.c_int16),
+		('rpad_x', ctypes.c_int16),
+		('rpad_y', ctypes.c_int16),
+		('_ukn_05', ctypes.c_uint8 * 4),
+		('accel_x', ctypes.c_int16),
+		('accel_y', ctypes.c_int16),
+		('accel_z', ctypes.c_int16),
+		('gpitch', ctypes.c_int16),
+		('groll', ctypes.c_int16),
+		('gyaw', ctypes.c_int16),
+		('q1', ctypes.c_int16),
+		('q2', ctypes.c_int16),
+		('q3', ctypes.c_int16),
+		('q4', ctypes.c_int16),
+		('_ukn_06', ctypes.c_uint8 * 16),
+	]
+
+	def __repr__(self) -> str:
+		return "ControllerInput(%s)" % (", ".join([
+			"%s=%s" % (name, getattr(self, name))
+			for name, _ in self._fields_ if not name.startswith("_")
+		]),)
+
+
+STATUS_OFFSET = ControllerInput.status.offset
 STICKPRESS = 0b1000000000000000000000000000000
 
 
@@ -95,10 +107,13 @@ class Dongle(USBDevice):
 
 
 	def _on_input(self, endpoint, data):
-		tup = ControllerInput._make(struct.unpack(TUP_FORMAT, data))
-		if tup.status == SCStatus.HOTPLUG:
-			# Most of INPUT_FORMAT doesn't apply here
-			if ord(str(data[4])) == 2:
+		# Only status byte is checked here, rest of packet is decoded
+		# by controller itself
+		status = data[STATUS_OFFSET]
+		received = latency.take_received(self)
+		if status == SCStatus.HOTPLUG:
+			# Most of ControllerInput doesn't apply here
+			if data[4] == 2:
 				# Controller connected
 				if endpoint not in self._controllers:
 					self._add_controller(endpoint)
@@ -108,7 +123,7 @@ class Dongle(USBDevice):
 					self.daemon.remove_controller(self._controllers[endpoint])
 					self._controllers[endpoint].disconnected()
 					del self._controllers[endpoint]
-		elif tup.status == SCStatus.INPUT:
+		elif status == SCStatus.INPUT:
 			if endpoint not in self._controllers:
 				self._add_controller(endpoint)
 			elif len(self._no_serial):
@@ -116,7 +131,8 @@ class Dongle(USBDevice):
 					x.read_serial()
 				self._no_serial = []
 			else:
-				self._controllers[endpoint].input(tup)
+				latency.mark_received(self._controllers[endpoint], received)
+				self._controllers[endpoint].input(data)
 
 class SCStatus(IntEnum):
 	IDLE    = 0x04
@@ -160,13 +176,18 @@ class SCController(Controller):
 		self._endpoint = endpoint
 		self._idle_timeout = 600
 		self._enable_gyros = False
-		self._input_rotation_l = 0
-		self._input_rotation_r = 0
+		self._input_rotation_l = PadRotation()
+		self._input_rotation_r = PadRotation()
 		self._led_level = 10
 		# TODO: Is serial really used anywhere?
 		self._serial = "0000000000"
 		self._id = self._generate_id() if driver else "-"
-		self._old_state = SCI_NULL
+		# Two buffers that are swapped on every input, so mapper can
+		# compare new state with previous one
+		self._old_state = ControllerInput()
+		self._state = ControllerInput()
+		self._old_state_view = memoryview(self._old_state).cast("B")
+		self._state_view = memoryview(self._state).cast("B")
 		self._ccidx = ccidx
 
 
@@ -178,50 +199,37 @@ class SCController(Controller):
 		return "<SCWireless %s>" % (self.get_id(),)
 
 
-	def input(self, idata: ControllerInput) -> None:
-		old_state, self._old_state = self._old_state, idata
-		if self.mapper:
-			#if idata.buttons & SCButtons.LPAD:
-			#	# STICKPRESS button may signalize pressing stick instead
-			#	if (idata.buttons & STICKPRESS) and not (idata.buttons & STICKTILT):
-			#		idata = ControllerInput.replace(buttons=idata.buttons & ~SCButtons.LPAD)
-
-			if self._input_rotation_l or self._input_rotation_r:
-				lx, ly = idata.lpad_x, idata.lpad_y
-				rx, ry = idata.rpad_x, idata.rpad_y
-
-				if self._input_rotation_l and idata.buttons & SCButtons.LPADTOUCH:
-					s, c = sin(self._input_rotation_l), cos(self._input_rotation_l)
-					# Adjust LX for rotation and clamp
-					value = int(idata.lpad_x * c - idata.lpad_y * s)
-					lx = max(STICK_PAD_MIN, min(STICK_PAD_MAX, value))
+	def input(self, data) -> None:
+		""" Decodes received packet and passes it to mapper """
+		self._decode(data)
+		self._process_input()
 
-					# Adjust LY for rotation and clamp
-					value = int(idata.lpad_x * s + idata.lpad_y * c)
-					ly = max(STICK_PAD_MIN, min(STICK_PAD_MAX, value))
 
-				if self._input_rotation_r and idata.buttons & SCButtons.RPADTOUCH:
-					s, c = sin(self._input_rotation_r), cos(self._input_rotation_r)
+	def _decode(self, data) -> None:
+		"""
+		Copies received packet over buffer that held state before last one
+		and swaps buffers, so it becomes current state.
+		"""
+		self._old_state, self._state = self._state, self._old_state
+		self._old_state_view, self._state_view = self._state_view, self._old_state_view
+		self._state_view[:] = data
 
-					# Adjust RX for rotation and clamp
-					value = int(idata.rpad_x * c - idata.rpad_y * s)
-					rx = max(STICK_PAD_MIN, min(STICK_PAD_MAX, value))
 
-					# Adjust RY for rotation and clamp
-					value = int(idata.rpad_x * s + idata.rpad_y * c)
-					ry = max(STICK_PAD_MIN, min(STICK_PAD_MAX, value))
+	def _process_input(self) -> None:
+		""" Applies input rotation to current state and passes it to mapper """
+		if self.mapper:
+			idata = self._state
+			#if idata.buttons & SCButtons.LPAD:
+			#	# STICKPRESS button may signalize pressing stick instead
+			#	if (idata.buttons & STICKPRESS) and not (idata.buttons & STICKTILT):
+			#		idata.buttons = idata.buttons & ~SCButtons.LPAD
 
-				# TODO: This is awfull :(
-				idata = ControllerInput(
-						idata.type, idata.status, idata.seq, idata.buttons,
-						idata.ltrig, idata.rtrig,
-						lx, ly, rx, ry,
-						idata.accel_x, idata.accel_y, idata.accel_z,
-						idata.gpitch, idata.groll, idata.gyaw,
-						idata.q1, idata.q2, idata.q3, idata.q4
-				)
+			if self._input_rotation_l and idata.buttons & SCButtons.LPADTOUCH:
+				idata.lpad_x, idata.lpad_y = self._input_rotation_l.rotate(idata.lpad_x, idata.lpad_y)
+			if self._input_rotation_r and idata.buttons & SCButtons.RPADTOUCH:
+				idata.rpad_x, idata.rpad_y = self._input_rotation_r.rotate(idata.rpad_x, idata.rpad_y)
 
-			self.mapper.input(self, old_state, idata)
+			self.mapper.input(self, self._old_state, idata)
 
 
 	def _generate_id(self):
@@ -243,7 +251,7 @@ class SCController(Controller):
 
 	def read_serial(self):
 		""" Requests and reads serial number from controller """
-		if Config()["ignore_serials"]:
+		if Config.get_shared()["ignore_serials"]:
 			# Special exception for cases when controller drops instead of
 			# sending serial number. See issue #103
 			self.generate_serial()
@@ -287,14 +295,14 @@ class SCController(Controller):
 	def apply_config(self, config: dict):
 		self.configure(idle_timeout=int(config['idle_timeout']),
 				led_level=float(config['led_level']))
-		self._input_rotation_l = float(config['input_rotation_l']) * PI / -180.0
-		self._input_rotation_r = float(config['input_rotation_r']) * PI / -180.0
+		self._input_rotation_l.set_angle(config['input_rotation_l'])
+		self._input_rotation_r.set_angle(config['input_rotation_r'])
 
 
 	def disconnected(self):
 		# If ignore_serials config option is enabled, fake serial used by this
 		# controller is stored away and reused when next controller is connected
-		if Config()["ignore_serials"]:
+		if Config.get_shared()["ignore_serials"]:
 			self._driver._available_serials.add(self._serial)
 
 	FORMAT1 = b'>BBBBB13sB2s43x'
@@ -17,6 +17,8 @@ from typing import TYPE_CHECKING
 
 import usb1
 
+from scc import latency
+
 if TYPE_CHECKING:
 	from usb1 import USBDeviceHandle
 
@@ -46,6 +48,7 @@ class USBDevice(object):
 				transfer.getActualLength() != size):
 				return
 
+			latency.mark_received(self)
 			data = transfer.getBuffer()
 			try:
 				callback(endpoint, data)
@@ -124,6 +127,11 @@ class USBDevice(object):
 			callback(data)
 
 
+	def has_pending_messages(self):
+		"""Returns True if there are control messages waiting for flush()."""
+		return len(self._cmsg) > 0 or len(self._rmsg) > 0
+
+
 	def force_restart(self):
 		"""Restart device, close handle and try to re-grab it again.
 
@@ -318,7 +326,28 @@ class USBDriver(object):
 			log.debug("Unregistred USB driver for %.4x:%.4x", vendor_id, product_id)
 
 
+	def get_timeout(self):
+		"""Returns number of seconds until USB needs mainloop to wake up.
+
+		Returns None if nothing is waiting.
+		"""
+		for d in self._devices.values():
+			if d.has_pending_messages():
+				return 0
+		timeout = self._ctx.getNextTimeout() if self._ctx else None
+		if len(self._retry_devices):
+			retry = self._retry_devices_timer - time.time()
+			timeout = retry if timeout is None else min(timeout, retry)
+		return timeout
+
+
 	def mainloop(self):
+		if self._changed == 0 and self._ctx:
+			# Even if no fd is ready, libusb has to handle its internal
+			# timeouts once they expire
+			timeout = self._ctx.getNextTimeout()
+			if timeout is not None and timeout <= 0:
+				self._changed += 1
 		if self._changed > 0:
 			self._ctx.handleEventsTimeout()
 			self._changed = 0
@@ -345,6 +374,7 @@ def init(daemon: SCCDaemon, config: dict) -> bool:
 	_usb.set_daemon(daemon)
 	daemon.add_on_exit(_usb.on_exit)
 	daemon.add_mainloop(_usb.mainloop)
+	daemon.add_timeout_source(_usb.get_timeout)
 	return True
 
 def start(daemon: SCCDaemon):
@@ -45,6 +45,9 @@ class App(Gtk.Application, UserDataManager, BindingEditor):
 	CONFIG = "scc.config.json"
 	RELEASE_URL = "https://github.com/C0rn3j/sc-controller/releases/tag/v%s"
 	OSD_MODE_PROF_NAME = ".scc-osd.profile_editor"
+	TEST_MODE_RATE = 60				# Max. updates per second in Input Test mode
+	TEST_MODE_BUTTONS = ('A', 'B', 'C', 'X', 'Y', 'START', 'BACK', 'LB', 'RB',
+		'LPAD', 'RPAD', 'LGRIP', 'RGRIP', 'LT', 'RT', 'STICKPRESS')
 
 	def __init__(self, gladepath: str = "/usr/share/scc",
 						imagepath: str = "/usr/share/scc/images"):
@@ -83,6 +86,7 @@ class App(Gtk.Application, UserDataManager, BindingEditor):
 		self.outdated_version = None
 		self.profile_switchers = []
 		self.test_mode_controller = None
+		self.test_mode_signal = None
 		self.current_ui_layout = "default"		# only "default" and "deck" are supported
 		self.current_file = None				# Currently edited file
 		self.controller_count = 0
@@ -988,7 +992,10 @@ class App(Gtk.Application, UserDataManager, BindingEditor):
 		"""
 		if self.dm.is_alive() and not self.osd_mode:
 			if self.test_mode_controller:
-				self.test_mode_controller.unlock_all()
+				self.test_mode_controller.disconnect(self.test_mode_signal)
+				self.test_mode_controller.stream(DaemonManager.nocallback,
+					DaemonManager.nocallback, 0)
+				self.test_mode_controller = None
 			try:
 				c = self.dm.get_controllers()[0]
 			except IndexError:
@@ -996,10 +1003,9 @@ class App(Gtk.Application, UserDataManager, BindingEditor):
 				return
 			if c:
 				c.unlock_all()
-				c.observe(DaemonManager.nocallback, self.on_observe_failed,
-					'A', 'B', 'C', 'X', 'Y', 'START', 'BACK', 'LB', 'RB',
-					'LPAD', 'RPAD', 'LGRIP', 'RGRIP', 'LT', 'RT', 'LEFT',
-					'RIGHT', 'STICK', 'STICKPRESS')
+				c.stream(DaemonManager.nocallback, self.on_observe_failed,
+					App.TEST_MODE_RATE)
+				self.test_mode_signal = c.connect('state', self.on_test_mode_state)
 				self.test_mode_controller = c
 
 
@@ -1106,46 +1112,35 @@ class App(Gtk.Application, UserDataManager, BindingEditor):
 	def on_daemon_event_observer(self, daemon, c, what, data):
 		if self.osd_mode_mapper:
 			self.osd_mode_mapper.handle_event(daemon, what, data)
-		elif what in (LEFT, RIGHT, STICK):
-			widget, area = {
-				LEFT  : (self.lpad_test,  "LPADTEST"),
-				RIGHT : (self.rpad_test,  "RPADTEST"),
-				STICK : (self.stick_test, "STICKTEST"),
-			}[what]
-			# Check if stick or pad is released
-			if data[0] == data[1] == 0:
-				widget.hide()
-				return
-			if not widget.is_visible():
-				widget.show()
-			# Grab values
-			ax, ay, aw, trash = self.background.get_area_position(area)
-			cw = widget.get_allocation().width
-			# Compute center
-			x, y = ax + aw * 0.5 - cw * 0.5, ay + 1.0 - cw * 0.5
-			# Add pad position
-			x += data[0] * aw / STICK_PAD_MAX * 0.5
-			y -= data[1] * aw / STICK_PAD_MAX * 0.5
-			# Move circle
-			self.main_area.move(widget, x, y)
-		elif what in ("LT", "RT", "STICKPRESS"):
-			if data[0]:
-				self.hilights[App.OBSERVE_COLOR].add(what)
-			else:
-				self.hilights[App.OBSERVE_COLOR].remove(what)
+
+
+	def on_test_mode_state(self, c, state):
+		self._move_test_cursor(self.lpad_test, "LPADTEST", state.lpad_x, state.lpad_y)
+		self._move_test_cursor(self.rpad_test, "RPADTEST", state.rpad_x, state.rpad_y)
+		self._move_test_cursor(self.stick_test, "STICKTEST", state.stick_x, state.stick_y)
+		pressed = { x for x in App.TEST_MODE_BUTTONS if state.buttons & getattr(SCButtons, x) }
+		if pressed != self.hilights[App.OBSERVE_COLOR]:
+			self.hilights[App.OBSERVE_COLOR] = pressed
 			self._update_background()
-		elif hasattr(SCButtons, what):
-			try:
-				if data[0]:
-					self.hilights[App.OBSERVE_COLOR].add(what)
-				else:
-					self.hilights[App.OBSERVE_COLOR].remove(what)
-				self._update_background()
-			except KeyError as e:
-				# Non fatal
-				pass
-		else:
-			print("event", what)
+
+
+	def _move_test_cursor(self, widget, area, x, y):
+		# Check if stick or pad is released
+		if x == y == 0:
+			widget.hide()
+			return
+		if not widget.is_visible():
+			widget.show()
+		# Grab values
+		ax, ay, aw, trash = self.background.get_area_position(area)
+		cw = widget.get_allocation().width
+		# Compute center
+		cx, cy = ax + aw * 0.5 - cw * 0.5, ay + 1.0 - cw * 0.5
+		# Add pad position
+		cx += x * aw / STICK_PAD_MAX * 0.5
+		cy -= y * aw / STICK_PAD_MAX * 0.5
+		# Move circle
+		self.main_area.move(widget, cx, cy)
 
 
 	def on_profile_right_clicked(self, ps):
@@ -11,6 +11,7 @@ from scc.tools import find_binary, find_button_image, nameof
 from scc.paths import get_daemon_socket
 from scc.constants import SCButtons
 from scc.gui import BUTTON_ORDER
+from scc import stream
 from gi.repository import GObject, Gio, GLib
 
 import os, json, logging
@@ -77,6 +78,7 @@ class DaemonManager(GObject.GObject):
 		self.connection = None
 		self.connecting = False
 		self.buffer = b""
+		self._streams = {}			# stream index -> ControllerManager
 		self._connect()
 		self._requests = []
 		self._controllers = []			# Ordered as daemon says
@@ -151,6 +153,7 @@ class DaemonManager(GObject.GObject):
 			self._on_daemon_died()
 			return
 		self.buffer = b""
+		self._streams = {}
 		self.connection.get_input_stream().read_bytes_async(102400,
 			1, None, self._on_read_data)
 
@@ -171,7 +174,18 @@ class DaemonManager(GObject.GObject):
 			self._on_daemon_died()
 			return
 		self.buffer += data
-		while b"\n" in self.buffer:
+		while self.buffer:
+			if self.buffer[0] == stream.MARKER:
+				# Binary frame with controller state
+				if len(self.buffer) < stream.FRAME.size:
+					break
+				frame, self.buffer = self.buffer[:stream.FRAME.size], self.buffer[stream.FRAME.size:]
+				index, state = stream.decode(frame)
+				if index in self._streams:
+					self._streams[index].emit('state', state)
+				continue
+			if b"\n" not in self.buffer:
+				break
 			line, self.buffer = self.buffer.split(b"\n", 1)
 			line = line.decode("utf-8")
 			if line.startswith("Version:"):
@@ -223,6 +237,9 @@ class DaemonManager(GObject.GObject):
 				c = self.get_controller(data[0])
 				c.emit('event', data[1], [ int(float(x)) for x in data[2:] ])
 				self.emit('event', c, data[1], [ int(float(x)) for x in data[2:] ])
+			elif line.startswith("Stream:"):
+				index, controller_id = line[7:].strip().split(" ", 1)
+				self._streams[int(index)] = self.get_controller(controller_id)
 			elif line.startswith("Error:"):
 				error = line.split(":", 1)[-1].strip()
 				self.alive = True
@@ -336,12 +353,17 @@ class ControllerManager(GObject.GObject):
 		profile-changed (profile)
 			Emited after profile for controller is changed.
 			Profile is filename of currently active profile
+
+		state (state)
+			Emited with scc.stream.StreamState instance when state of
+			controller is changed, after streaming is enabled by stream()
 	"""
 
 	__gsignals__ = {
 			"event"			: (GObject.SignalFlags.RUN_FIRST, None, (object,object)),
 			"lost"				: (GObject.SignalFlags.RUN_FIRST, None, ()),
 			"profile-changed"	: (GObject.SignalFlags.RUN_FIRST, None, (object,)),
+			"state"			: (GObject.SignalFlags.RUN_FIRST, None, (object,)),
 	}
 
 	DEFAULT_ICONS = [ "A", "B", "X", "Y", "BACK", "C", "START",
@@ -532,6 +554,18 @@ class ControllerManager(GObject.GObject):
 		self._dm.request("Observe: %s" % (what,), success_cb, error_cb)
 
 
+	def stream(self, success_cb, error_cb, rate):
+		"""
+		Requests whole state of controller to be sent up to 'rate' times per
+		second, using 'state' signal. Unlike with observe(), this doesn't
+		change how inputs are processed. Rate of 0 stops streaming.
+
+		Calls success_cb() on success or error_cb(error) on failure.
+		"""
+		self._send_id()
+		self._dm.request("Stream: %s" % (rate,), success_cb, error_cb)
+
+
 	def replace(self, success_cb, error_cb, what, action):
 		"""
 		Temporally replaces action on physical button, axis or pad,
@@ -23,6 +23,13 @@ ET.register_namespace('', "http://www.w3.org/2000/svg")
 
 
 class SVGWidget(Gtk.EventBox):
+	"""
+	Hilighted images are composed from layers: Image without any hilights
+	is rendered only once and every hilighted element is rendered (also only
+	once for each color) into separate layer, which holds only part of image
+	changed by recoloring that element. Composed images are kept in LRU
+	cache keyed by set of hilighted elements.
+	"""
 	FILENAME = "background.svg"
 	CACHE_SIZE = 50
 
@@ -40,6 +47,10 @@ class SVGWidget(Gtk.EventBox):
 		Gtk.EventBox.__init__(self)
 		self.cache = OrderedDict()
 		self.areas = []
+		self._tree = None			# Parsed current_svg, created when needed
+		self._elements = None		# id -> element in _tree
+		self._base = None			# Rendered image without hilights
+		self._layers = {}			# (id, color) -> (x, y, pixbuf) or None
 
 		self.connect("motion-notify-event", self.on_mouse_moved)
 		self.connect("button-press-event", self.on_mouse_click)
@@ -58,11 +69,23 @@ class SVGWidget(Gtk.EventBox):
 
 	def set_image(self, filename):
 		self.current_svg = open(filename, "r").read()
-		self.cache = OrderedDict()
+		self.flush_cache()
 		self.areas = []
 		self.parse_image()
 
 
+	def flush_cache(self):
+		"""
+		Throws away all rendered images. Has to be called when
+		current_svg or size is changed.
+		"""
+		self.cache = OrderedDict()
+		self._tree = None
+		self._elements = None
+		self._base = None
+		self._layers = {}
+
+
 	def parse_image(self):
 		"""
 		Goes trought SVG image, searches for all rects named
@@ -83,7 +106,7 @@ class SVGWidget(Gtk.EventBox):
 		so this may be slow and nasty.
 		"""
 		self.size_override = width, height
-		self.cache = OrderedDict()
+		self.flush_cache()
 
 
 	def on_mouse_click(self, trash, event):
@@ -195,40 +218,153 @@ class SVGWidget(Gtk.EventBox):
 
 	def hilight(self, buttons):
 		""" Hilights specified button, if same ID is found in svg """
-		cache_id = "|".join([ "%s:%s" % (x, buttons[x]) for x in buttons ])
-		if not cache_id in self.cache:
-			# Ok, this is close to madness, but probably better than drawing
-			# 200 images by hand;
-			if len(buttons) == 0:
-				# Quick way out - changes are not needed
-				tmp = self.current_svg.encode('utf-8') if type(self.current_svg) == str else self.current_svg
-				svg = Rsvg.Handle.new_from_data(tmp)
-			else:
-				# 1st, parse source as XML
-				tree = ET.fromstring(self.current_svg)
-				# 2nd, change colors of some elements
-				for button in buttons:
-					el = SVGEditor.find_by_id(tree, button)
-					if el is not None:
-						SVGEditor.recolor(el, buttons[button])
-
-				# 3rd, turn it back into XML string......
-				xml = ET.tostring(tree)
-
-				# ... and now, parse that as XML again......
-				svg = Rsvg.Handle.new_from_data(xml)
+		cache_id = frozenset(buttons.items())
+		if cache_id in self.cache:
+			self.cache.move_to_end(cache_id)
+		else:
 			while len(self.cache) >= self.CACHE_SIZE:
 				self.cache.popitem(False)
-			if self.size_override:
-				w, h = self.size_override
-				self.cache[cache_id] = svg.get_pixbuf().scale_simple(
-						w, h, GdkPixbuf.InterpType.BILINEAR)
-			else:
-				self.cache[cache_id] = svg.get_pixbuf()
+			self.cache[cache_id] = self._compose(buttons)
 
 		self.image.set_from_pixbuf(self.cache[cache_id])
 
 
+	def _compose(self, buttons):
+		"""
+		Returns pixbuf with specified elements recolored, composed from
+		cached base image and layers.
+		"""
+		base = self._get_base()
+		layers = [ self._get_layer(id, buttons[id]) for id in buttons ]
+		layers = [ l for l in layers if l is not None ]
+		if not layers:
+			return base
+		for i, (x, y, pixbuf) in enumerate(layers):
+			for x2, y2, pixbuf2 in layers[i + 1:]:
+				if (x < x2 + pixbuf2.get_width() and x2 < x + pixbuf.get_width()
+						and y < y2 + pixbuf2.get_height() and y2 < y + pixbuf.get_height()):
+					# Layers are overlapping and copying one would overwrite
+					# other one. Whole image has to be rendered in such case
+					return self._render(buttons)
+
+		rv = base.copy()
+		for x, y, pixbuf in layers:
+			pixbuf.copy_area(0, 0, pixbuf.get_width(), pixbuf.get_height(), rv, x, y)
+		return rv
+
+
+	def _get_base(self):
+		""" Returns (cached) image without anything hilighted """
+		if self._base is None:
+			self._base = self._render({})
+		return self._base
+
+
+	def _get_layer(self, id, color):
+		"""
+		Returns (x, y, pixbuf) with part of image changed by recoloring
+		element with specified id, or None if there is no such element
+		or it cannot be recolored.
+		"""
+		key = id, color
+		if key not in self._layers:
+			self._layers[key] = None
+			if id in self._get_elements():
+				pixbuf = self._render({ id : color })
+				area = SVGWidget._get_changed_area(self._get_base(), pixbuf)
+				if area:
+					x, y, width, height = area
+					self._layers[key] = x, y, pixbuf.new_subpixbuf(x, y, width, height).copy()
+		return self._layers[key]
+
+
+	def _get_elements(self):
+		"""
+		Returns dict of all elements in image with id set. If there are
+		multiple elements with same id, first one is used.
+		"""
+		if self._elements is None:
+			svg = self.current_svg
+			self._tree = ET.fromstring(svg.encode("utf-8") if type(svg) == str else svg)
+			self._elements = {}
+			for element in self._tree.iter():
+				if element is not self._tree and 'id' in element.attrib:
+					self._elements.setdefault(element.attrib['id'], element)
+		return self._elements
+
+
+	def _render(self, buttons):
+		""" Renders entire image with specified elements recolored """
+		if len(buttons) == 0:
+			# Quick way out - changes are not needed
+			tmp = self.current_svg.encode('utf-8') if type(self.current_svg) == str else self.current_svg
+		else:
+			# Ok, this is close to madness, but probably better than drawing
+			# 200 images by hand;
+			# Colors are changed in parsed tree, turned back into XML
+			# string and restored right after that.
+			elements = self._get_elements()
+			backup = []
+			for button in buttons:
+				el = elements.get(button)
+				if el is not None:
+					backup += [ (e, e.attrib.get('style')) for e in el.iter() ]
+					SVGEditor.recolor(el, buttons[button])
+			tmp = ET.tostring(self._tree)
+			for e, style in reversed(backup):
+				if style is None:
+					e.attrib.pop('style', None)
+				else:
+					e.attrib['style'] = style
+
+		# ... and now, parse that as XML again......
+		pixbuf = Rsvg.Handle.new_from_data(tmp).get_pixbuf()
+		if self.size_override:
+			w, h = self.size_override
+			pixbuf = pixbuf.scale_simple(w, h, GdkPixbuf.InterpType.BILINEAR)
+		return pixbuf
+
+
+	@staticmethod
+	def _get_changed_area(a, b):
+		"""
+		Compares two pixbufs of same size and format. Returns
+		(x, y, width, height) of smallest rectangle containing every
+		pixel that differs, or None if images are same.
+		"""
+		stride, channels = a.get_rowstride(), a.get_n_channels()
+		width, height = a.get_width(), a.get_height()
+		row_length = width * channels
+		pa, pb = a.get_pixels(), b.get_pixels()
+		rows = [ y for y in range(height)
+			if pa[y * stride : y * stride + row_length] != pb[y * stride : y * stride + row_length] ]
+		if not rows:
+			return None
+
+		left, right = width, 0
+		for y in rows:
+			ra = pa[y * stride : y * stride + row_length]
+			rb = pb[y * stride : y * stride + row_length]
+			first = SVGWidget._first_difference(ra, rb)
+			last = row_length - 1 - SVGWidget._first_difference(ra[::-1], rb[::-1])
+			left = min(left, first // channels)
+			right = max(right, last // channels)
+		return left, rows[0], right - left + 1, rows[-1] - rows[0] + 1
+
+
+	@staticmethod
+	def _first_difference(a, b):
+		""" Returns index of first byte that differs in two different strings """
+		lo, hi = 0, len(a)
+		while hi - lo > 1:
+			mid = (lo + hi) // 2
+			if a[lo:mid] == b[lo:mid]:
+				lo = mid
+			else:
+				hi = mid
+		return lo
+
+
 	def get_pixbuf(self):
 		""" Returns pixbuf of current image """
 		return self.image.get_pixbuf()
@@ -295,7 +431,7 @@ class SVGEditor(object):
 		Return self.
 		"""
 		self._svgw.current_svg = ET.tostring(self._tree)
-		self._svgw.cache = OrderedDict()
+		self._svgw.flush_cache()
 		self._svgw.hilight({})
 
 		return self
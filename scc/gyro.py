@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+SC-Controller - Gyro processing
+
+Computes orientation for controllers that report only angular rates (and
+acceleration) and leave integrating them to driver. Steam Controller does
+this in firmware; DualSense connected over bluetooth doesn't.
+
+GyroProcessor keeps orientation as quaternion and, for every sample:
+ - if bias learning is enabled, measures gyro bias while controller rests
+   and subtracts it, so resting controller doesn't slowly turn on its own,
+   even as bias drifts with temperature. Disabled by default, as it can't
+   tell resting controller from one being turned very slowly (under
+   STILL_THRESHOLD) and such turn would be learned as bias and lost,
+ - integrates bias-free rates into orientation,
+ - if fusion is enabled, corrects pitch and roll toward direction of gravity
+   measured by accelerometer (Madgwick's IMU filter). Yaw can't be corrected
+   without magnetometer. Fusion is disabled by default, as corrected
+   orientation moves slightly when controller is shaken, what may be
+   unexpected in games.
+
+All state is kept in float attributes, so processing sample allocates
+nothing but floats it computes.
+"""
+from math import sqrt
+
+
+class GyroProcessor(object):
+	# Controller is resting while rate differs from current bias estimate
+	# by less than this on every axis (rad/s)...
+	STILL_THRESHOLD = 0.05
+	# ... for this many samples in row
+	STILL_SAMPLES = 50
+	# Once first estimate is made, bias follows measured rate at this rate
+	BIAS_RATE = 0.002
+	# Weight of accelerometer correction used with fusion
+	BETA = 0.04
+	# Samples coming after longer pause (first sample, controller was
+	# sleeping) are not integrated
+	MAX_DT = 0.1
+
+	def __init__(self, fusion=False, learn_bias=False):
+		self.fusion = fusion
+		self.learn_bias = learn_bias
+		self.reset()
+		self.calibrate()
+
+
+	def reset(self):
+		"""
+		Resets orientation to identity. With fusion, orientation is instead
+		set to match gravity on next sample.
+		"""
+		self.qw, self.qx, self.qy, self.qz = 1.0, 0.0, 0.0, 0.0
+		self._aligned = False
+
+
+	def calibrate(self):
+		"""
+		Forgets measured bias. New one is measured next time when
+		controller rests.
+		"""
+		self.bias_x = self.bias_y = self.bias_z = 0.0
+		self._still = 0
+		self._bias_samples = 0
+
+
+	def get_quaternion(self):
+		""" Returns (w, x, y, z) tuple """
+		return self.qw, self.qx, self.qy, self.qz
+
+
+	def update(self, gx, gy, gz, ax, ay, az, dt):
+		"""
+		Processes one sample. 'gx', 'gy' and 'gz' are angular rates around
+		x, y and z axes in rad/s. 'ax', 'ay' and 'az' is acceleration in same
+		frame, in any units, as only its direction is used; It has to point
+		along +z when controller rests in identity orientation. 'dt' is time
+		from previous sample in seconds.
+		"""
+		# Bias
+		threshold = GyroProcessor.STILL_THRESHOLD
+		if not self.learn_bias:
+			pass
+		elif (abs(gx - self.bias_x) < threshold and abs(gy - self.bias_y) < threshold
+				and abs(gz - self.bias_z) < threshold):
+			self._still += 1
+			if self._still >= GyroProcessor.STILL_SAMPLES:
+				# Running average until enough samples is collected,
+				# exponential moving average after that
+				self._bias_samples += 1
+				rate = max(1.0 / self._bias_samples, GyroProcessor.BIAS_RATE)
+				self.bias_x += (gx - self.bias_x) * rate
+				self.bias_y += (gy - self.bias_y) * rate
+				self.bias_z += (gz - self.bias_z) * rate
+		else:
+			self._still = 0
+		if dt <= 0 or dt > GyroProcessor.MAX_DT:
+			return
+		gx -= self.bias_x
+		gy -= self.bias_y
+		gz -= self.bias_z
+
+		# Rate of change of orientation, 0.5 * q * (0, gx, gy, gz)
+		qw, qx, qy, qz = self.qw, self.qx, self.qy, self.qz
+		dw = 0.5 * (-qx * gx - qy * gy - qz * gz)
+		dx = 0.5 * (qw * gx + qy * gz - qz * gy)
+		dy = 0.5 * (qw * gy - qx * gz + qz * gx)
+		dz = 0.5 * (qw * gz + qx * gy - qy * gx)
+
+		if self.fusion:
+			norm = sqrt(ax * ax + ay * ay + az * az)
+			if norm > 0:
+				ax, ay, az = ax / norm, ay / norm, az / norm
+				if not self._aligned:
+					# Filter converges slowly, so first orientation is
+					# taken from accelerometer directly
+					self._aligned = True
+					self._align(ax, ay, az)
+					return
+				# Gradient of difference between measured direction of
+				# gravity and direction predicted from orientation
+				qwqw, qxqx, qyqy, qzqz = qw * qw, qx * qx, qy * qy, qz * qz
+				sw = 4.0 * qw * (qyqy + qxqx) + 2.0 * (qy * ax - qx * ay)
+				sx = (4.0 * qx * (qzqz + qwqw + az - 1.0) + 8.0 * qx * (qxqx + qyqy)
+					- 2.0 * (qz * ax + qw * ay))
+				sy = (4.0 * qy * (qwqw + qzqz + az - 1.0) + 8.0 * qy * (qxqx + qyqy)
+					+ 2.0 * (qw * ax - qz * ay))
+				sz = 4.0 * qz * (qxqx + qyqy) - 2.0 * (qx * ax + qy * ay)
+				norm = sqrt(sw * sw + sx * sx + sy * sy + sz * sz)
+				if norm > 0:
+					beta = GyroProcessor.BETA / norm
+					dw -= beta * sw
+					dx -= beta * sx
+					dy -= beta * sy
+					dz -= beta * sz
+
+		qw += dw * dt
+		qx += dx * dt
+		qy += dy * dt
+		qz += dz * dt
+		norm = 1.0 / sqrt(qw * qw + qx * qx + qy * qy + qz * qz)
+		self.qw, self.qx, self.qy, self.qz = qw * norm, qx * norm, qy * norm, qz * norm
+
+
+	def _align(self, ax, ay, az):
+		""" Sets orientation that rotates measured gravity to +z by shortest arc """
+		if az < -0.999999:
+			# Upside down, any axis in xy plane works
+			self.qw, self.qx, self.qy, self.qz = 0.0, 1.0, 0.0, 0.0
+			return
+		norm = 1.0 / sqrt((1.0 + az) ** 2 + ay * ay + ax * ax)
+		self.qw, self.qx, self.qy, self.qz = (1.0 + az) * norm, ay * norm, -ax * norm, 0.0
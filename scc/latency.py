@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+SC-Controller - Latency statistics
+
+Optional instrumentation that measures how long it takes from input being
+received from controller to events being written to emulated devices.
+
+Disabled by default; Enabled by setting 'latency_stats' in configuration.
+While enabled, drivers call mark_received() as soon as raw input is read
+and Mapper records timestamps of each processing stage into LatencyTracer
+assigned to controller. Collected statistics can be requested with
+`Stats.` message.
+"""
+import time, math
+
+
+enabled = False			# Set by daemon from configuration
+
+
+def mark_received(controller, received=None):
+	"""
+	Called by drivers when raw input data for 'controller' is read from
+	device, before it's decoded. Time is stored on controller until Mapper
+	takes it. 'received' may be used to pass time already taken for other
+	object, as when dongle hands packet over to controller connected to it.
+
+	Does nothing unless latency statistics are enabled.
+	"""
+	if enabled:
+		controller.received = time.perf_counter() if received is None else received
+
+
+def take_received(controller):
+	"""
+	Returns time stored by last mark_received() call for 'controller', or
+	None if there was no call since last time, and resets it.
+	"""
+	rv = getattr(controller, "received", None)
+	controller.received = None
+	return rv
+
+
+def clear_received(controller):
+	"""
+	Called by drivers when packet marked by mark_received() is dropped
+	without being passed to mapper, so its time is not used for next one.
+	"""
+	controller.received = None
+
+
+class Histogram(object):
+	"""
+	Log-linear histogram of durations. Every power of two (in microseconds)
+	is split to SUBBUCKETS buckets, so reported percentiles are accurate
+	to ~1/SUBBUCKETS of measured value, while storing just few hundreds
+	of integers regardless of number of samples.
+	"""
+	SUBBUCKETS = 8
+	MAX_EXPONENT = 24		# 2^24 us ~ 16s; anything longer is clamped
+
+	def __init__(self):
+		self._buckets = [0] * ((Histogram.MAX_EXPONENT + 1) * Histogram.SUBBUCKETS)
+		self.count = 0
+		self.max = 0.0
+
+
+	def record(self, seconds):
+		""" Adds one measured duration """
+		us = seconds * 1000000.0
+		if us < 1.0:
+			index = 0
+		else:
+			mantissa, exponent = math.frexp(us)
+			exponent = min(exponent, Histogram.MAX_EXPONENT)
+			index = exponent * Histogram.SUBBUCKETS + int((mantissa - 0.5) * 2 * Histogram.SUBBUCKETS)
+			index = min(index, len(self._buckets) - 1)
+		self._buckets[index] += 1
+		self.count += 1
+		if us > self.max:
+			self.max = us
+
+
+	@staticmethod
+	def _upper_bound(index):
+		""" Returns highest value (in us) that falls to bucket with given index """
+		exponent, sub = divmod(index, Histogram.SUBBUCKETS)
+		if exponent == 0:
+			return 1.0
+		return math.ldexp(0.5 + (sub + 1) / (2.0 * Histogram.SUBBUCKETS), exponent)
+
+
+	def percentile(self, p):
+		"""
+		Returns value (in microseconds) under which falls 'p' percent of
+		recorded samples, or 0 if nothing was recorded.
+		"""
+		if self.count == 0:
+			return 0.0
+		limit = self.count * p / 100.0
+		total = 0
+		for i, c in enumerate(self._buckets):
+			total += c
+			if c and total >= limit:
+				return min(Histogram._upper_bound(i), self.max)
+		return self.max
+
+
+	def reset(self):
+		for i in range(len(self._buckets)):
+			self._buckets[i] = 0
+		self.count = 0
+		self.max = 0.0
+
+
+class LatencyTracer(object):
+	"""
+	Collects per-stage latency histograms for single controller.
+
+	Stages are:
+	 - decode    - from driver receiving data to Mapper.input being called
+	 - dispatch  - actions processing inputs in Mapper.input
+	 - scheduler - running scheduled tasks
+	 - emit      - writing events to emulated devices and sending feedback
+	 - total     - everything above together
+	"""
+	STAGES = ("decode", "dispatch", "scheduler", "emit", "total")
+	PERCENTILES = (50, 90, 99)
+
+	def __init__(self):
+		self.histograms = { stage : Histogram() for stage in LatencyTracer.STAGES }
+		self._decode = self.histograms["decode"]
+		self._dispatch = self.histograms["dispatch"]
+		self._scheduler = self.histograms["scheduler"]
+		self._emit = self.histograms["emit"]
+		self._total = self.histograms["total"]
+
+
+	def record(self, received, started, dispatched, scheduled, emitted):
+		"""
+		Records timestamps (as returned by time.perf_counter) of single input
+		going through mapper. 'received' may be None if driver doesn't
+		report when input was read.
+		"""
+		if received is None:
+			received = started
+		else:
+			self._decode.record(started - received)
+		self._dispatch.record(dispatched - started)
+		self._scheduler.record(scheduled - dispatched)
+		self._emit.record(emitted - scheduled)
+		self._total.record(emitted - received)
+
+
+	def reset(self):
+		for h in self.histograms.values():
+			h.reset()
+
+
+	def report(self):
+		"""
+		Yields (stage, count, p50, p90, p99, max) tuple for every stage.
+		All values are in microseconds.
+		"""
+		for stage in LatencyTracer.STAGES:
+			h = self.histograms[stage]
+			yield tuple([ stage, h.count ]
+				+ [ h.percentile(p) for p in LatencyTracer.PERCENTILES ]
+				+ [ h.max ])
@@ -3,6 +3,7 @@ import os
 import time
 import traceback
 
+from scc import latency
 from scc.actions import ButtonAction, GyroAbsAction
 from scc.aliases import ALL_AXES, ALL_BUTTONS
 from scc.config import Config
@@ -40,6 +41,12 @@ class Mapper(object):
 
 		Emulated gamepad will have rumble enabled only if poller is set to instance and configuration allows it.
 		"""
+		self._plan = []							# see _compile
+		self._plan_generation = 0				# increased by invalidate_plan
+		self._compiled_generation = -1
+		self._plan_controller = None
+		self._bound_buttons = []
+		self._bound_mask = 0
 		self.profile = profile
 		self.controller = None
 		self.xdisplay = None
@@ -63,6 +70,7 @@ class Mapper(object):
 		self.keyrelease_list = []
 		self.mouse_movements = [0, 0, 0, 0, 0, 0]		# mouse x, y, wheel vertical, horisontal, stick mouse x, stick mouse y
 		self.feedbacks = [ None, None ]			# left, right
+		self.feedback_sent = False				# set when feedback is sent, reset by MapperWorker
 		self.pressed = {}						# for ButtonAction, holds number of times virtual button was pressed without releasing it first
 		self.syn_list = set()
 		self.buttons, self.old_buttons = 0, 0
@@ -79,7 +87,7 @@ class Mapper(object):
 			# If set, no gamepad is emulated
 			self.gamepad = Dummy()
 			return
-		cfg = Config()
+		cfg = Config.get_shared()
 		keys = ALL_BUTTONS[0:cfg["output"]["buttons"]]
 		vendor = int(cfg["output"]["vendor"], 16)
 		product = int(cfg["output"]["product"], 16)
@@ -157,7 +165,11 @@ class Mapper(object):
 
 
 	def sync(self):
-		""" Syncs generated events """
+		"""
+		Syncs generated events.
+		Every device buffers its events until synced, so this results in
+		one write per device that had something to send.
+		"""
 		if len(self.syn_list):
 			for dev in self.syn_list:
 				dev.synEvent()
@@ -167,6 +179,7 @@ class Mapper(object):
 	def set_controller(self, c):
 		""" Sets controller device, used by some (one so far) actions """
 		self.controller = c
+		self.invalidate_plan()
 
 
 	def get_controller(self):
@@ -393,8 +406,189 @@ class Mapper(object):
 				a.reset()
 
 
-	def input(self, controller, old_state, state):
-#		print(type(controller), type(old_state), type(state))
+	@property
+	def profile(self):
+		return self._profile
+
+
+	@profile.setter
+	def profile(self, profile):
+		self._profile = profile
+		self.invalidate_plan()
+
+
+	def invalidate_plan(self):
+		"""
+		Forces dispatch plan to be rebuilt before next input is processed.
+
+		Has to be called when action assigned to some input in current
+		profile is replaced in place. Assigning new profile or controller
+		does this automatically.
+
+		May be called from other thread; Plan that is being built while
+		this is called is thrown away on next input.
+		"""
+		self._plan_generation += 1
+
+
+	def _compile(self, controller):
+		"""
+		Builds dispatch plan - list of methods that are called on every
+		input, one for each input that has action bound to it.
+		Unbound sticks, pads and triggers are not included at all.
+		"""
+		generation = self._plan_generation
+		profile = self.profile
+		flags = controller.flags
+		plan = []
+
+		self._bound_buttons = [ x for x in profile.buttons if profile.buttons[x] ]
+		self._bound_mask = 0
+		for x in self._bound_buttons:
+			self._bound_mask |= x
+		if self._bound_buttons:
+			plan.append(self._input_buttons)
+
+		if flags & ControllerFlags.SEPARATE_STICK:
+			if profile.stick:
+				plan.append(self._input_stick)
+		elif profile.stick:
+			plan.append(self._input_stick_on_lpad)
+		if flags & ControllerFlags.IS_DECK and profile.rstick:
+			plan.append(self._input_rstick)
+
+		if profile.gyro:
+			plan.append(self._input_gyro)
+
+		if profile.triggers.get(LEFT):
+			plan.append(self._input_ltrig)
+		if profile.triggers.get(RIGHT):
+			plan.append(self._input_rtrig)
+
+		if profile.pads[RIGHT]:
+			if flags & (ControllerFlags.IS_DECK | ControllerFlags.HAS_RSTICK):
+				plan.append(self._input_rpad)
+			else:
+				plan.append(self._input_rpad_touch)
+		if flags & ControllerFlags.IS_DECK and profile.pads[DPAD]:
+			plan.append(self._input_dpad)
+
+		if flags & ControllerFlags.SEPARATE_STICK:
+			if profile.pads[LEFT]:
+				plan.append(self._input_lpad)
+		elif profile.pads[LEFT] or profile.stick:
+			# Stick recentering is detected here as well
+			plan.append(self._input_lpad_touch)
+			self.lpad_touched = bool(self.buttons & SCButtons.LPADTOUCH)
+
+		if flags & ControllerFlags.HAS_CPAD and profile.pads[CPAD]:
+			plan.append(self._input_cpad)
+
+		self._plan = plan
+		self._plan_controller = controller
+		self._compiled_generation = generation
+
+
+	def _input_buttons(self, controller, state, fe, btn_add, btn_rem):
+		if (btn_add | btn_rem) & self._bound_mask:
+			# At least one bound button was pressed or released
+			buttons = self.profile.buttons
+			for x in self._bound_buttons:
+				if x & btn_add:
+					buttons[x].button_press(self)
+				elif x & btn_rem:
+					buttons[x].button_release(self)
+
+
+	def _input_stick(self, controller, state, fe, btn_add, btn_rem):
+		if FE_STICK in fe or self.old_state.stick_x != state.stick_x or self.old_state.stick_y != state.stick_y:
+			self.profile.stick.whole(self, state.stick_x, state.stick_y, STICK)
+
+
+	def _input_stick_on_lpad(self, controller, state, fe, btn_add, btn_rem):
+		if not self.buttons & SCButtons.LPADTOUCH:
+			if FE_STICK in fe or self.old_state.lpad_x != state.lpad_x or self.old_state.lpad_y != state.lpad_y:
+				self.profile.stick.whole(self, state.lpad_x, state.lpad_y, STICK)
+
+
+	def _input_rstick(self, controller, state, fe, btn_add, btn_rem):
+		if FE_STICK in fe or self.old_state.rstick_x != state.rstick_x or self.old_state.rstick_y != state.rstick_y:
+			self.profile.rstick.whole(self, state.rstick_x, state.rstick_y, RSTICK)
+
+
+	def _input_gyro(self, controller, state, fe, btn_add, btn_rem):
+		if controller.get_gyro_enabled():
+			self.profile.gyro.gyro(self, state.gpitch, state.gyaw, state.groll, state.q1, state.q2, state.q3, state.q4)
+
+
+	def _input_ltrig(self, controller, state, fe, btn_add, btn_rem):
+		if FE_TRIGGER in fe or state.ltrig != self.old_state.ltrig:
+			self.profile.triggers[LEFT].trigger(self, state.ltrig, self.old_state.ltrig)
+
+
+	def _input_rtrig(self, controller, state, fe, btn_add, btn_rem):
+		if FE_TRIGGER in fe or state.rtrig != self.old_state.rtrig:
+			self.profile.triggers[RIGHT].trigger(self, state.rtrig, self.old_state.rtrig)
+
+
+	def _input_rpad(self, controller, state, fe, btn_add, btn_rem):
+		if FE_PAD in fe or self.old_state.rpad_x != state.rpad_x or self.old_state.rpad_y != state.rpad_y:
+			self.profile.pads[RIGHT].whole(self, state.rpad_x, state.rpad_y, RIGHT)
+
+
+	def _input_rpad_touch(self, controller, state, fe, btn_add, btn_rem):
+		if FE_PAD in fe or self.buttons & SCButtons.RPADTOUCH or SCButtons.RPADTOUCH & btn_rem:
+			self.profile.pads[RIGHT].whole(self, state.rpad_x, state.rpad_y, RIGHT)
+
+
+	def _input_dpad(self, controller, state, fe, btn_add, btn_rem):
+		if FE_PAD in fe or self.old_state.dpad_x != state.dpad_x or self.old_state.dpad_y != state.dpad_y:
+			self.profile.pads[DPAD].whole(self, state.dpad_x, state.dpad_y, DPAD)
+
+
+	def _input_lpad(self, controller, state, fe, btn_add, btn_rem):
+		if FE_PAD in fe or self.old_state.lpad_x != state.lpad_x or self.old_state.lpad_y != state.lpad_y:
+			self.profile.pads[LEFT].whole(self, state.lpad_x, state.lpad_y, LEFT)
+
+
+	def _input_lpad_touch(self, controller, state, fe, btn_add, btn_rem):
+		if self.buttons & SCButtons.LPADTOUCH:
+			# Pad is being touched now
+			if not self.lpad_touched:
+				self.lpad_touched = True
+			self.profile.pads[LEFT].whole(self, state.lpad_x, state.lpad_y, LEFT)
+			if self.old_state.buttons & STICKTILT and not self.buttons & STICKTILT:
+				# LPAD and stick share axes and so when they are used simultaneously (by someone with 3 hands or so :)
+				# this is how mapper can tell that stick was recentered
+				self.profile.stick.whole(self, 0, 0, STICK)
+		elif not self.buttons & STICKTILT:
+			# Pad is not being touched
+			if self.lpad_touched:
+				self.lpad_touched = False
+				self.profile.pads[LEFT].whole(self, 0, 0, LEFT)
+
+
+	def _input_cpad(self, controller, state, fe, btn_add, btn_rem):
+		# CPAD (touchpad on DS4 controller)
+		if ((FE_PAD in fe)
+				or (self.old_state.cpad_x != state.cpad_x)
+				or (self.old_state.cpad_y != state.cpad_y)
+				or ((self.old_buttons & SCButtons.CPADTOUCH) and not (self.buttons & SCButtons.CPADTOUCH))
+			):
+			if self.buttons & SCButtons.CPADTOUCH:
+				self.profile.pads[CPAD].whole(self, state.cpad_x, state.cpad_y, CPAD)
+			elif self.old_buttons & SCButtons.CPADTOUCH:
+				self.profile.pads[CPAD].whole(self, 0, 0, CPAD)
+
+
+	def input(self, controller, old_state, state, received=None):
+		"""
+		Processes input from controller. 'received', if set, is time when
+		input was read by driver, as reported by latency.take_received().
+		"""
+		tracer = controller.latency
+		if tracer:
+			started = time.perf_counter()
 		# Store states
 		self.old_state = old_state
 		self.old_buttons = self.buttons
@@ -418,84 +612,10 @@ class Mapper(object):
 		btn_add = xor & self.buttons
 
 		try:
-			if btn_add or btn_rem:
-				# At least one button was pressed
-				for x in self.profile.buttons:
-					if x & btn_add:
-						self.profile.buttons[x].button_press(self)
-					elif x & btn_rem:
-						self.profile.buttons[x].button_release(self)
-
-
-			# Check sticks
-			if self.controller.flags & ControllerFlags.SEPARATE_STICK:
-				if FE_STICK in fe or self.old_state.stick_x != state.stick_x or self.old_state.stick_y != state.stick_y:
-					self.profile.stick.whole(self, state.stick_x, state.stick_y, STICK)
-			elif not self.buttons & SCButtons.LPADTOUCH:
-				if FE_STICK in fe or self.old_state.lpad_x != state.lpad_x or self.old_state.lpad_y != state.lpad_y:
-					self.profile.stick.whole(self, state.lpad_x, state.lpad_y, STICK)
-			if self.controller.flags & ControllerFlags.IS_DECK:
-				if FE_STICK in fe or self.old_state.rstick_x != state.rstick_x or self.old_state.rstick_y != state.rstick_y:
-					self.profile.rstick.whole(self, state.rstick_x, state.rstick_y, RSTICK)
-
-			# Check gyro
-			if controller.get_gyro_enabled():
-				self.profile.gyro.gyro(self, state.gpitch, state.gyaw, state.groll, state.q1, state.q2, state.q3, state.q4)
-
-			# Check triggers
-			if FE_TRIGGER in fe or state.ltrig != self.old_state.ltrig:
-				if LEFT in self.profile.triggers:
-					self.profile.triggers[LEFT].trigger(self, state.ltrig, self.old_state.ltrig)
-			if FE_TRIGGER in fe or state.rtrig != self.old_state.rtrig:
-				if RIGHT in self.profile.triggers:
-					self.profile.triggers[RIGHT].trigger(self, state.rtrig, self.old_state.rtrig)
-
-			# Check pads
-			# RPAD
-			if controller.flags & ControllerFlags.IS_DECK:
-				if FE_PAD in fe or self.old_state.rpad_x != state.rpad_x or self.old_state.rpad_y != state.rpad_y:
-					self.profile.pads[RIGHT].whole(self, state.rpad_x, state.rpad_y, RIGHT)
-			elif controller.flags & ControllerFlags.HAS_RSTICK:
-				if FE_PAD in fe or self.old_state.rpad_x != state.rpad_x or self.old_state.rpad_y != state.rpad_y:
-					self.profile.pads[RIGHT].whole(self, state.rpad_x, state.rpad_y, RIGHT)
-			elif FE_PAD in fe or self.buttons & SCButtons.RPADTOUCH or SCButtons.RPADTOUCH & btn_rem:
-				self.profile.pads[RIGHT].whole(self, state.rpad_x, state.rpad_y, RIGHT)
-			# DPAD
-			if controller.flags & ControllerFlags.IS_DECK:
-				if FE_PAD in fe or self.old_state.dpad_x != state.dpad_x or self.old_state.dpad_y != state.dpad_y:
-					self.profile.pads[DPAD].whole(self, state.dpad_x, state.dpad_y, DPAD)
-
-			# LPAD
-			if self.controller.flags & ControllerFlags.SEPARATE_STICK:
-				if FE_PAD in fe or self.old_state.lpad_x != state.lpad_x or self.old_state.lpad_y != state.lpad_y:
-					self.profile.pads[LEFT].whole(self, state.lpad_x, state.lpad_y, LEFT)
-			else:
-				if self.buttons & SCButtons.LPADTOUCH:
-					# Pad is being touched now
-					if not self.lpad_touched:
-						self.lpad_touched = True
-					self.profile.pads[LEFT].whole(self, state.lpad_x, state.lpad_y, LEFT)
-					if self.old_state.buttons & STICKTILT and not self.buttons & STICKTILT:
-						# LPAD and stick share axes and so when they are used simultaneously (by someone with 3 hands or so :)
-						# this is how mapper can tell that stick was recentered
-						self.profile.stick.whole(self, 0, 0, STICK)
-				elif not self.buttons & STICKTILT:
-					# Pad is not being touched
-					if self.lpad_touched:
-						self.lpad_touched = False
-						self.profile.pads[LEFT].whole(self, 0, 0, LEFT)
-
-			# CPAD (touchpad on DS4 controller)
-			if controller.flags & ControllerFlags.HAS_CPAD:
-				if ((FE_PAD in fe)
-						or (self.old_state.cpad_x != state.cpad_x)
-						or (self.old_state.cpad_y != state.cpad_y)
-						or ((self.old_buttons & SCButtons.CPADTOUCH) and not (self.buttons & SCButtons.CPADTOUCH))
-					):
-					if self.buttons & SCButtons.CPADTOUCH:
-						self.profile.pads[CPAD].whole(self, state.cpad_x, state.cpad_y, CPAD)
-					elif self.old_buttons & SCButtons.CPADTOUCH:
-						self.profile.pads[CPAD].whole(self, 0, 0, CPAD)
+			if self._compiled_generation != self._plan_generation or self._plan_controller is not controller:
+				self._compile(controller)
+			for fn in self._plan:
+				fn(controller, state, fe, btn_add, btn_rem)
 		except Exception:
 			# Log error but don't crash here, it breaks too many things at once
 			if hasattr(self, "_testing"):
@@ -503,8 +623,26 @@ class Mapper(object):
 			log.error("Error while processing controller event")
 			log.error(traceback.format_exc())
 
+		if tracer:
+			dispatched = time.perf_counter()
 		# TODO: Is it important to run scheduled stuff before generate_events?
 		self.scheduler.run()
+		if tracer:
+			scheduled = time.perf_counter()
+		self.generate_events()
+		self.generate_feedback()
+		if tracer:
+			if received is None:
+				received = latency.take_received(controller)
+			tracer.record(received, started, dispatched,
+				scheduled, time.perf_counter())
+
+
+	def flush_events(self):
+		"""
+		Generates events and feedback that actions queued without new input
+		being received. Replaced by MapperWorker while mapper runs on it.
+		"""
 		self.generate_events()
 		self.generate_feedback()
 
@@ -541,3 +679,4 @@ class Mapper(object):
 				if self.feedbacks[x]:
 					self.controller.feedback(self.feedbacks[x])
 					self.feedbacks[x] = None
+					self.feedback_sent = True
@@ -189,6 +189,52 @@ class MenuData(object):
 		return MenuData.from_json_data(data["menus"][menuname], action_parser)
 
 
+class MenuDataCache(object):
+	"""
+	Keeps parsed JSON data of profile and menu files, so menu can be loaded
+	without reading and parsing entire file again every time it's displayed.
+
+	File is parsed again only when its modification time or size changes.
+	"""
+
+	def __init__(self):
+		self._cache = {}		# filename -> ((st_mtime_ns, st_size), data)
+
+
+	def _get_data(self, filename):
+		st = os.stat(filename)
+		key = st.st_mtime_ns, st.st_size
+		cached = self._cache.get(filename)
+		if cached is None or cached[0] != key:
+			data = json.loads(open(filename, "r").read())
+			cached = self._cache[filename] = key, data
+		return cached[1]
+
+
+	def from_profile(self, filename, menuname, action_parser=None):
+		"""
+		As MenuData.from_profile, but uses cached data if possible.
+		"""
+		data = self._get_data(filename)
+		if "menus" not in data:
+			raise ValueError("Menu not found")
+		if menuname not in data["menus"]:
+			raise ValueError("Menu not found")
+
+		return MenuData.from_json_data(data["menus"][menuname], action_parser)
+
+
+	def from_file(self, filename, action_parser=None):
+		"""
+		As MenuData.from_file, but uses cached data if possible.
+		"""
+		return MenuData.from_json_data(self._get_data(filename), action_parser)
+
+
+	def clear(self):
+		self._cache = {}
+
+
 class MenuItem(object):
 	""" Really just dummy container """
 	def __init__(self, id, label, action=None, callback=None, icon=None):
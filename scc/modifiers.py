@@ -12,11 +12,14 @@ from scc.constants import CUT, ROUND, LINEAR, MINIMUM, FE_STICK, FE_TRIGGER
 from scc.constants import TRIGGER_MAX, LEFT, CPAD, RIGHT, STICK
 from scc.constants import FE_PAD, SCButtons, STICKTILT
 from scc.constants import HapticPos, ControllerFlags
+from scc.constants import POWER, EXPONENTIAL, SCURVE, POINTS
 from scc.tools import nameof, clamp, quat2euler
+from scc.curves import ResponseTable, TriggerTable, AxisTable
 from scc.controller import HapticData
 from scc.uinput import Axes, Rels
-from math import pi as PI, sqrt, copysign, atan2, sin, cos
+from math import pi as PI, sqrt, copysign, atan2, sin, cos, exp
 from collections import OrderedDict, deque
+from bisect import bisect_right
 
 import time
 import logging
@@ -636,6 +639,7 @@ class DeadzoneModifier(Modifier):
 
 		self.lower = int(params[0])
 		self.upper = int(params[1]) if len(params) == 2 else STICK_PAD_MAX
+		self._trigger_table = None
 
 
 	def mode_CUT(self, x, y, range):
@@ -681,15 +685,17 @@ class DeadzoneModifier(Modifier):
 			return copysign(
 				clamp(
 					0,
-					((x - self.lower) / (self.upper - self.lower)) * range,
+					((abs(x) - self.lower) / (self.upper - self.lower)) * range,
 					range),
 				x
 			), 0
-		distance = clamp(self.lower, sqrt(x*x + y*y), self.upper)
-		distance = (distance - self.lower) / (self.upper - self.lower) * range
-
-		angle = atan2(x, y)
-		return distance * sin(angle), distance * cos(angle)
+		# Distance is scaled along same direction, so instead of computing
+		# angle and its sine and cosine, both coordinates are just
+		# multiplied by ratio of new and original distance
+		distance = sqrt(x*x + y*y)
+		scale = clamp(self.lower, distance, self.upper)
+		scale = (scale - self.lower) / (self.upper - self.lower) * range / distance
+		return x * scale, y * scale
 
 
 	def mode_MINIMUM(self, x, y, range):
@@ -713,6 +719,26 @@ class DeadzoneModifier(Modifier):
 		angle = atan2(x, y)
 		return distance * sin(angle), distance * cos(angle)
 
+	@staticmethod
+	def _make_axis_function(mode, lower, upper):
+		"""
+		Returns function applying deadzone to 1D input. Table is shared
+		between all modifiers with same parameters, so function used to
+		build it must not keep reference to any of them.
+		"""
+		convert = getattr(DeadzoneModifier(mode, lower, upper), "mode_" + mode)
+		return lambda x: convert(x, 0, STICK_PAD_MAX)[0]
+
+
+	@staticmethod
+	def _make_trigger_function(mode, lower, upper):
+		""" As _make_axis_function, for trigger position converted to stick range and back """
+		m = DeadzoneModifier(mode, lower, upper)
+		convert = getattr(m, "mode_" + mode)
+		return lambda p: m._convert_stick_trigger_range(
+			convert(m._convert_trigger_stick_range(p, TRIGGER_MAX), 0, STICK_PAD_MAX)[0])
+
+
 	def _convert_trigger_stick_range(self, position, trigger_range):
 		result = clamp(0,
 		    (position / trigger_range) * STICK_PAD_MAX,
@@ -739,6 +765,11 @@ class DeadzoneModifier(Modifier):
 
 	def compress(self):
 		self.action = self.action.compress()
+		if self._trigger_table is None:
+			# Trigger has to be converted to stick range and back, so
+			# whole thing is precomputed for every mode
+			self._trigger_table = TriggerTable.get(DeadzoneModifier._make_trigger_function,
+				self.mode, self.lower, self.upper)
 		if isinstance(self.action, BallModifier) and self.mode == MINIMUM:
 			# Special case where BallModifier has to be applied before
 			# deadzone is computed
@@ -748,7 +779,8 @@ class DeadzoneModifier(Modifier):
 		elif isinstance(self.action, GyroAbsAction):
 			# Another special case, GyroAbs has to handle deadzone
 			# only after math is finished
-			self.action._deadzone_fn = self._convert
+			self.action._deadzone_table = AxisTable.get(DeadzoneModifier._make_axis_function,
+				self.mode, self.lower, self.upper)
 			return self.action
 		return self
 
@@ -784,6 +816,10 @@ class DeadzoneModifier(Modifier):
 
 
 	def trigger(self, mapper, position, old_position):
+		if self._trigger_table:
+			# Same as bellow, precomputed
+			position = self._trigger_table.apply(position)
+			return self.action.trigger(mapper, position, old_position)
 		# Need to convert trigger value to stick range for deadzone modifier
 		# calcs to work as intended
 		position = self._convert_trigger_stick_range(position, TRIGGER_MAX)
@@ -799,12 +835,12 @@ class DeadzoneModifier(Modifier):
 
 
 	def axis(self, mapper, position, what):
-		position = self._convert(position, 0, STICK_PAD_MAX)
+		position = self._convert(position, 0, STICK_PAD_MAX)[0]
 		return self.action.axis(mapper, position, what)
 
 
 	def pad(self, mapper, position, what):
-		position = self._convert(position, 0, STICK_PAD_MAX)
+		position = self._convert(position, 0, STICK_PAD_MAX)[0]
 		return self.action.pad(mapper, position, what)
 
 
@@ -817,6 +853,142 @@ class DeadzoneModifier(Modifier):
 		return self.action.gyro(mapper, pitch, yaw, roll, q1, q2, q3, q4)
 
 
+class CurveModifier(Modifier):
+	"""
+	Changes response of stick, pad or trigger. Distance from center is
+	normalized to 0..1 range and passed through selected function, so
+	position in middle of range can be made less or more sensitive, while
+	center and maximum stay where they were.
+	"""
+	COMMAND = "curve"
+	DEFAULT_EXPONENT = 2.0
+
+	def _mod_init(self, *params):
+		params = list(params)
+		if len(params) and type(params[0]) is str:
+			self.type = params.pop(0)
+		else:
+			# 'power' curve is default
+			self.type = POWER
+		if self.type == POINTS:
+			if len(params) < 2 or len(params) % 2 != 0:
+				raise TypeError("POINTS curve needs pairs of x, y values")
+			self.params = [ float(p) for p in params ]
+			xs, ys = self.params[0::2], self.params[1::2]
+			if xs != sorted(set(xs)) or xs[0] <= 0 or xs[-1] >= 1:
+				raise ValueError("Curve points have to be ordered and between 0 and 1")
+			if min(ys) < 0 or max(ys) > 1:
+				raise ValueError("Curve points have to be between 0 and 1")
+		elif self.type in (POWER, EXPONENTIAL, SCURVE):
+			if len(params) > 1: raise TypeError("Too many parameters")
+			self.params = [ float(params[0]) if len(params) else CurveModifier.DEFAULT_EXPONENT ]
+			if self.type != EXPONENTIAL and self.params[0] <= 0:
+				raise ValueError("Exponent has to be positive")
+		else:
+			raise ValueError("Invalid curve type")
+		self._table = ResponseTable.get(CurveModifier._make_function,
+			self.type, *self.params)
+		self._trigger_table = TriggerTable.get(CurveModifier._make_trigger_function,
+			self.type, *self.params)
+
+
+	@staticmethod
+	def _make_function(type, *params):
+		"""
+		Returns function mapping distance from center to output distance.
+		Curve is applied only to range of stick; Anything further from
+		center, what is possible only in corners, is left as it is.
+		"""
+		if type == POWER:
+			k = params[0]
+			f = lambda t: t ** k
+		elif type == EXPONENTIAL:
+			k = params[0]
+			if k == 0:
+				f = lambda t: t
+			else:
+				f = lambda t: (exp(k * t) - 1.0) / (exp(k) - 1.0)
+		elif type == SCURVE:
+			k = params[0]
+			f = lambda t: t ** k / (t ** k + (1.0 - t) ** k)
+		else:
+			xs = [ 0.0 ] + list(params[0::2]) + [ 1.0 ]
+			ys = [ 0.0 ] + list(params[1::2]) + [ 1.0 ]
+			def f(t):
+				i = min(bisect_right(xs, t), len(xs) - 1)
+				return ys[i - 1] + (ys[i] - ys[i - 1]) * (t - xs[i - 1]) / (xs[i] - xs[i - 1])
+		
+		def fn(d):
+			if d >= STICK_PAD_MAX:
+				return d
+			return f(float(d) / STICK_PAD_MAX) * STICK_PAD_MAX
+		return fn
+
+
+	@staticmethod
+	def _make_trigger_function(type, *params):
+		""" As _make_function, for trigger position """
+		fn = CurveModifier._make_function(type, *params)
+		return lambda p: fn(float(p) * STICK_PAD_MAX / TRIGGER_MAX) * TRIGGER_MAX / STICK_PAD_MAX
+
+
+	def describe(self, context):
+		dsc = self.action.describe(context)
+		if "\n" in dsc:
+			return "%s\n(with curve)" % (dsc,)
+		else:
+			return "%s (with curve)" % (dsc,)
+
+
+	def to_string(self, multiline=False, pad=0):
+		params = [ self.type ] if self.type != POWER else []
+		return self._mod_to_string(params + self.params, multiline, pad)
+
+
+	def __str__(self):
+		return "<Modifier '%s', %s>" % (self.COMMAND, self.action)
+
+	__repr__ = __str__
+
+
+	def trigger(self, mapper, position, old_position):
+		position = self._trigger_table.apply(position)
+		return self.action.trigger(mapper, position, old_position)
+
+
+	def axis(self, mapper, position, what):
+		return self.action.axis(mapper, self._table.apply(position), what)
+
+
+	def pad(self, mapper, position, what):
+		return self.action.pad(mapper, self._table.apply(position), what)
+
+
+	def whole(self, mapper, x, y, what):
+		x, y = self._table.apply2(x, y)
+		return self.action.whole(mapper, x, y, what)
+
+
+	def gyro(self, mapper, pitch, yaw, roll, q1, q2, q3, q4):
+		return self.action.gyro(mapper, pitch, yaw, roll, q1, q2, q3, q4)
+
+
+class ButtonCheck(object):
+	"""
+	Condition used by ModeModifier for buttons. Callable object instead of
+	closure, so profile using it can be pickled.
+	"""
+	__slots__ = ("button", "name")
+
+	def __init__(self, button):
+		self.button = button
+		self.name = button.name	# So nameof() still works on keys in ModeModifier.mods
+
+
+	def __call__(self, mapper):
+		return mapper.is_pressed(self.button)
+
+
 class ModeModifier(Modifier):
 	COMMAND = "mode"
 	PROFILE_KEYS = ("modes",)
@@ -1006,11 +1178,7 @@ class ModeModifier(Modifier):
 
 	@staticmethod
 	def make_button_check(button):
-		def cb(mapper):
-			return mapper.is_pressed(button)
-
-		cb.name = button.name	# So nameof() still works on keys in self.mods
-		return cb
+		return ButtonCheck(button)
 
 
 	@staticmethod
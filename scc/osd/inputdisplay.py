@@ -5,7 +5,7 @@ SC-Controller - Input Display
 from scc.tools import _, set_logging_level
 
 from gi.repository import Gtk, GLib
-from scc.constants import SCButtons, STICK, LEFT, RIGHT, STICK_PAD_MAX
+from scc.constants import SCButtons, STICK_PAD_MAX
 from scc.gui.daemon_manager import DaemonManager
 from scc.gui.svg_widget import SVGWidget
 from scc.osd import OSDWindow
@@ -18,6 +18,11 @@ class InputDisplay(OSDWindow):
 	IMAGE = "inputdisplay.svg"
 	HILIGHT_COLOR = "#FF00FF00"		# ARGB
 	OBSERVE_COLOR = "#00007FFF"		# ARGB
+	STREAM_RATE = 60				# Max. updates per second
+	# Buttons and names of areas in image that are hilighted when pressed
+	BUTTONS = [ (getattr(SCButtons, x), x) for x in ('A', 'B', 'C', 'X', 'Y',
+		'START', 'BACK', 'LB', 'RB', 'LPAD', 'RPAD', 'LGRIP', 'RGRIP') ] + [
+		(SCButtons.LT, "LEFT"), (SCButtons.RT, "RIGHT"), (SCButtons.STICKPRESS, "STICK") ]
 
 	def __init__(self, imagepath="/usr/share/scc/images"):
 		OSDWindow.__init__(self, "osd-menu")
@@ -81,11 +86,8 @@ class InputDisplay(OSDWindow):
 	def on_daemon_connected(self, *a):
 		c = self.daemon.get_controllers()[0]
 		c.unlock_all()
-		c.observe(DaemonManager.nocallback, self.on_observe_failed,
-			'A', 'B', 'C', 'X', 'Y', 'START', 'BACK', 'LB', 'RB',
-			'LPAD', 'RPAD', 'LGRIP', 'RGRIP', 'LT', 'RT', 'LEFT',
-			'RIGHT', 'STICK', 'STICKPRESS')
-		c.connect('event', self.on_daemon_event_observer)
+		c.stream(DaemonManager.nocallback, self.on_observe_failed, self.STREAM_RATE)
+		c.connect('state', self.on_daemon_state)
 		c.connect('lost', self.on_controller_lost)
 
 
@@ -99,52 +101,33 @@ class InputDisplay(OSDWindow):
 		self.quit(3)
 
 
-	def on_daemon_event_observer(self, daemon, what, data):
-		if what in (LEFT, RIGHT, STICK):
-			widget, area = {
-				LEFT  : (self.lpadTest,  "LPADTEST"),
-				RIGHT : (self.rpadTest,  "RPADTEST"),
-				STICK : (self.stickTest, "STICKTEST"),
-			}[what]
-			# Check if stick or pad is released
-			if data[0] == data[1] == 0:
-				widget.hide()
-				return
-			if not widget.is_visible():
-				widget.show()
-			# Grab values
-			ax, ay, aw, trash = self.background.get_area_position(area)
-			cw = widget.get_allocation().width
-			# Compute center
-			x, y = ax + aw * 0.5 - cw * 0.5, ay + 1.0 - cw * 0.5
-			# Add pad position
-			x += data[0] * aw / STICK_PAD_MAX * 0.5
-			y -= data[1] * aw / STICK_PAD_MAX * 0.5
-			# Move circle
-			self.main_area.move(widget, x, y)
-		elif what in ("LT", "RT", "STICKPRESS"):
-			what = {
-				"LT" : "LEFT",
-				"RT" : "RIGHT",
-				"STICKPRESS" : "STICK"
-			}[what]
-			if data[0]:
-				self.hilights[self.OBSERVE_COLOR].add(what)
-			else:
-				self.hilights[self.OBSERVE_COLOR].remove(what)
+	def on_daemon_state(self, daemon, state):
+		self._move_cursor(self.lpadTest, "LPADTEST", state.lpad_x, state.lpad_y)
+		self._move_cursor(self.rpadTest, "RPADTEST", state.rpad_x, state.rpad_y)
+		self._move_cursor(self.stickTest, "STICKTEST", state.stick_x, state.stick_y)
+		pressed = { name for button, name in self.BUTTONS if state.buttons & button }
+		if pressed != self.hilights[self.OBSERVE_COLOR]:
+			self.hilights[self.OBSERVE_COLOR] = pressed
 			self._update_background()
-		elif hasattr(SCButtons, what):
-			try:
-				if data[0]:
-					self.hilights[self.OBSERVE_COLOR].add(what)
-				else:
-					self.hilights[self.OBSERVE_COLOR].remove(what)
-				self._update_background()
-			except KeyError as e:
-				# Non fatal
-				pass
-		else:
-			print("event", what)
+
+
+	def _move_cursor(self, widget, area, x, y):
+		# Check if stick or pad is released
+		if x == y == 0:
+			widget.hide()
+			return
+		if not widget.is_visible():
+			widget.show()
+		# Grab values
+		ax, ay, aw, trash = self.background.get_area_position(area)
+		cw = widget.get_allocation().width
+		# Compute center
+		cx, cy = ax + aw * 0.5 - cw * 0.5, ay + 1.0 - cw * 0.5
+		# Add pad position
+		cx += x * aw / STICK_PAD_MAX * 0.5
+		cy -= y * aw / STICK_PAD_MAX * 0.5
+		# Move circle
+		self.main_area.move(widget, cx, cy)
 
 
 	def _update_background(self):
@@ -42,6 +42,7 @@ class Menu(OSDWindow):
 		OSDWindow.__init__(self, cls, layer)
 		self.daemon = None
 		self.config = None
+		self.menu_cache = None
 		self.feedback = None
 		self.controller = None
 		self.xdisplay = X.Display(hash(GdkX11.x11_get_default_xdisplay()))	# Magic
@@ -106,6 +107,14 @@ class Menu(OSDWindow):
 		self.config = c
 
 
+	def use_menu_cache(self, cache):
+		"""
+		Allows sharing MenuDataCache instance between menus displayed by same
+		process. Has to be called before parse_argumets()
+		"""
+		self.menu_cache = cache
+
+
 	def get_menuid(self):
 		"""
 		Returns ID of used menu.
@@ -173,7 +182,10 @@ class Menu(OSDWindow):
 		if self.args.from_profile:
 			try:
 				self._menuid = self.args.items[0]
-				self.items = MenuData.from_profile(self.args.from_profile, self._menuid)
+				if self.menu_cache:
+					self.items = self.menu_cache.from_profile(self.args.from_profile, self._menuid)
+				else:
+					self.items = MenuData.from_profile(self.args.from_profile, self._menuid)
 			except OSError:
 				print('%s: error: profile file not found' % (sys.argv[0]), file=sys.stderr)
 				return False
@@ -183,7 +195,10 @@ class Menu(OSDWindow):
 		elif self.args.from_file:
 			try:
 				self._menuid = self.args.from_file
-				self.items = MenuData.from_file(self.args.from_file)
+				if self.menu_cache:
+					self.items = self.menu_cache.from_file(self.args.from_file)
+				else:
+					self.items = MenuData.from_file(self.args.from_file)
 			except:
 				print('%s: error: failed to load menu file' % (sys.argv[0]), file=sys.stderr)
 				return False
@@ -484,6 +499,7 @@ class Menu(OSDWindow):
 						if sub_pos[i] < 0 else sub_pos[i] + self.SUBMENU_OFFSET)
 
 			self._submenu.use_config(self.config)
+			self._submenu.use_menu_cache(self.menu_cache)
 			self._submenu.parse_argumets(["menu.py",
 				"-x", str(sub_pos[0]), "-y", str(sub_pos[1]),
 			 	"--from-file", filename,
@@ -5,9 +5,9 @@ one or more Action instances.
 """
 from __future__ import annotations
 
+import re
 import sys
 import token as TokenType
-from tokenize import TokenError, generate_tokens
 from typing import NamedTuple
 
 from scc.actions import Action, MultiAction, NoAction, RangeOP
@@ -21,6 +21,45 @@ class ParseError(Exception):
 	pass
 
 
+# Action strings are lexed by simple regex-driven lexer below instead of
+# 'tokenize' module. It produces exactly same tokens as
+# tokenize.generate_tokens would for whole action string passed as single
+# line, including quirks parser may depend on, but without overhead of
+# generic Python tokenizer.
+_DIGITS = r"[0-9](?:_?[0-9])*"
+_EXPONENT = r"[eE][-+]?" + _DIGITS
+_FLOAT = r"(?:(?:%s\.(?:%s)?|\.%s)(?:%s)?|%s%s)" % (
+	_DIGITS, _DIGITS, _DIGITS, _EXPONENT, _DIGITS, _EXPONENT)
+_NUMBER = "|".join((
+	r"%s[jJ]|%s[jJ]" % (_DIGITS, _FLOAT),
+	_FLOAT,
+	r"0[xX](?:_?[0-9a-fA-F])+|0[bB](?:_?[01])+|0[oO](?:_?[0-7])+",
+	r"0(?:_?0)*|[1-9](?:_?[0-9])*",
+))
+_STRING_PREFIX = r"(?:[rR][bBfF]?|[bBfF][rR]?|[uU])?"
+_OPERATORS = "|".join([ re.escape(x) for x in sorted(TokenType.EXACT_TOKEN_TYPES, reverse=True) ])
+# Order of alternatives matches tokenize.PseudoToken, only names are moved
+# first (as most common token), guarded so they don't match what would
+# be matched as number or string by tokenize
+_LEXER_RE = re.compile(r"[ \f\t]*(?:" + "|".join((
+	r"(?P<name>(?![0-9])(?!%s['\"])\w+)" % (_STRING_PREFIX,),
+	r"(?P<cont>\\\r?\n)",
+	r"(?P<end>\Z)",
+	r"(?P<comment>#[^\r\n]*)",
+	r"(?P<triple>%s(?:'''|\"\"\"))" % (_STRING_PREFIX,),
+	r"(?P<number>%s)" % (_NUMBER,),
+	r"(?P<newline>\r?\n)",
+	r"(?P<op>%s)" % (_OPERATORS,),
+	r"(?P<string>%s(?:'[^\n'\\]*(?:\\.[^\n'\\]*)*(?:'|\\\r?\n)"
+		r"|\"[^\n\"\\]*(?:\\.[^\n\"\\]*)*(?:\"|\\\r?\n)))" % (_STRING_PREFIX,),
+	r"(?P<prefix>\w+)",	# string prefix not followed by valid string
+)) + ")")
+_TRIPLE_END_RE = {
+	"'": re.compile(r"[^'\\]*(?:(?:\\.|'(?!''))[^'\\]*)*'''"),
+	"\"": re.compile(r'[^"\\]*(?:(?:\\.|"(?!""))[^"\\]*)*"""'),
+}
+
+
 def build_action_constants() -> dict:
 	"""Generate dicts for ActionParser.CONSTS."""
 	rv = {
@@ -98,18 +137,102 @@ class ActionParser(object):
 			s = s.decode("utf-8")
 
 		try:
-			self.tokens = [
-				ActionParser.Token(token_type, string)
-				for token_type, string, *_
-				in generate_tokens( iter([s]).__next__ )
-				if token_type != TokenType.ENDMARKER
-			]
-		except TokenError:
+			self.tokens = ActionParser.lex(s)
+		except ParseError:
 			self.tokens = None
 		self.index = 0
 		return self
 
 
+	@staticmethod
+	def lex(s: str) -> list[Token]:
+		"""Split string into list of tokens.
+
+		Raises ParseError if string ends in middle of parenthesis,
+		multi-line string or after line continuation.
+		"""
+		Token = ActionParser.Token
+		new = tuple.__new__		# faster than calling Token(...)
+		tokens = []
+		pos, length = 0, len(s)
+		depth = 0
+		indented = False
+
+		# Leading whitespace, comment or newline. Handled same way as
+		# first line of python source would be.
+		column = 0
+		while pos < length and s[pos] in " \t\f":
+			column = 0 if s[pos] == "\f" else column + 1
+			pos += 1
+		if pos == length:
+			return tokens
+		if s[pos] in "#\r\n":
+			if s[pos] == "#":
+				comment = s[pos:].rstrip("\r\n")
+				tokens.append(Token(TokenType.COMMENT, comment))
+				pos += len(comment)
+			tokens.append(Token(TokenType.NL, s[pos:]))
+			pos = length
+		elif column > 0:
+			indented = True
+			tokens.append(Token(TokenType.INDENT, s[:pos]))
+
+		match = _LEXER_RE.match
+		while pos < length:
+			m = match(s, pos)
+			if m is None:
+				tokens.append(Token(TokenType.ERRORTOKEN, s[pos]))
+				pos += 1
+				continue
+			kind = m.lastgroup
+			pos = m.end()
+			if kind == "name" or kind == "prefix":
+				value = m.group(kind)
+				if value[0].isidentifier():
+					tokens.append(new(Token, (TokenType.NAME, value)))
+				else:
+					tokens.append(new(Token, (TokenType.OP, value)))
+			elif kind == "op":
+				value = m.group(kind)
+				if value in "([{":
+					depth += 1
+				elif value in ")]}":
+					depth -= 1
+				tokens.append(new(Token, (TokenType.OP, value)))
+			elif kind == "number":
+				tokens.append(new(Token, (TokenType.NUMBER, m.group(kind))))
+			elif kind == "string":
+				value = m.group(kind)
+				if value[-1] == "\n":
+					# Line continuation inside of string
+					raise ParseError("Unterminated string")
+				tokens.append(new(Token, (TokenType.STRING, value)))
+			elif kind == "newline":
+				tokens.append(new(Token, (TokenType.NL if depth > 0 else TokenType.NEWLINE, m.group(kind))))
+			elif kind == "comment":
+				tokens.append(new(Token, (TokenType.COMMENT, m.group(kind))))
+			elif kind == "triple":
+				start = m.start(kind)
+				end = _TRIPLE_END_RE[s[pos - 1]].match(s, pos)
+				if end is None:
+					raise ParseError("Unterminated string")
+				pos = end.end()
+				tokens.append(new(Token, (TokenType.STRING, s[start:pos])))
+			elif kind == "end":
+				pass
+			else:
+				# 'cont' - line continuation
+				raise ParseError("Unexpected end of string")
+
+		if depth != 0:
+			raise ParseError("Unmatched parenthesis")
+		if s[-1] not in "\r\n" and not s.strip().startswith("#"):
+			tokens.append(Token(TokenType.NEWLINE, ""))
+		if indented:
+			tokens.append(Token(TokenType.DEDENT, ""))
+		return tokens
+
+
 	def _next_token(self) -> Token:
 		if self.tokens is None:
 			sys.exit("This shouldn't happen, self.tokens is none")
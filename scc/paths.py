@@ -10,6 +10,7 @@ from source tarball *and* debugable in working folder.
 """
 import os
 import sys
+import tempfile
 
 def get_config_path() -> str:
 	"""Return configuration directory.
@@ -22,6 +23,28 @@ def get_config_path() -> str:
 	return os.path.join(confdir, "scc")
 
 
+def get_cache_path() -> str:
+	"""Return directory where cached data is stored.
+
+	~/.cache/scc under normal conditions.
+	"""
+	cachedir = os.path.expanduser("~/.cache")
+	if "XDG_CACHE_HOME" in os.environ:
+		cachedir = os.environ['XDG_CACHE_HOME']
+	return os.path.join(cachedir, "scc")
+
+
+def get_runtime_path() -> str:
+	"""Return directory for files that exist only while daemon is running.
+
+	$XDG_RUNTIME_DIR/scc under normal conditions, scc-<uid> in temporary
+	directory (usually /tmp) if XDG_RUNTIME_DIR is not set.
+	"""
+	if "XDG_RUNTIME_DIR" in os.environ:
+		return os.path.join(os.environ["XDG_RUNTIME_DIR"], "scc")
+	return os.path.join(tempfile.gettempdir(), "scc-%s" % (os.getuid(),))
+
+
 def get_profiles_path() -> str:
 	"""Return directory where profiles are stored.
 
@@ -2,57 +2,178 @@
 """
 SC-Controller - Poller
 
-Uses select to pool for file descriptors. Driver classes can use
+Waits for file descriptors to become ready. Driver classes can use
 daemon.get_poller().register and .unregister to add file descriptors and
 register callbacks to be called when data is available in them.
 
 Callback is called as callback(fd, event) where event is one of select.POLL*
+
+On Linux, epoll is used and poll() can block until some descriptor is ready,
+until timeout expires or until wakeup() is called from another thread.
+select() based implementation is kept as fallback for systems without epoll.
 """
-import select, logging
+import select, os, logging
 log = logging.getLogger("Poller")
 
 
 DO_NOTHING = lambda *a: False
 
-class Poller(object):
+class SelectPoller(object):
 	POLLIN = select.POLLIN
 	POLLOUT = select.POLLOUT
 	POLLPRI = select.POLLPRI
-	
+
 	def __init__(self):
 		self._events = {}
 		self._callbacks = {}
 		self._pool_in = ()
 		self._pool_out = ()
 		self._pool_pri = ()
-	
-	
+		self._on_wake = DO_NOTHING
+		# Self-pipe used to interrupt blocking poll() from other threads
+		self._wakeup_r, self._wakeup_w = os.pipe()
+		os.set_blocking(self._wakeup_r, False)
+		os.set_blocking(self._wakeup_w, False)
+		self.register(self._wakeup_r, SelectPoller.POLLIN, self._on_wakeup)
+
+
 	def register(self, fd, events, callback):
 		if fd < 0:
 			raise ValueError("Invalid file descriptor")
 		self._events[fd] = events
 		self._callbacks[fd] = callback
 		self._generate_lists()
-	
-	
+
+
 	def unregister(self, fd):
 		if fd in self._events: del self._events[fd]
 		if fd in self._callbacks: del self._callbacks[fd]
 		self._generate_lists()
-	
-	
+
+
+	def set_wake_callback(self, callback):
+		"""
+		Sets callback that is called every time poll() stops waiting,
+		before callbacks of ready descriptors are called.
+		"""
+		self._on_wake = callback
+
+
+	def wakeup(self):
+		"""
+		Interrupts poll() that is (or will be next) blocking on main thread.
+		Safe to call from any thread.
+		"""
+		try:
+			os.write(self._wakeup_w, b"\x01")
+		except BlockingIOError:
+			# Pipe is full, poller will wake up anyway
+			pass
+
+
+	def _on_wakeup(self, fd, event):
+		try:
+			while os.read(fd, 512):
+				pass
+		except BlockingIOError:
+			pass
+
+
 	def _generate_lists(self):
-		self._pool_in = [ fd for fd, events in self._events.items() if events & Poller.POLLIN ]
-		self._pool_out = [ fd for fd, events in self._events.items() if events & Poller.POLLOUT ]
-		self._pool_pri = [ fd for fd, events in self._events.items() if events & Poller.POLLPRI ]
-	
-	
+		self._pool_in = [ fd for fd, events in self._events.items() if events & SelectPoller.POLLIN ]
+		self._pool_out = [ fd for fd, events in self._events.items() if events & SelectPoller.POLLOUT ]
+		self._pool_pri = [ fd for fd, events in self._events.items() if events & SelectPoller.POLLPRI ]
+
+
 	def poll(self, timeout=0.01):
+		"""
+		Waits up to 'timeout' seconds for any registered descriptor
+		and calls callbacks of those that are ready.
+		If timeout is None, waits until something happens.
+		"""
 		inn, out, pri = select.select( self._pool_in, self._pool_out, self._pool_pri, timeout )
-		
+		self._on_wake()
+
 		for fd in inn:
-			self._callbacks.get(fd, DO_NOTHING)(fd, Poller.POLLIN)
+			self._callbacks.get(fd, DO_NOTHING)(fd, SelectPoller.POLLIN)
 		for fd in out:
-			self._callbacks.get(fd, DO_NOTHING)(fd, Poller.POLLOUT)
+			self._callbacks.get(fd, DO_NOTHING)(fd, SelectPoller.POLLOUT)
 		for fd in pri:
-			self._callbacks.get(fd, DO_NOTHING)(fd, Poller.POLLPRI)
+			self._callbacks.get(fd, DO_NOTHING)(fd, SelectPoller.POLLPRI)
+
+
+class EpollPoller(SelectPoller):
+	"""
+	Poller backed by epoll. Registration is O(1) and doesn't require
+	rebuilding descriptor lists.
+
+	Descriptors are registered as level-triggered; Not every callback drains
+	its descriptor (libusb handles only what it needs, hidraw callbacks read
+	single report), so edge-triggering would lose events.
+	"""
+	# Events that are reported even if not requested. Those are
+	# dispatched as POLLIN, so owner notices error on next read.
+	ERROR_MASK = select.EPOLLERR | select.EPOLLHUP
+
+	def __init__(self):
+		self._epoll = select.epoll()
+		SelectPoller.__init__(self)
+
+
+	def register(self, fd, events, callback):
+		if fd < 0:
+			raise ValueError("Invalid file descriptor")
+		# POLL* and EPOLL* constants share same values
+		mask = events & (SelectPoller.POLLIN | SelectPoller.POLLOUT | SelectPoller.POLLPRI)
+		if fd in self._events:
+			self._epoll.modify(fd, mask)
+		else:
+			try:
+				self._epoll.register(fd, mask)
+			except FileExistsError:
+				# Stale registration of descriptor that was closed
+				# without unregistering and then reused
+				self._epoll.modify(fd, mask)
+		self._events[fd] = events
+		self._callbacks[fd] = callback
+
+
+	def unregister(self, fd):
+		if fd in self._events:
+			del self._events[fd]
+			try:
+				self._epoll.unregister(fd)
+			except (OSError, ValueError):
+				# Descriptor was already closed
+				pass
+		if fd in self._callbacks: del self._callbacks[fd]
+
+
+	def poll(self, timeout=0.01):
+		"""
+		Waits up to 'timeout' seconds for any registered descriptor
+		and calls callbacks of those that are ready.
+		If timeout is None, waits until something happens.
+		"""
+		try:
+			ready = self._epoll.poll(-1 if timeout is None else timeout)
+		except InterruptedError:
+			return
+		self._on_wake()
+
+		for fd, mask in ready:
+			events = self._events.get(fd, 0)
+			if mask & EpollPoller.ERROR_MASK:
+				mask |= SelectPoller.POLLIN
+			if mask & events & SelectPoller.POLLIN:
+				self._callbacks.get(fd, DO_NOTHING)(fd, SelectPoller.POLLIN)
+			if mask & events & SelectPoller.POLLOUT:
+				self._callbacks.get(fd, DO_NOTHING)(fd, SelectPoller.POLLOUT)
+			if mask & events & SelectPoller.POLLPRI:
+				self._callbacks.get(fd, DO_NOTHING)(fd, SelectPoller.POLLPRI)
+
+
+if hasattr(select, "epoll"):
+	Poller = EpollPoller
+else:
+	Poller = SelectPoller
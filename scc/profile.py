@@ -3,15 +3,17 @@
 Handles mapping profile stored in json file
 """
 from scc.constants import LEFT, RIGHT, CPAD, DPAD, WHOLE, STICK, RSTICK, GYRO
-from scc.constants import SCButtons, HapticPos
+from scc.constants import SCButtons, HapticPos, DAEMON_VERSION
 from scc.special_actions import MenuAction
 from scc.modifiers import HoldModifier
 from scc.lib.jsonencoder import JSONEncoder
 from scc.parser import TalkingActionParser
 from scc.menu_data import MenuData
 from scc.actions import NoAction
+from scc.paths import get_cache_path
 
-import json, logging
+from collections import OrderedDict
+import io, json, copy, os, sys, stat, pickle, hashlib, tempfile, threading, logging
 log = logging.getLogger("profile")
 
 
@@ -35,6 +37,20 @@ class Profile(object):
 	RPAD_AXES  = { X : "rpad_x", Y : "rpad_y" }
 	TRIGGERS   = [ LEFT, RIGHT ]
 
+	# Compiled profiles are pickled, already parsed profiles stored in cache
+	# directory. Header of compiled file has to match header computed from
+	# source file, otherwise compiled file is ignored.
+	USE_COMPILED = True
+	COMPILED_VERSION = 1	# Bump when format of compiled profile changes
+	COMPILED_FIELDS = ( "description", "is_template", "buttons", "stick",
+		"rstick", "gyro", "triggers", "pads", "menus", "original_version" )
+	# Compiled profiles are ignored when any of those modules is changed
+	COMPILED_MODULES = ( "actions.py", "modifiers.py", "special_actions.py",
+		"macros.py", "gestures.py", "menu_data.py", "parser.py", "profile.py",
+		"curves.py", "osd/osk_actions.py", "gui/parser.py" )
+	_code_version = None
+	_not_compilable = set()	# headers of profiles that failed to pickle
+
 	def __init__(self, parser):
 		self.parser = parser
 		self.clear()
@@ -83,13 +99,134 @@ class Profile(object):
 
 
 	def load(self, filename):
-		""" Loads profile from file. Returns self """
-		fileobj = open(filename, "r")
-		self.load_fileobj(fileobj)
+		"""
+		Loads profile from file. Returns self.
+
+		If enabled, compiled profile is used when available and created
+		otherwise, so next time profile can be loaded without parsing it.
+		"""
+		if not Profile.USE_COMPILED:
+			fileobj = open(filename, "r")
+			self.load_fileobj(fileobj)
+			self.filename = filename
+			return self
+
+		with open(filename, "rb") as fileobj:
+			source = fileobj.read()
+		compiled = self._get_compiled_filename(filename)
+		header = self._get_compiled_header(source)
+		if not self._load_compiled(compiled, header):
+			self.load_fileobj(io.BytesIO(source))
+			if header not in Profile._not_compilable:
+				self._save_compiled(compiled, header)
 		self.filename = filename
 		return self
 
 
+	def _get_compiled_filename(self, filename):
+		""" Returns path to compiled version of profile file """
+		key = "%s:%s" % (type(self.parser).__name__, os.path.abspath(filename))
+		return os.path.join(get_cache_path(), "profiles",
+			hashlib.sha1(key.encode("utf-8")).hexdigest() + ".sccprofile.bin")
+
+
+	@staticmethod
+	def _get_code_version():
+		"""
+		Returns string identifying version of code that creates actions,
+		so compiled profiles are not reused after it's changed.
+		"""
+		if Profile._code_version is None:
+			parts = [ DAEMON_VERSION, "%s.%s" % sys.version_info[0:2] ]
+			path = os.path.dirname(os.path.abspath(__file__))
+			for name in Profile.COMPILED_MODULES:
+				try:
+					st = os.stat(os.path.join(path, name))
+					parts.append("%s:%s" % (st.st_mtime_ns, st.st_size))
+				except OSError:
+					parts.append("-")
+			Profile._code_version = hashlib.sha1(
+				" ".join(parts).encode("utf-8")).hexdigest()
+		return Profile._code_version
+
+
+	def _get_compiled_header(self, source):
+		""" Returns header that compiled profile created from 'source' has to have """
+		return ("SCCPROF %s %s %s %s\n" % (
+			Profile.COMPILED_VERSION,
+			Profile._get_code_version(),
+			type(self.parser).__name__,
+			hashlib.sha256(source).hexdigest(),
+		)).encode("utf-8")
+
+
+	@staticmethod
+	def _is_private(st):
+		""" Returns True if file or directory is owned by user and no one else can write to it """
+		return st.st_uid == os.getuid() and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+	def _load_compiled(self, compiled, header):
+		"""
+		Loads profile from compiled file, if it exists and its header matches.
+		Returns True on success.
+
+		As unpickling can execute code, file is used only if both it and
+		directory it's in can't be modified by other users.
+		"""
+		try:
+			st = os.lstat(os.path.dirname(compiled))
+			if not stat.S_ISDIR(st.st_mode) or not Profile._is_private(st):
+				log.warning("Not using compiled profiles from '%s': "
+					"Directory is not private", os.path.dirname(compiled))
+				return False
+			with open(compiled, "rb") as fileobj:
+				if not Profile._is_private(os.fstat(fileobj.fileno())):
+					return False
+				if fileobj.readline() != header:
+					return False
+				data = pickle.load(fileobj)
+		except FileNotFoundError:
+			return False
+		except Exception as e:
+			log.debug("Failed to load compiled profile '%s': %s", compiled, e)
+			return False
+		for key in Profile.COMPILED_FIELDS:
+			setattr(self, key, data[key])
+		return True
+
+
+	def _save_compiled(self, compiled, header):
+		"""
+		Stores parsed profile as compiled file. Failure is not fatal,
+		profile will be just parsed again next time.
+
+		Profile that can't be pickled (some actions keep closures) is
+		remembered by its header, so it's not pickled again on every load.
+		"""
+		data = { key : getattr(self, key) for key in Profile.COMPILED_FIELDS }
+		try:
+			data = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+		except Exception as e:
+			log.debug("Profile '%s' cannot be compiled: %s", compiled, e)
+			Profile._not_compilable.add(header)
+			return
+		try:
+			path = os.path.dirname(compiled)
+			os.makedirs(path, mode=0o700, exist_ok=True)
+			fd, tmp = tempfile.mkstemp(dir=path, suffix=".tmp")
+			try:
+				with os.fdopen(fd, "wb") as fileobj:
+					fileobj.write(header)
+					fileobj.write(data)
+				os.replace(tmp, compiled)
+			except:
+				os.unlink(tmp)
+				raise
+		except Exception as e:
+			log.debug("Failed to save compiled profile '%s': %s", compiled, e)
+
+
 	def load_fileobj(self, fileobj):
 		"""
 		Loads profile from file-like object.
@@ -340,6 +477,59 @@ class Profile(object):
 			# Action format completly changed in v0.4, but profile format is same.
 			pass
 
+class ProfileCache(object):
+	"""
+	Keeps recently loaded and compressed profiles, so switching back to
+	profile that was used recently doesn't require parsing it again.
+	Cached profile is reused only while file's mtime and size stays same.
+
+	Cached profiles are never handed out directly; get() returns deep copy,
+	so state of actions (such as SmoothModifier's deques) is never shared
+	between mappers.
+
+	Thread-safe, profiles are loaded from socket server threads.
+	"""
+	SIZE = 16
+
+	def __init__(self, size=SIZE):
+		self.size = size
+		self._cache = OrderedDict()		# filename -> ((mtime, size), Profile)
+		self._lock = threading.Lock()
+
+
+	def get(self, filename):
+		"""
+		Returns new, compressed Profile loaded from 'filename'.
+		Raises same exceptions as Profile.load.
+		"""
+		st = os.stat(filename)
+		key = (st.st_mtime_ns, st.st_size)
+		with self._lock:
+			entry = self._cache.get(filename)
+			if entry is not None and entry[0] == key:
+				self._cache.move_to_end(filename)
+				profile = entry[1]
+			else:
+				profile = None
+
+		if profile is None:
+			profile = Profile(TalkingActionParser()).load(filename)
+			profile.compress()
+			with self._lock:
+				self._cache[filename] = (key, profile)
+				self._cache.move_to_end(filename)
+				while len(self._cache) > self.size:
+					self._cache.popitem(last=False)
+
+		# Every copy gets its own parser
+		return copy.deepcopy(profile, { id(profile.parser) : TalkingActionParser() })
+
+
+	def clear(self):
+		with self._lock:
+			self._cache.clear()
+
+
 class Encoder(JSONEncoder):
 	def default(self, obj):
 		#if type(obj) in (list, tuple):
@@ -16,24 +16,32 @@ from scc.gestures import GestureDetector
 from scc.parser import TalkingActionParser
 from scc.controller import HapticData
 from scc.scheduler import Scheduler
+from scc.worker import MapperWorker, WorkerScheduler
 from scc.menu_data import MenuData
-from scc.profile import Profile
+from scc.stream import StateEncoder
+from scc.state_export import StateExporter
+from scc.paths import get_runtime_path
+from scc.profile import Profile, ProfileCache
 from scc.actions import Action
 from scc.config import Config
 from scc.poller import Poller
+from scc.latency import LatencyTracer
 from scc.mapper import Mapper
-from scc import drivers
+from scc import drivers, latency
 
 from socketserver import UnixStreamServer, ThreadingMixIn, StreamRequestHandler
+from collections import deque
 import os
 import sys
 import pkgutil
 import signal
 import time
 import json
+import socket
 import logging
 import threading
 import traceback
+import math
 import subprocess
 log = logging.getLogger("SCCDaemon")
 tlog = logging.getLogger("Socket Thread")
@@ -43,17 +51,23 @@ class ThreadingUnixStreamServer(ThreadingMixIn, UnixStreamServer):
 
 
 class SCCDaemon(Daemon):
+	# Upper limit for how long can mainloop sleep when nothing happens.
+	# Safety net for mainloop functions that don't register timeout source.
+	MAX_POLL_TIMEOUT = 1.0
 
 	def __init__(self, piddile, socket_file):
 		set_logging_level(True, True)
 		Daemon.__init__(self, piddile)
-		Config()					# Generates ~/.config/scc and default config if needed
+		Config.get_shared()			# Generates ~/.config/scc and default config if needed
 		self.started = False
 		self.exiting = False
 		self.socket_file = socket_file
 		self.poller = Poller()
 		self.dev_monitor = create_device_monitor(self)
 		self.scheduler = Scheduler()
+		# Scheduler has to catch up with time spent sleeping in poll before
+		# any callback gets chance to schedule new task
+		self.poller.set_wake_callback(self.scheduler.run)
 		self.xdisplay = None
 		self.sserver = None			# UnixStreamServer instance
 		self.errors = []
@@ -65,7 +79,9 @@ class SCCDaemon(Daemon):
 		# TODO: Use osd_ids for all menus
 		self.osd_ids = {}
 		self.controllers = []
-		self.mainloops = [ self.poller.poll, self.scheduler.run ]
+		self.mainloops = [ self._poll, self.scheduler.run, self._register_outputs,
+				self._run_main_calls ]
+		self.timeout_sources = [ ]
 		self.rescan_cbs = [ ]
 		self.on_exit_cbs = []
 		self.subprocs = []
@@ -73,7 +89,14 @@ class SCCDaemon(Daemon):
 		self.cemuhook = None
 		self.default_mapper = None
 		self.free_mappers = [ ]
+		self.workers = [ ]			# MapperWorkers, used only if 'threaded_mappers' is enabled
 		self.clients = set()
+		self.outputs = {}			# fd -> ClientOutput registered in poller
+		self._backlogged = deque()	# ClientOutputs to (un)register, see _client_backlogged
+		self._main_calls = deque()	# (callback, data) to call on main thread, see call_on_main
+		self.latency_stats = {}		# controller id -> LatencyTracer
+		self.state_exporters = None	# controller -> StateExporter, if 'export_state' is enabled
+		self.profile_cache = ProfileCache()
 		self.cwd = os.getcwd()
 
 
@@ -83,7 +106,7 @@ class SCCDaemon(Daemon):
 		See __init__.py in scc.drivers.
 		"""
 		log.debug("Initializing drivers...")
-		cfg = Config()
+		cfg = Config.get_shared()
 		self._to_start = set()  # del-eted later by start_drivers
 		to_init = []
 		for importer, modname, ispkg in pkgutil.walk_packages(path=drivers.__path__, onerror=lambda x: None):
@@ -169,6 +192,45 @@ class SCCDaemon(Daemon):
 			self.mainloops.remove(fn)
 
 
+	def add_timeout_source(self, fn):
+		"""
+		Adds function that is called before mainloop goes to sleep.
+		Function should return number of seconds after which mainloop has
+		to wake up, or None if it doesn't need to be woken up at all.
+		"""
+		if fn not in self.timeout_sources:
+			self.timeout_sources.append(fn)
+
+
+	def remove_timeout_source(self, fn):
+		"""
+		Removes function added by add_timeout_source
+		"""
+		if fn in self.timeout_sources:
+			self.timeout_sources.remove(fn)
+
+
+	def _get_poll_timeout(self):
+		"""
+		Computes how long can mainloop sleep before scheduler or any
+		registered timeout source needs it to wake up.
+		"""
+		timeout = SCCDaemon.MAX_POLL_TIMEOUT
+		deadline = self.scheduler.next_deadline()
+		if deadline is not None:
+			timeout = min(timeout, deadline - time.monotonic())
+		for fn in self.timeout_sources:
+			t = fn()
+			if t is not None:
+				timeout = min(timeout, t)
+		return max(0.0, timeout)
+
+
+	def _poll(self):
+		""" Sleeps until some file descriptor is ready or timeout expires """
+		self.poller.poll(self._get_poll_timeout())
+
+
 	def add_on_exit(self, fn):
 		"""
 		Adds function that is called just before daemon is stopped.
@@ -187,9 +249,9 @@ class SCCDaemon(Daemon):
 
 
 	def _set_profile(self, mapper, filename):
-		# Called from socket server thread
-		p = Profile(TalkingActionParser())
-		p.load(filename).compress()
+		# Called from socket server thread or, for 'profile' action, from
+		# main one. Should be called while lock is acquired.
+		p = self.profile_cache.get(filename)
 		self.profile_file = filename
 
 		if mapper.profile.gyro and not p.gyro:
@@ -202,6 +264,17 @@ class SCCDaemon(Daemon):
 			if mapper.get_controller():
 				log.debug("Turning gyrosensor ON")
 				mapper.get_controller().set_gyro_enabled(True)
+		worker = self._get_worker(mapper)
+		if worker:
+			# Mapper is changed only on thread that runs it
+			worker.call(self._switch_profile_on_worker, mapper, p)
+		else:
+			self._switch_profile(mapper, p)
+			self._profile_switched(mapper)
+
+
+	def _switch_profile(self, mapper, profile):
+		""" Replaces profile, releasing everything that old one pressed """
 		# Cancel everything
 		mapper.cancel_all()
 		# Release all buttons
@@ -210,8 +283,14 @@ class SCCDaemon(Daemon):
 		mapper.mouse.reset()
 
 		# This last line kinda depends on GIL...
-		mapper.profile = p
-		# Re-apply all locks
+		mapper.profile = profile
+
+
+	def _profile_switched(self, mapper):
+		"""
+		Re-applies locks and informs clients about new profile.
+		Should be called while lock is acquired.
+		"""
 		for c in self.clients:
 			c.reaply_locks(self, mapper)
 		if mapper.get_controller():
@@ -220,6 +299,22 @@ class SCCDaemon(Daemon):
 			self.send_profile_info(None, self._send_to_all, mapper=mapper)
 
 
+	def _switch_profile_on_worker(self, mapper, profile):
+		""" Called on MapperWorker thread """
+		self._switch_profile(mapper, profile)
+		with self.lock:
+			self._profile_switched(mapper)
+
+
+	@staticmethod
+	def _get_worker(mapper):
+		"""
+		Returns MapperWorker that runs mapper or None if mapper runs on
+		main thread.
+		"""
+		return getattr(mapper.scheduler, "worker", None)
+
+
 	def _send_to_all(self, message_str):
 		"""
 		Sends message to all connect clients.
@@ -227,10 +322,59 @@ class SCCDaemon(Daemon):
 		Message should be utf-8 encoded str.
 		"""
 		for client in self.clients:
-			try:
-				client.wfile.write(message_str)
-			except Exception:
-				pass
+			client.wfile.write(message_str)
+
+
+	def _client_backlogged(self, output):
+		"""
+		Called by ClientOutput, from any thread, when it has data that
+		couldn't be sent right away or when it's closed. Actual
+		(un)registering in poller is done by _register_outputs on main thread.
+		"""
+		self._backlogged.append(output)
+		self.poller.wakeup()
+
+
+	def _register_outputs(self):
+		""" Called from mainloop """
+		while self._backlogged:
+			output = self._backlogged.popleft()
+			fd = output.fileno()
+			if output.closed:
+				if self.outputs.get(fd) is output:
+					self.poller.unregister(fd)
+					del self.outputs[fd]
+				output.release()
+			elif fd not in self.outputs:
+				self.outputs[fd] = output
+				self.poller.register(fd, self.poller.POLLOUT, self._on_output_writable)
+
+
+	def call_on_main(self, callback, *data):
+		"""
+		Calls callback(*data) on main thread, in next mainloop iteration.
+		Safe to call from any thread.
+		"""
+		self._main_calls.append((callback, data))
+		self.poller.wakeup()
+
+
+	def _run_main_calls(self):
+		""" Called from mainloop """
+		while self._main_calls:
+			callback, data = self._main_calls.popleft()
+			callback(*data)
+
+
+	def _on_output_writable(self, fd, event):
+		output = self.outputs.get(fd)
+		if output is None or output.send_queued():
+			# Everything sent; Output will ask to be registered again
+			# when there is more data
+			self.poller.unregister(fd)
+			self.outputs.pop(fd, None)
+			if output and output.closed:
+				output.release()
 
 
 	def on_sa_turnoff(self, mapper, action):
@@ -308,11 +452,8 @@ class SCCDaemon(Daemon):
 			log.warning("Cannot show OSD; there is no scc-osd-daemon registered")
 			return False
 		# Send request
-		try:
-			self.osd_daemon.wfile.write(data)
-			self.osd_daemon.wfile.flush()
-		except Exception as e:
-			log.error("Failed to display OSD: %s", e)
+		if not self.osd_daemon.wfile.write(data):
+			log.error("Failed to display OSD: scc-osd-daemon is not responding")
 			self.osd_daemon = None
 			return False
 		return True
@@ -425,6 +566,8 @@ class SCCDaemon(Daemon):
 		for p in self.subprocs:
 			p.kill()
 		self.subprocs = []
+		for exporter in (self.state_exporters or {}).values():
+			exporter.close()
 		sys.exit(0)
 
 
@@ -464,7 +607,7 @@ class SCCDaemon(Daemon):
 				m.set_xdisplay(self.xdisplay)
 			if not self.alone:
 				self.subprocs.append(Subprocess("scc-osd-daemon", True))
-				if len(Config()["autoswitch"]):
+				if len(Config.get_shared()["autoswitch"]):
 					# Start scc-autoswitch-daemon only if there are some switch rules defined
 					self.subprocs.append(Subprocess("scc-autoswitch-daemon", True))
 		else:
@@ -475,27 +618,40 @@ class SCCDaemon(Daemon):
 	def init_mapper(self):
 		"""
 		Setups new mapper instance.
+		If 'threaded_mappers' is enabled, mapper gets its own scheduler
+		and runs on its own MapperWorker thread.
 		"""
+		threaded = Config.get_shared()["threaded_mappers"]
+		scheduler = WorkerScheduler() if threaded else self.scheduler
 		try:
 			mapper = Mapper(Profile(TalkingActionParser()),
-					self.scheduler, poller=self.poller)
+					scheduler, poller=self.poller)
 		except CannotCreateUInputException as e:
 			# Most likely UInput is not available
 			# Create mapper with all virtual devices set to Dummies.
 			log.exception(e)
 			self.add_error("uinput", str(e))
 			mapper = Mapper(Profile(TalkingActionParser()),
-				self.scheduler, keyboard=None, mouse=None, gamepad=False)
+				scheduler, keyboard=None, mouse=None, gamepad=False)
 
-		mapper.set_special_actions_handler(self)
+		if threaded:
+			# Special actions talk to X, controllers and clients, all of
+			# which is done on main thread
+			mapper.set_special_actions_handler(MainThreadHandler(self))
+		else:
+			mapper.set_special_actions_handler(self)
 		mapper.set_xdisplay(self.xdisplay)
-		mapper.schedule(1.0, self.fix_xinput)
+		if threaded:
+			self.workers.append(MapperWorker(mapper,
+				"Mapper-%s" % (len(self.workers),), poller=self.poller))
+			self.workers[-1].start()
+		self.scheduler.schedule(1.0, self.fix_xinput, mapper)
 		return mapper
 
 
 	def fix_xinput(self, mapper):
 		name = mapper.get_gamepad_name()
-		if self.xdisplay and Config()["fix_xinput"] and name:
+		if self.xdisplay and Config.get_shared()["fix_xinput"] and name:
 			# Three conditions: X has to be available, 'fix_xinput' must
 			# be enabled in config and controller should not be dummy
 			# (should have a name)
@@ -513,17 +669,90 @@ class SCCDaemon(Daemon):
 		mapper = mapper or self.default_mapper
 		if self.default_profile is None:
 			try:
-				self.default_profile = find_profile(Config()["recent_profiles"][0])
+				self.default_profile = find_profile(Config.get_shared()["recent_profiles"][0])
 			except Exception:
 				# Broken config is not reason to fail here
 				pass
 		try:
-			mapper.profile.load(self.default_profile).compress()
+			mapper.profile = self.profile_cache.get(self.default_profile)
 		except Exception as e:
 			log.warning("Failed to load profile. Starting with no mappings.")
 			log.warning("Reason: %s", e)
 
 
+	def on_config_changed(self, cfg):
+		"""
+		Called when shared config is replaced, either after 'Reconfigure.'
+		message or when config file is changed by something else.
+		"""
+		with self.lock:
+			# Reconfigure connected controllers
+			for c in self.controllers:
+				c.apply_config(cfg.get_controller_config(c.get_id()))
+			self.configure_latency_stats(cfg)
+			# Start or stop scc-autoswitch-daemon as needed
+			need_autoswitch_daemon = len(cfg["autoswitch"]) > 0
+			if need_autoswitch_daemon and self.xdisplay and not self.autoswitch_daemon:
+				self.subprocs.append(Subprocess("scc-autoswitch-daemon", True))
+			elif not need_autoswitch_daemon and self.autoswitch_daemon:
+				self._remove_subproccess("scc-autoswitch-daemon")
+				self.autoswitch_daemon.close()
+				self.autoswitch_daemon = None
+			try:
+				self._send_to_all(b"Reconfigured.\n")
+			except Exception:
+				pass
+
+
+	def configure_latency_stats(self, cfg):
+		"""
+		Enables or disables collecting latency statistics
+		according to 'latency_stats' config option.
+		"""
+		latency.enabled = bool(cfg["latency_stats"])
+		for c in self.controllers:
+			self._assign_latency_tracer(c)
+
+
+	def _assign_latency_tracer(self, c):
+		if latency.enabled:
+			# Statistics are kept by id, so they survive reconnecting
+			if c.get_id() not in self.latency_stats:
+				self.latency_stats[c.get_id()] = LatencyTracer()
+			c.latency = self.latency_stats[c.get_id()]
+		else:
+			c.latency = None
+
+
+	def _add_state_exporter(self, c):
+		path = get_runtime_path()
+		try:
+			if not os.path.exists(path):
+				os.makedirs(path, mode=0o700)
+			st = os.lstat(path)
+			if (not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid()
+					or st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)):
+				raise OSError("%s is not private directory" % (path,))
+			filename = os.path.join(path, "state-%s" % (c.get_id().replace("/", "_"),))
+			self.state_exporters[c] = StateExporter(filename, c.get_flags())
+		except OSError as e:
+			log.warning("Failed to export state of %s: %s", c, e)
+
+
+	def _export_states(self):
+		"""
+		Called from mainloop. Done here and not by mapper, so it doesn't
+		add to time needed to process input.
+
+		Some drivers update same state object in place, so state has to be
+		encoded every time; Exporter writes only frames that differ.
+		"""
+		for c, exporter in self.state_exporters.items():
+			state = c.mapper.state if c.mapper else None
+			if state is not None:
+				exporter.publish(state)
+
+
 	def add_controller(self, c):
 		if len(self.free_mappers) > 0:
 			# Reuse already created mapper, so SCC will not spam system
@@ -543,7 +772,10 @@ class SCCDaemon(Daemon):
 			log.debug("Turning gyrosensor ON")
 			c.set_gyro_enabled(True)
 
-		c.apply_config(Config().get_controller_config(c.get_id()))
+		c.apply_config(Config.get_shared().get_controller_config(c.get_id()))
+		self._assign_latency_tracer(c)
+		if self.state_exporters is not None:
+			self._add_state_exporter(c)
 		self.controllers.append(c)
 		log.debug("Controller added: %s", c)
 		with self.lock:
@@ -554,8 +786,14 @@ class SCCDaemon(Daemon):
 	def remove_controller(self, c):
 		mapper = c.mapper
 		if mapper:
-			mapper.release_virtual_buttons()
+			worker = self._get_worker(mapper)
+			if worker:
+				worker.call(mapper.release_virtual_buttons)
+			else:
+				mapper.release_virtual_buttons()
 		c.disconnected()
+		if self.state_exporters and c in self.state_exporters:
+			self.state_exporters.pop(c).close()
 
 		with self.lock:
 			while c in self.controllers:
@@ -660,6 +898,12 @@ class SCCDaemon(Daemon):
 	def run(self):
 		log.debug("Starting SCCDaemon...")
 		signal.signal(signal.SIGTERM, self.sigterm)
+		self.configure_latency_stats(Config.get_shared())
+		Config.add_listener(self.on_config_changed)
+		Config.watch_shared(self.poller)
+		if Config.get_shared()["export_state"]:
+			self.state_exporters = {}
+			self.add_mainloop(self._export_states)
 		self.init_drivers()
 		self.dev_monitor.start()
 		load_custom_module(log)
@@ -727,6 +971,10 @@ class SCCDaemon(Daemon):
 
 
 	def _sshandler(self, connection, rfile, wfile):
+		# Responses and events are not written to 'wfile' directly,
+		# but through ClientOutput, so client that doesn't read them
+		# can't block thread that generates them.
+		wfile = ClientOutput(connection, self._client_backlogged)
 		with self.lock:
 			client = Client(connection, self.default_mapper, rfile, wfile)
 			self.clients.add(client)
@@ -751,9 +999,13 @@ class SCCDaemon(Daemon):
 				break
 			if len(line.strip(b"\t\n ")) > 0:
 				self._handle_message(client, line.strip(b"\n"))
+				# Message may have scheduled task or queued data for
+				# controller, so mainloop has to wake up and handle it
+				self.poller.wakeup()
 
 		with self.lock:
 			client.unlock_actions(self)
+			client.stop_streams()
 			if self.osd_daemon == client:
 				log.info("scc-osd-daemon lost")
 				self.osd_daemon = None
@@ -761,6 +1013,7 @@ class SCCDaemon(Daemon):
 				log.info("scc-autoswitch-daemon lost")
 				self.autoswitch_daemon = None
 			self.clients.remove(client)
+		wfile.close()
 
 
 	def _handle_message(self, client, message):
@@ -822,11 +1075,21 @@ class SCCDaemon(Daemon):
 				except Exception:
 					client.wfile.write(b"Fail: no such controller\n")
 		elif message.startswith(b"State."):
-			if Config()["enable_sniffing"]:
+			if Config.get_shared()["enable_sniffing"]:
 				client.wfile.write(b"State: %s\n" % (str(client.mapper.state), ))
 			else:
 				log.warning("Refused 'State' request: Sniffing disabled")
 				client.wfile.write(b"Fail: Sniffing disabled.\n")
+		elif message.startswith(b"Stats."):
+			if latency.enabled:
+				for controller_id, tracer in list(self.latency_stats.items()):
+					for stage, count, p50, p90, p99, maximum in tracer.report():
+						client.wfile.write(("Stats: %s %s %s %.0f %.0f %.0f %.0f\n" % (
+							controller_id, stage, count, p50, p90, p99, maximum
+						)).encode("utf-8"))
+				client.wfile.write(b"OK.\n")
+			else:
+				client.wfile.write(b"Fail: Latency statistics disabled.\n")
 		elif message.startswith(b"Led:"):
 			try:
 				number = int(message[4:])
@@ -837,7 +1100,7 @@ class SCCDaemon(Daemon):
 			if client.mapper.get_controller():
 				client.mapper.get_controller().set_led_level(number)
 		elif message.startswith(b"Observe:"):
-			if Config()["enable_sniffing"]:
+			if Config.get_shared()["enable_sniffing"]:
 				to_observe = [ x for x in message.split(b":", 1)[1].strip(b" \t\r").split(b" ") ]
 				with self.lock:
 					for l in to_observe:
@@ -846,6 +1109,30 @@ class SCCDaemon(Daemon):
 			else:
 				log.warning("Refused 'Observe' request: Sniffing disabled")
 				client.wfile.write(b"Fail: Sniffing disabled.\n")
+		elif message.startswith(b"Stream:"):
+			if Config.get_shared()["enable_sniffing"]:
+				try:
+					rate = float(message[7:])
+				except ValueError:
+					rate = None
+				if rate is None or not math.isfinite(rate) or rate < 0:
+					client.wfile.write(b"Fail: invalid rate\n")
+					return
+				with self.lock:
+					controller = client.mapper.get_controller()
+					if rate == 0:
+						client.stop_stream()
+						client.wfile.write(b"OK.\n")
+					elif controller is None:
+						client.wfile.write(b"Fail: no controller\n")
+					elif len(client.streams) >= InputStream.MAX_STREAMS:
+						client.wfile.write(b"Fail: too many streams\n")
+					else:
+						client.start_stream(self, rate)
+						client.wfile.write(b"OK.\n")
+			else:
+				log.warning("Refused 'Stream' request: Sniffing disabled")
+				client.wfile.write(b"Fail: Sniffing disabled.\n")
 		elif message.startswith(b"Replace:"):
 			try:
 				l, actionstr = message.split(b":", 1)[1].strip(b" \t\r").split(b" ", 1)
@@ -885,24 +1172,14 @@ class SCCDaemon(Daemon):
 				client.unlock_actions(self)
 				client.wfile.write(b"OK.\n")
 		elif message.startswith(b"Reconfigure."):
+			# If config was changed, on_config_changed applies it and sends
+			# 'Reconfigured.' to everyone. Otherwise, it was applied already.
+			changed = Config.reload_shared()
 			with self.lock:
-				# Load config
-				cfg = Config()
-				# Reconfigure connected controllers
-				for c in self.controllers:
-					c.apply_config(cfg.get_controller_config(c.get_id()))
-				# Start or stop scc-autoswitch-daemon as needed
-				need_autoswitch_daemon = len(cfg["autoswitch"]) > 0
-				if need_autoswitch_daemon and self.xdisplay and not self.autoswitch_daemon:
-					self.subprocs.append(Subprocess("scc-autoswitch-daemon", True))
-				elif not need_autoswitch_daemon and self.autoswitch_daemon:
-					self._remove_subproccess("scc-autoswitch-daemon")
-					self.autoswitch_daemon.close()
-					self.autoswitch_daemon = None
-				# Respond
 				try:
 					client.wfile.write(b"OK.\n")
-					self._send_to_all("Reconfigured.\n".encode("utf-8"))
+					if not changed:
+						self._send_to_all(b"Reconfigured.\n")
 				except Exception:
 					pass
 		elif message.startswith(b"Rescan."):
@@ -1095,6 +1372,7 @@ class SCCDaemon(Daemon):
 			mapper.profile.pads[what] = a
 		else:
 			raise ValueError("Unknown source: %s" % (what,))
+		mapper.invalidate_plan()
 
 
 	@staticmethod
@@ -1136,6 +1414,155 @@ class SCCDaemon(Daemon):
 		self.sigterm()
 
 
+class ClientOutput(object):
+	"""
+	Non-blocking, bounded output queue of single client connection.
+
+	write() may be called from any thread, including one processing
+	controller inputs. Data is sent right away if socket accepts it and
+	queued otherwise; Queue is then flushed by daemon mainloop when socket
+	becomes writable. Messages written with 'key' replace queued message with
+	same key, so client that is not keeping up receives only latest position
+	of stick or pad instead of everything that happened while it was busy.
+
+	Client that lets more than MAX_QUEUED bytes pile up is disconnected.
+	"""
+	MAX_QUEUED = 1024 * 1024
+
+	def __init__(self, connection, on_backlog):
+		"""
+		'on_backlog' is called with this instance as only argument every time
+		queue stops being empty and once when output is closed.
+		"""
+		# Socket is duplicated, so descriptor registered in poller stays
+		# valid until released on main thread, even after socketserver
+		# closes original connection.
+		self.socket = connection.dup()
+		self.on_backlog = on_backlog
+		self.closed = False
+		self._fileno = self.socket.fileno()
+		self._lock = threading.Lock()
+		self._queue = deque()		# [ data, key ] lists
+		self._keyed = {}			# key -> item in _queue
+		self._size = 0
+
+
+	def fileno(self):
+		return self._fileno
+
+
+	def write(self, data, key=None):
+		"""
+		Sends or queues data. Returns False if output is already closed
+		or if client was just disconnected for not reading fast enough.
+		"""
+		with self._lock:
+			if self.closed:
+				return False
+			if key is not None and key in self._keyed:
+				item = self._keyed[key]
+				self._size += len(data) - len(item[0])
+				item[0] = data
+				return True
+			if not self._queue:
+				try:
+					sent = self.socket.send(data, socket.MSG_DONTWAIT)
+				except (BlockingIOError, InterruptedError):
+					sent = 0
+				except OSError:
+					self._close()
+					return False
+				if sent == len(data):
+					return True
+				if sent > 0:
+					# Partially sent message can't be replaced anymore
+					data, key = data[sent:], None
+				self.on_backlog(self)
+			item = [ data, key ]
+			self._queue.append(item)
+			if key is not None:
+				self._keyed[key] = item
+			self._size += len(data)
+			if self._size > ClientOutput.MAX_QUEUED:
+				log.warning("Disconnecting client that is not reading its messages")
+				self._close()
+				return False
+		return True
+
+
+	def send_queued(self):
+		"""
+		Sends as much of queued data as socket accepts.
+		Called from mainloop. Returns True if queue is empty afterwards.
+		"""
+		with self._lock:
+			while self._queue and not self.closed:
+				item = self._queue[0]
+				try:
+					sent = self.socket.send(item[0], socket.MSG_DONTWAIT)
+				except (BlockingIOError, InterruptedError):
+					return False
+				except OSError:
+					self._close()
+					break
+				self._size -= sent
+				if sent < len(item[0]):
+					item[0] = item[0][sent:]
+					if item[1] is not None:
+						del self._keyed[item[1]]
+						item[1] = None
+					return False
+				self._queue.popleft()
+				if item[1] is not None:
+					del self._keyed[item[1]]
+			return True
+
+
+	def _close(self):
+		""" Has to be called with self._lock held """
+		if not self.closed:
+			self.closed = True
+			self._queue.clear()
+			self._keyed.clear()
+			self._size = 0
+			try:
+				# Wakes up thread reading from same connection
+				self.socket.shutdown(socket.SHUT_RDWR)
+			except OSError:
+				pass
+			self.on_backlog(self)
+
+
+	def close(self):
+		""" Drops all queued data and closes connection """
+		with self._lock:
+			self._close()
+
+
+	def release(self):
+		""" Called on main thread once output is closed and no longer polled """
+		self.socket.close()
+
+
+class MainThreadHandler(object):
+	"""
+	Special actions handler used by mappers running on MapperWorker.
+	Calls on_sa_* methods of daemon on main thread instead of worker one.
+	"""
+
+	def __init__(self, daemon):
+		self.daemon = daemon
+
+
+	def __getattr__(self, name):
+		if not name.startswith("on_sa_"):
+			raise AttributeError(name)
+		method = getattr(self.daemon, name)
+		def call(*data):
+			self.daemon.call_on_main(method, *data)
+		return call
+
+
 class Client(object):
 	def __init__(self, connection, mapper, rfile, wfile):
 		self.connection = connection
@@ -1144,16 +1571,55 @@ class Client(object):
 		self.mapper = mapper
 		self.gesture_action = None
 		self.locked_actions = {}
+		self.streams = {}			# mapper -> InputStream
 
 
 	def close(self):
 		""" Closes connection to this client """
 		try:
-			self.connection.shutdown(True)
+			self.connection.shutdown(socket.SHUT_RDWR)
 		except Exception:
 			pass
 
 
+	def start_stream(self, daemon, rate):
+		"""
+		Starts sending state of controller assigned to current mapper
+		as binary frames, up to 'rate' times per second. Requesting another
+		stream for same mapper just changes its rate.
+
+		'Stream:' line with index of stream is written to client before
+		stream is started, so client knows index before first frame.
+
+		Should be called while daemon.lock is acquired.
+		"""
+		controller = self.mapper.get_controller()
+		stream = self.streams.get(self.mapper)
+		if stream is None:
+			stream = InputStream(self, self.mapper, daemon, len(self.streams),
+				controller.get_flags())
+			self.streams[self.mapper] = stream
+		self.wfile.write(("Stream: %s %s\n" % (
+			stream.encoder.index, controller.get_id())).encode("utf-8"))
+		stream.start(rate)
+		return stream
+
+
+	def stop_stream(self):
+		"""
+		Stops stream started for current mapper, if any.
+		Should be called while daemon.lock is acquired.
+		"""
+		if self.mapper in self.streams:
+			self.streams[self.mapper].stop()
+
+
+	def stop_streams(self):
+		""" Should be called while daemon.lock is acquired """
+		for stream in self.streams.values():
+			stream.stop()
+
+
 	def request_gesture(self, daemon, what, up_angle):
 		"""
 		Handler used when client requested gesture detection with
@@ -1230,6 +1696,71 @@ class Client(object):
 				a.reaply(self, daemon)
 
 
+class InputStream(object):
+	"""
+	Periodically sends state of controller to client,
+	as requested by 'Stream:' message. See scc.stream for details.
+	"""
+	MAX_STREAMS = 256
+	MAX_RATE = 1000.0
+
+	def __init__(self, client, mapper, daemon, index, flags):
+		self.client = client
+		self.mapper = mapper
+		self.daemon = daemon
+		self.scheduler = daemon.scheduler
+		self.encoder = StateEncoder(index, flags)
+		self.interval = None
+		self.task = None
+		self.last = None
+
+
+	def start(self, rate):
+		"""
+		Can be called from any thread, task is scheduled on main thread.
+		Raises ValueError if rate is not positive, finite number.
+		"""
+		if not (math.isfinite(rate) and rate > 0):
+			raise ValueError("Invalid rate: %s" % (rate,))
+		self.interval = 1.0 / min(rate, InputStream.MAX_RATE)
+		self.daemon.call_on_main(self._update_task)
+
+
+	def stop(self):
+		""" Can be called from any thread, task is canceled on main thread """
+		self.interval = None
+		self.daemon.call_on_main(self._update_task)
+
+
+	def _update_task(self):
+		""" Called on main thread after stream is started or stopped """
+		if self.interval is None:
+			if self.task:
+				self.task.cancel()
+			self.task, self.last = None, None
+		elif self.task is None:
+			self.task = self.scheduler.schedule(0, self._send)
+
+
+	def _send(self):
+		""" Called from scheduler on main thread """
+		interval = self.interval
+		if interval is None:
+			# Stopped from another thread while task was already running
+			self.task = None
+			return
+		state = self.mapper.state
+		if state is not None:
+			frame = self.encoder.encode(state)
+			if frame != self.last:
+				self.last = frame
+				if not self.client.wfile.write(frame, self):
+					# Client disconnected
+					self.task = None
+					return
+		self.task = self.scheduler.schedule(interval, self._send)
+
+
 class ReportingAction(Action):
 	"""
 	Action used to send requested inputs to client.
@@ -1255,13 +1786,13 @@ class ReportingAction(Action):
 	__str__ = __repr__
 
 
-	def _report(self, message):
-		try:
-			self.client.wfile.write(message.encode("utf-8"))
-		except Exception:
-			# May fail when client dies
-			self.client.rfile.close()
-			self.client.wfile.close()
+	def _report(self, message, coalesce=False):
+		"""
+		If 'coalesce' is True and client is not keeping up, message may
+		replace previous not-yet-sent message from same action.
+		Client that stops reading entirely is disconnected by ClientOutput.
+		"""
+		self.client.wfile.write(message.encode("utf-8"), self if coalesce else None)
 
 
 	def trigger(self, mapper, position, old_position):
@@ -1269,7 +1800,7 @@ class ReportingAction(Action):
 			self._report("Event: %s %s %s %s\n" % (
 				mapper.get_controller().get_id(),
 				nameof(self.what), position, old_position
-			))
+			), True)
 
 
 	def button_press(self, mapper, number=1):
@@ -1296,13 +1827,13 @@ class ReportingAction(Action):
 		if what == CPAD:
 			min_difference /= 10
 		if (x == 0 or y == 0 or abs(x - self.old_pos[0]) > min_difference
-							or abs(y - self.old_pos[1] > min_difference)):
+							or abs(y - self.old_pos[1]) > min_difference):
 			self.old_pos = x, y
 			if mapper.get_controller():
 				self._report("Event: %s %s %s %s\n" % (
 					mapper.get_controller().get_id(),
 					what, x, y
-				))
+				), True)
 
 
 class LockedAction(ReportingAction):
@@ -7,83 +7,122 @@ Runs in SCCDaemon's (single-threaded) mainloop. That means all callbacks are
 also called on main thread.
 
 Use schedule(delay, callback, *data) to register one-time task.
+
+Tasks are kept in binary heap ordered by time when they should be executed.
+Canceled tasks are not removed from heap right away, they are just marked
+and skipped (or dropped all at once when there is too many of them), so
+both scheduling and cancelling is O(log n) at worst.
+
+All times are measured by time.monotonic(), so scheduler is not affected
+by system clock being adjusted.
 """
-import time, queue, logging
+import time, heapq, logging
 log = logging.getLogger("Scheduler")
 
-# TODO: Maybe create actual thread for this? Use poler? Scrap everything and rewrite it in GO?
 
 class Scheduler(object):
-	
+	# Heap is rebuilt without canceled tasks once they make up this part of it
+	COMPACT_RATIO = 0.5
+
 	def __init__(self):
-		self._scheduled = queue.PriorityQueue()
-		self._next = None
-		self._now = time.time()
-	
-	
+		self._heap = []			# list of (time, sequence, task) tuples
+		self._sequence = 0		# keeps tasks with same time in FIFO order
+		self._canceled = 0		# number of canceled tasks still in heap
+		self._now = time.monotonic()
+
+
 	def schedule(self, delay, callback, *data):
 		"""
 		Schedules one-time task to be executed no sooner than after 'delay' of
 		seconds. Delay may be float number.
 		'callback' is called as callback(*data).
-		
+
 		Returned Task instance can be used to cancel task once scheduled.
 		"""
 		task = Task(self._now + delay, callback, data)
-		if self._next is None or task.time < self._next.time:
-			if self._next:
-				self._scheduled.put(self._next)
-			self._next = task
-		else:
-			self._scheduled.put(task)
+		task._scheduler = self
+		self._sequence += 1
+		heapq.heappush(self._heap, (task.time, self._sequence, task))
 		return task
-	
-	
+
+
 	def cancel_task(self, task):
 		"""
 		Returns True if task was sucessfully removed or False if task was
 		already executed or not known at all.
-		
-		Note that this is slow as hell and completly thread-unsafe,
-		so it _has_ to be called on main thread.
+
+		Task is only marked as canceled and left in heap, where it's
+		ignored once its time comes.
 		"""
-		if task == self._next:
-			self._next = None if self._scheduled.empty() else self._scheduled.get()
-			return True
-		# Fun part: All tasks are removed from PriorityQueue
-		# until correct is found. Then everything is put back
-		tasks, found = [], False
-		while not self._scheduled.empty():
-			t = self._scheduled.get()
-			if t == task:
-				found = True
-				break
-			tasks.append(t)
-		for t in tasks:
-			self._scheduled.put(t)
-		return found
-	
-	
+		if task._scheduler is not self:
+			return False
+		task._scheduler = None
+		task.callback, task.data = Task.DO_NOTHING, ()
+		self._canceled += 1
+		if self._canceled > len(self._heap) * Scheduler.COMPACT_RATIO:
+			self._compact()
+		return True
+
+
+	def _compact(self):
+		""" Rebuilds heap without canceled tasks """
+		self._heap = [ x for x in self._heap if x[2]._scheduler is self ]
+		heapq.heapify(self._heap)
+		self._canceled = 0
+
+
+	def _drop_canceled(self):
+		""" Pops all canceled tasks from top of heap """
+		heap = self._heap
+		while heap and heap[0][2]._scheduler is not self:
+			heapq.heappop(heap)
+			self._canceled -= 1
+
+
+	def next_deadline(self):
+		"""
+		Returns time (as returned by time.monotonic) when next task should
+		be executed or None if there is nothing scheduled.
+		"""
+		self._drop_canceled()
+		if self._heap:
+			return self._heap[0][0]
+		return None
+
+
 	def run(self):
-		self._now = time.time()
-		while self._next and self._now >= self._next.time:
-			callback, data = self._next.callback, self._next.data
-			self._next = None if self._scheduled.empty() else self._scheduled.get()
-			callback(*data)
+		self._now = time.monotonic()
+		while self._heap and self._now >= self._heap[0][0]:
+			# Not cached in local variable, as callback may cancel tasks
+			# and so cause _compact to replace heap
+			task = heapq.heappop(self._heap)[2]
+			if task._scheduler is not self:
+				# Canceled
+				self._canceled -= 1
+				continue
+			task._scheduler = None
+			task.callback(*task.data)
 
 
 class Task(object):
-	
+	DO_NOTHING = staticmethod(lambda *a, **b: False)
+	__slots__ = ("time", "callback", "data", "_scheduler")
+
 	def __init__(self, time, callback, data):
 		self.time = time
 		self.callback = callback
 		self.data = data
-	
-	
+		self._scheduler = None		# set while task is waiting in scheduler
+
+
 	def cancel(self):
-		""" Marks task as canceled, without actually removing it from scheduler """
-		self.callback = lambda *a, **b: False
-		self.data = ()
+		""" Cancels task without need to have reference to scheduler """
+		if self._scheduler:
+			self._scheduler.cancel_task(self)
+		else:
+			self.callback = Task.DO_NOTHING
+			self.data = ()
+
 
 	def __lt__(self, other):
-		self.time < other.time
+		return self.time < other.time
@@ -277,6 +277,44 @@ def cmd_print_inputs(argv0: str, argv: list[str], lock: str = "Lock: ") -> int:
 	return cmd_lock_inputs(argv0, argv, lock="Observe: ")
 
 
+def cmd_latency_stats(argv0: str, argv: list[str]) -> int:
+	"""Print input latency statistics.
+
+	Prints percentiles of time (in microseconds) spent in each stage of
+	processing controller input. Requires 'latency_stats' to be enabled
+	in configuration.
+
+	Usage: scc latency-stats
+
+	Return codes:
+		-1  - failed to connect to daemon
+		-2  - statistics are disabled
+		-3  - connection terminated
+	"""
+	s = connect_to_daemon()
+	if s is None: return -1
+	try:
+		while True:
+			line = s.readline()
+			if line == "":
+				return -3
+			elif line.startswith("Ready."):
+				print("Stats.", file=s)
+				s.flush()
+				print("%-20s %-10s %8s %8s %8s %8s %8s" % (
+					"controller", "stage", "count", "p50", "p90", "p99", "max"))
+			elif line.startswith("Stats:"):
+				data = line.strip().split(" ")[1:]
+				print("%-20s %-10s %8s %8s %8s %8s %8s" % tuple(data))
+			elif line.startswith("Fail:"):
+				print(line.strip(), file=sys.stderr)
+				return -2
+			elif line.startswith("OK."):
+				return 0
+	finally:
+		s.close()
+
+
 def connect_to_daemon() -> TextIOWrapper | None:
 	"""Return socket connected to daemon or None if connection failed.
 
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+SC-Controller - State Export
+
+Publishes latest state of controller into memory-mapped file, so other
+programs can read it at any rate, without talking to daemon and without
+any syscall once file is mapped. Enabled by 'export_state' option; Files
+are created in $XDG_RUNTIME_DIR/scc as 'state-<controller id>' and removed
+when controller is disconnected.
+
+File starts with header (magic, version, frame size), followed by sequence
+counter, time of last update and state frame in same format as used by
+scc.stream. Counter works as seqlock: writer makes it odd before changing
+data and even again once it's done. Reader that sees same even value
+before and after copying data knows that copy is consistent. Writer never
+waits for readers; Reader just tries again.
+"""
+from scc.stream import StateEncoder, FRAME, decode
+import os, mmap, time, struct, logging
+log = logging.getLogger("StateExport")
+
+MAGIC = b"SCCSTATE"
+VERSION = 1
+HEADER = struct.Struct("<8sII")			# magic, version, frame size
+SEQUENCE = struct.Struct("<Q")
+TIMESTAMP = struct.Struct("<d")			# time.time() of last update
+SEQUENCE_OFFSET = HEADER.size
+DATA_OFFSET = SEQUENCE_OFFSET + SEQUENCE.size
+DATA_SIZE = TIMESTAMP.size + FRAME.size
+FILE_SIZE = DATA_OFFSET + DATA_SIZE
+
+
+class StateExporter(object):
+	""" Writes states of single controller into file """
+
+	def __init__(self, filename, flags):
+		self.filename = filename
+		self.encoder = StateEncoder(0, flags)
+		self._last_frame = None
+		self._sequence = 0
+		# File is prepared under temporary name, so reader can never
+		# see it without header
+		tmp = "%s.%s.tmp" % (filename, os.getpid())
+		fd = os.open(tmp, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+		try:
+			os.ftruncate(fd, FILE_SIZE)
+			self._map = mmap.mmap(fd, FILE_SIZE)
+		finally:
+			os.close(fd)
+		HEADER.pack_into(self._map, 0, MAGIC, VERSION, FRAME.size)
+		os.replace(tmp, filename)
+
+
+	def publish(self, state):
+		"""
+		Called with state as received by mapper. Nothing is written if
+		state encodes to same frame as last time.
+		"""
+		frame = self.encoder.encode(state)
+		if frame == self._last_frame:
+			return
+		self._last_frame = frame
+		mm = self._map
+		self._sequence += 1
+		SEQUENCE.pack_into(mm, SEQUENCE_OFFSET, self._sequence)
+		mm[DATA_OFFSET:FILE_SIZE] = TIMESTAMP.pack(time.time()) + frame
+		self._sequence += 1
+		SEQUENCE.pack_into(mm, SEQUENCE_OFFSET, self._sequence)
+
+
+	def close(self):
+		""" Removes file. Readers that already have it mapped will see no more updates """
+		try:
+			os.unlink(self.filename)
+		except OSError:
+			pass
+		self._map.close()
+
+
+class StateReader(object):
+	"""
+	Reads states published by StateExporter.
+	Raises ValueError if file is not recognized.
+	"""
+	RETRIES = 1000
+
+	def __init__(self, filename):
+		with open(filename, "rb") as f:
+			self._map = mmap.mmap(f.fileno(), FILE_SIZE, access=mmap.ACCESS_READ)
+		magic, version, frame_size = HEADER.unpack_from(self._map, 0)
+		if magic != MAGIC or version != VERSION or frame_size != FRAME.size:
+			self._map.close()
+			raise ValueError("%s: unsupported state file" % (filename,))
+
+
+	def get_sequence(self):
+		"""
+		Returns value that changes every time when state is updated.
+		Cheap way to check for updates without reading whole state.
+		"""
+		return SEQUENCE.unpack_from(self._map, SEQUENCE_OFFSET)[0]
+
+
+	def read(self):
+		"""
+		Returns (timestamp, scc.stream.StreamState) tuple or None if nothing
+		was published yet or if consistent copy couldn't be taken.
+		"""
+		mm = self._map
+		for i in range(StateReader.RETRIES):
+			before = SEQUENCE.unpack_from(mm, SEQUENCE_OFFSET)[0]
+			if before & 1:
+				continue
+			data = mm[DATA_OFFSET:FILE_SIZE]
+			if SEQUENCE.unpack_from(mm, SEQUENCE_OFFSET)[0] == before:
+				if before == 0:
+					return None
+				return TIMESTAMP.unpack_from(data)[0], decode(data[TIMESTAMP.size:])[1]
+		return None
+
+
+	def close(self):
+		self._map.close()
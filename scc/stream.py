@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+SC-Controller - Input Stream
+
+Binary alternative to observing inputs with 'Observe:' message. After
+client sends 'Stream: <rate>', daemon sends it whole state of controller
+as fixed-size frame up to 'rate' times per second, but only when state has
+changed. Frames are sent over same connection as other messages and can be
+told apart by first byte, which is zero and so can never start text line.
+
+Frame contains logical state of controller, as seen by mapper; On
+controllers where stick and left pad share same axes, stick and pad
+positions are already separated.
+"""
+from scc.constants import SCButtons, ControllerFlags, STICKTILT
+from scc.tools import clamp
+from collections import namedtuple
+import struct
+
+MARKER = 0
+FIELDS = ("buttons", "ltrig", "rtrig", "stick_x", "stick_y", "lpad_x", "lpad_y",
+	"rpad_x", "rpad_y", "rstick_x", "rstick_y", "cpad_x", "cpad_y",
+	"dpad_x", "dpad_y", "accel_x", "accel_y", "accel_z",
+	"gpitch", "groll", "gyaw", "q1", "q2", "q3", "q4")
+
+# marker, stream index, buttons and everything else as int16
+FRAME = struct.Struct("<BBI" + "h" * (len(FIELDS) - 1))
+
+StreamState = namedtuple('StreamState', FIELDS)
+
+
+def decode(frame):
+	""" Returns (stream index, StreamState) tuple """
+	values = FRAME.unpack(frame)
+	return values[1], StreamState._make(values[2:])
+
+
+class StateEncoder(object):
+	"""
+	Packs states of one controller into frames.
+	States are driver-specific; Fields that given state doesn't have
+	are sent as zeros.
+	"""
+
+	def __init__(self, index, flags):
+		self.index = index
+		self.stick_on_lpad = not flags & ControllerFlags.SEPARATE_STICK
+		self.stick = 0, 0
+		self.lpad = 0, 0
+		self._getters = {}
+
+
+	@staticmethod
+	def _make_getter(cls):
+		present = [ name for name in FIELDS if hasattr(cls, name) ]
+		def getter(state):
+			values = dict.fromkeys(FIELDS, 0)
+			for name in present:
+				values[name] = getattr(state, name)
+			return values
+		return getter
+
+
+	def encode(self, state):
+		""" Returns frame as bytes """
+		getter = self._getters.get(type(state))
+		if getter is None:
+			getter = self._getters[type(state)] = StateEncoder._make_getter(type(state))
+		values = getter(state)
+		buttons = values["buttons"]
+		if self.stick_on_lpad:
+			# Same logic as in Mapper._input_lpad_touch
+			lpad = values["lpad_x"], values["lpad_y"]
+			if buttons & STICKTILT:
+				self.stick = lpad
+			elif buttons & SCButtons.LPADTOUCH:
+				self.lpad = lpad
+			else:
+				self.stick, self.lpad = lpad, (0, 0)
+			values["stick_x"], values["stick_y"] = self.stick
+			values["lpad_x"], values["lpad_y"] = self.lpad
+			values["buttons"] = buttons & ~STICKTILT
+		return FRAME.pack(MARKER, self.index, values["buttons"] & 0xFFFFFFFF,
+			*[ clamp(-0x8000, int(values[name]), 0x7FFF) for name in FIELDS[1:] ])
@@ -23,6 +23,7 @@ from __future__ import annotations
 
 import ctypes
 import os
+import threading
 from ctypes import POINTER, byref, c_bool, c_int16, c_int32, c_uint16
 from enum import IntEnum
 from math import copysign, fmod, sqrt
@@ -43,6 +44,16 @@ else:
 	CHEAD = defines("/usr/include", "linux/input.h")
 
 MAX_FEEDBACK_EFFECTS = 4
+# Number of events that can be buffered before they are written to device
+EVENT_BUFFER_SIZE = 64
+
+EV_SYN = CHEAD["EV_SYN"]
+EV_KEY = CHEAD["EV_KEY"]
+EV_REL = CHEAD["EV_REL"]
+EV_ABS = CHEAD["EV_ABS"]
+EV_MSC = CHEAD["EV_MSC"]
+SYN_REPORT = CHEAD["SYN_REPORT"]
+MSC_SCAN = CHEAD["MSC_SCAN"]
 
 class Keys(IntEnum):
 	"""Keys enum contains all keys and button from linux/uinput.h (KEY_* BTN_*)."""
@@ -216,6 +227,12 @@ class FeedbackEvent(ctypes.Structure):
 class UInput(object):
 	"""UInput class permits to create a uinput device.
 
+	Generated events are not written to device right away, but stored in
+	buffer. synEvent writes all of them, followed by SYN_REPORT, using
+	single write() call. Buffer is guarded by lock, as events may be
+	generated on other thread than one processing inputs (for example
+	when buttons are released on profile switch).
+
 	See Gamepad, Mouse, Keyboard for examples
 	"""
 
@@ -281,6 +298,42 @@ class UInput(object):
 		if self._fd < 0:
 			raise CannotCreateUInputException("Failed to create uinput device. Error code: %s" % (self._fd,))
 
+		self._init_buffer()
+
+
+	def _init_buffer(self):
+		self._buffer = (InputEvent * EVENT_BUFFER_SIZE)()
+		self._buffer_bytes = memoryview(self._buffer).cast("B")
+		self._buffered = 0
+		self._lock = threading.Lock()
+
+
+	def _event(self, type: int, code: int, val: int):
+		"""Store event in buffer, writing buffer out first if it's full."""
+		with self._lock:
+			self._store(type, code, val)
+
+
+	def _store(self, type: int, code: int, val: int):
+		"""Same as _event, but has to be called with lock held."""
+		if self._buffered >= EVENT_BUFFER_SIZE:
+			self._flush()
+		ev = self._buffer[self._buffered]
+		ev.type = type
+		ev.code = code
+		ev.value = val
+		self._buffered += 1
+
+
+	def _flush(self):
+		"""Write all buffered events to device. Has to be called with lock held."""
+		try:
+			os.write(self._fd, self._buffer_bytes[:self._buffered * ctypes.sizeof(InputEvent)])
+		except OSError:
+			# Same as with native module, failed write is silently ignored
+			pass
+		self._buffered = 0
+
 
 	def getDescriptor(self):
 		return self._fd
@@ -292,7 +345,7 @@ class UInput(object):
 		@param int axis		 key or btn event (KEY_* or BTN_*)
 		@param int val		  event value
 		"""
-		self._lib.uinput_key(self._fd, ctypes.c_uint16(key), ctypes.c_int32(val))
+		self._event(EV_KEY, key, val)
 
 
 	def axisEvent(self, axis: int, val: int):
@@ -301,7 +354,7 @@ class UInput(object):
 		@param int axis		 abs event (ABS_*)
 		@param int val		  event value
 		"""
-		self._lib.uinput_abs(self._fd, ctypes.c_uint16(axis), ctypes.c_int32(val))
+		self._event(EV_ABS, axis, val)
 
 	def relEvent(self, rel: int, val: int):
 		"""Generate a rel event (move move).
@@ -309,18 +362,24 @@ class UInput(object):
 		@param int rel		  rel event (REL_*)
 		@param int val		  event value
 		"""
-		self._lib.uinput_rel(self._fd, ctypes.c_uint16(rel), ctypes.c_int32(val))
+		self._event(EV_REL, rel, val)
 
 	def scanEvent(self, val: int):
 		"""Generate a scan event (MSC_SCAN).
 
 		@param int val		  scan event value (scancode)
 		"""
-		self._lib.uinput_scan(self._fd, ctypes.c_int32(val))
+		self._event(EV_MSC, MSC_SCAN, val)
 
 	def synEvent(self):
-		"""Generate a syn event."""
-		self._lib.uinput_syn(self._fd)
+		"""Generate a syn event and write out all buffered events.
+
+		Does nothing if there is nothing buffered.
+		"""
+		with self._lock:
+			if self._buffered:
+				self._store(EV_SYN, SYN_REPORT, 0)
+				self._flush()
 
 
 	def setDelayPeriod(self, delay: int, period: int):
@@ -391,6 +450,9 @@ class Mouse(UInput):
 
 	moveEvent can emulate free ball rotation of a track ball
 	updateParams permit to upgrade ball model and move scale
+
+	moveEvent, moveStickEvent and scrollEvent only buffer generated events;
+	synEvent has to be called to actually send them.
 	"""
 
 	DEFAULT_XSCALE = 0.006
@@ -466,8 +528,6 @@ class Mouse(UInput):
 		@param int dx		   delta movement from last call on x axis
 		@param int dy		   delta movement from last call on y axis
 		"""
-		_syn = False
-
 		# Clear mouse axis remainders if axis direction has changed
 		if (dx == 0 or ((dx > 0) != (self._dx > 0))):
 			self._dx = 0
@@ -487,14 +547,10 @@ class Mouse(UInput):
 			self._dx = self._dx - (fmod(self._dx * 100.0, 1.0) / 100.0)
 			self.relEvent(rel=Rels.REL_X, val=int(self._dx))
 			self._dx -= int(self._dx)
-			_syn = True
 		if int(self._dy):
 			self._dy = self._dy - (fmod(self._dy * 100.0, 1.0) / 100.0)
 			self.relEvent(rel=Rels.REL_Y, val=int(self._dy))
 			self._dy -= int(self._dy)
-			_syn = True
-		if _syn:
-			self.synEvent()
 
 	def moveStickEvent(self, dx: float = 0.0, dy: float = 0.0, time_elapsed: float = 0.0):
 		"""Generate move events from parametters and displacement.
@@ -502,8 +558,6 @@ class Mouse(UInput):
 		@param float dx		   delta movement from last call on x axis
 		@param float dy		   delta movement from last call on y axis
 		"""
-		_syn = False
-
 		# Clear mouse axis remainders if axis direction has changed
 		if (dx == 0 or ((dx > 0) != (self._dx > 0))):
 			self._dx = 0
@@ -520,14 +574,10 @@ class Mouse(UInput):
 			self._dx = self._dx - (fmod(self._dx * 100.0, 1.0) / 100.0)
 			self.relEvent(rel=Rels.REL_X, val=int(self._dx))
 			self._dx -= int(self._dx)
-			_syn = True
 		if int(self._dy):
 			self._dy = self._dy - (fmod(self._dy * 100.0, 1.0) / 100.0)
 			self.relEvent(rel=Rels.REL_Y, val=int(self._dy))
 			self._dy -= int(self._dy)
-			_syn = True
-		if _syn:
-			self.synEvent()
 
 	def clearRemainders(self):
 		self._dx = 0
@@ -622,17 +672,12 @@ class Mouse(UInput):
 		# Compute mouse mouvement from interger part of d * scale
 		self._scr_dx += dx * self._scr_xscale
 		self._scr_dy += dy * self._scr_yscale
-		_syn = False
 		if int(self._scr_dx):
 			self.relEvent(rel=Rels.REL_HWHEEL, val=int(copysign(1, self._scr_dx)))
 			self._scr_dx -= int(self._scr_dx)
-			_syn = True
 		if int(self._scr_dy):
 			self.relEvent(rel=Rels.REL_WHEEL,  val=int(copysign(1, self._scr_dy)))
 			self._scr_dy -= int(self._scr_dy)
-			_syn = True
-		if _syn:
-			self.synEvent()
 
 
 class Keyboard(UInput):
@@ -715,6 +760,7 @@ class Dummy(object):
 	pressEvent = keyEvent
 	releaseEvent = keyEvent
 	reset = keyEvent
+	clearRemainders = keyEvent
 
 	def keyManaged(self, ev):
 		return False
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+SC-Controller - Mapper Worker
+
+Optional mode in which every Mapper runs on its own thread, so slow action
+(such as one waiting for shell command or OSD daemon) executed for one
+controller doesn't delay processing inputs of every other one.
+
+Drivers still read and decode data on main thread and call mapper.input()
+as usual. While worker is running, that call only copies states into queue
+and wakes worker up; Mapper.input itself is then called on worker thread.
+Queue is plain deque, which is safe to append to and pop from in
+different threads without additional locking.
+
+Every mapper running on worker has its own WorkerScheduler, so its
+scheduled tasks are executed on worker thread as well. Drivers that flush
+events generated without new input (mapper.flush_events) have that call
+redirected to worker too. Daemon does the same, using MapperWorker.call,
+with everything else that changes state of mapper or writes to its
+virtual devices, such as switching profile or releasing buttons of
+removed controller. Virtual devices are not shared between mappers, so
+they are then written only by worker that owns them.
+"""
+from scc.scheduler import Scheduler
+from scc import latency
+from collections import deque
+from ctypes import Structure
+import time, heapq, threading, logging
+log = logging.getLogger("Worker")
+
+
+class WorkerScheduler(Scheduler):
+	"""
+	Scheduler used by mapper that runs on MapperWorker.
+	Tasks may be scheduled and canceled from any thread, so heap is
+	guarded by lock. Callbacks are called without lock held.
+	Wakes worker up when task is scheduled from another thread,
+	as worker may be sleeping until later deadline.
+	"""
+
+	def __init__(self):
+		Scheduler.__init__(self)
+		self.worker = None
+		self._lock = threading.RLock()
+
+
+	def schedule(self, delay, callback, *data):
+		with self._lock:
+			task = Scheduler.schedule(self, delay, callback, *data)
+		if self.worker and threading.get_ident() != self.worker.ident:
+			self.worker.wakeup()
+		return task
+
+
+	def cancel_task(self, task):
+		with self._lock:
+			return Scheduler.cancel_task(self, task)
+
+
+	def next_deadline(self):
+		with self._lock:
+			return Scheduler.next_deadline(self)
+
+
+	def run(self):
+		self._now = time.monotonic()
+		while True:
+			with self._lock:
+				# _compact may replace heap while callback is running
+				heap = self._heap
+				if not heap or self._now < heap[0][0]:
+					return
+				task = heapq.heappop(heap)[2]
+				if task._scheduler is not self:
+					# Canceled
+					self._canceled -= 1
+					continue
+				task._scheduler = None
+			task.callback(*task.data)
+
+
+class MapperWorker(object):
+	"""
+	Runs Mapper.input and tasks scheduled by mapper on dedicated thread.
+	Mapper has to be created with WorkerScheduler instance.
+	"""
+
+	def __init__(self, mapper, name, poller=None):
+		"""
+		'poller', if set, is woken up every time mapper sends feedback,
+		so drivers that send it from mainloop can do so without delay.
+		"""
+		self.mapper = mapper
+		self.scheduler = mapper.scheduler
+		self.scheduler.worker = self
+		self.poller = poller
+		self.ident = None
+		self._queue = deque()
+		self._event = threading.Event()
+		self._thread = threading.Thread(target=self._run, name=name)
+		self._thread.daemon = True
+
+
+	def start(self):
+		""" Starts thread and redirects mapper.input and flush_events to it """
+		self.mapper.input = self.input
+		self.mapper.flush_events = self.flush_events
+		self._thread.start()
+
+
+	@staticmethod
+	def _copy_state(state):
+		"""
+		Drivers that decode data into ctypes structures reuse them for
+		next packet, so those have to be copied before handing them over.
+		Named tuples are immutable and can be passed as they are.
+		"""
+		if isinstance(state, Structure):
+			return type(state).from_buffer_copy(state)
+		return state
+
+
+	def input(self, controller, old_state, state):
+		""" Replaces mapper.input while worker is running. Called on main thread """
+		self._queue.append((self._input, (controller,
+			MapperWorker._copy_state(old_state), MapperWorker._copy_state(state),
+			latency.take_received(controller))))
+		self._event.set()
+
+
+	def flush_events(self):
+		""" Replaces mapper.flush_events while worker is running """
+		self._queue.append((self._flush_events, ()))
+		self._event.set()
+
+
+	def call(self, callback, *data):
+		"""
+		Calls callback(*data) on worker thread, after inputs queued before.
+		Can be called from any thread.
+		"""
+		self._queue.append((callback, data))
+		self._event.set()
+
+
+	def _input(self, controller, old_state, state, received):
+		mapper = self.mapper
+		mapper.__class__.input(mapper, controller, old_state, state, received)
+
+
+	def _flush_events(self):
+		mapper = self.mapper
+		mapper.__class__.flush_events(mapper)
+
+
+	def wakeup(self):
+		""" Wakes worker up, so it checks for new scheduled tasks """
+		self._event.set()
+
+
+	def _run(self):
+		self.ident = threading.get_ident()
+		queue, event, scheduler, mapper = self._queue, self._event, self.scheduler, self.mapper
+		while True:
+			deadline = scheduler.next_deadline()
+			if deadline is None:
+				event.wait()
+			else:
+				event.wait(max(0.0, deadline - time.monotonic()))
+			event.clear()
+			while queue:
+				callback, data = queue.popleft()
+				try:
+					callback(*data)
+				except Exception:
+					log.exception("Error while processing input")
+			scheduler.run()
+			if mapper.feedback_sent:
+				mapper.feedback_sent = False
+				if self.poller:
+					self.poller.wakeup()
@@ -3,6 +3,11 @@
 SC-Controller - Autoswitch Daemon
 
 Observes active window and commands scc-daemon to change profiles as needed.
+
+Instead of periodically asking XServer for active window, AutoSwitcher
+subscribes to PropertyNotify events on root window (to learn about
+_NET_ACTIVE_WINDOW changes) and on active window (to learn about its title
+changes) and sleeps until one of them arrives.
 """
 from scc.tools import _
 
@@ -16,14 +21,21 @@ from scc.actions import Action
 from scc.mapper import Mapper
 from scc.config import Config
 
-import os, sys, re, time, socket, traceback, threading, logging
+import os, sys, re, socket, select, traceback, threading, logging
 log = logging.getLogger("AutoSwitcher")
 
 class AutoSwitcher(object):
-	INTERVAL = 1
+	# Window properties that, when changed, may cause profile switch
+	ROOT_PROPERTIES = ( b"_NET_ACTIVE_WINDOW", )
+	WINDOW_PROPERTIES = ( b"_NET_WM_NAME", b"WM_NAME" )
 
 	def __init__(self):
 		self.dpy = X.open_display(os.environ["DISPLAY"].encode("utf-8"))
+		# Active window may be destroyed at any time, what makes X calls
+		# fail. Default error handler would terminate process in such case
+		self._error_handler = X.XErrorHandler(lambda dpy, error: 0)
+		X.set_error_handler(self._error_handler)
+		self._wakeup_r, self._wakeup_w = os.pipe()
 		self.lock = threading.Lock()
 		self.thread = threading.Thread(target=self.connect_daemon)
 		self.config = Config()
@@ -35,7 +47,10 @@ class AutoSwitcher(object):
 		self.exit_code = None
 		self.current_profile = None
 		self.current_window = None
+		self.current_title = None
+		self.current_actions = None
 		self.conds = AutoSwitcher.parse_conditions(self.config)
+		self.index = ConditionIndex(self.conds)
 
 
 	@staticmethod
@@ -115,33 +130,63 @@ class AutoSwitcher(object):
 					log.debug("Reloading config...")
 					self.config = Config()
 					self.conds = AutoSwitcher.parse_conditions(self.config)
+					self.index = ConditionIndex(self.conds)
 				elif line.startswith("Controller Count:"):
 					self.enabled = int(line.split(":")[-1]) > 0
 					log.debug("Enabled: %s", self.enabled)
 
 			self.lock.release()
+			self.wakeup()
 
 
-	def check(self, *a):
-		w = X.get_current_window(self.dpy)
-		if w == self.current_window or not self.current_profile:
-			# Window not switched or profile is not known yet
-			return
-		self.current_window = w
-		log.debug("Window switched: %s", w)
-		pars = X.get_window_title(self.dpy, w), X.get_window_class(self.dpy, w)
+	def wakeup(self):
+		""" Wakes up main loop, so active window is checked again """
+		os.write(self._wakeup_w, b"\0")
 
-		if pars[0] is None:
-			pars = ("",pars[1])
 
-		if pars[1] is None:
-			pars = (pars[0], ("",""))
+	def watch_window(self, window):
+		"""
+		Subscribes to property changes of given window and unsubscribes from
+		previously active one.
+		"""
+		root = X.get_default_root_window(self.dpy)
+		if self.current_window and self.current_window != root:
+			X.select_input(self.dpy, self.current_window, X.NOEVENTMASK)
+		if window and window != root:
+			X.select_input(self.dpy, window, X.PROPERTYCHANGEMASK)
 
-		for c in self.conds:
-			if c.matches(*pars):
-				action = self.conds[c]
-				action.button_press(self.mapper)
-				action.button_release(self.mapper)
+
+	def check(self, *a):
+		if not self.current_profile:
+			# Profile is not known yet
+			return
+		w = X.get_current_window(self.dpy)
+		title = X.get_window_title(self.dpy, w) or ""
+		if w == self.current_window:
+			if title == self.current_title:
+				# Neither window nor its title changed
+				return
+			log.debug("Window title changed: %s", title)
+		else:
+			self.watch_window(w)
+			self.current_window = w
+			self.current_actions = None
+			log.debug("Window switched: %s", w)
+		self.current_title = title
+
+		wm_class = X.get_window_class(self.dpy, w)
+		if wm_class[0] is None:
+			wm_class = ("", "")
+
+		actions = self.index.matching(title, wm_class)
+		if actions == self.current_actions:
+			# Title changed, but matching conditions are still same. Nothing
+			# is done in such case, so user can switch profile manually
+			return
+		self.current_actions = actions
+		for action in actions:
+			action.button_press(self.mapper)
+			action.button_release(self.mapper)
 
 
 	def on_sa_profile(self, mapper, action):
@@ -189,12 +234,32 @@ class AutoSwitcher(object):
 
 
 	def run(self):
+		root = X.get_default_root_window(self.dpy)
+		X.select_input(self.dpy, root, X.PROPERTYCHANGEMASK)
+		watched = set(
+			[ X.intern_atom(self.dpy, name, False) for name in AutoSwitcher.ROOT_PROPERTIES ]
+			+ [ X.intern_atom(self.dpy, name, False) for name in AutoSwitcher.WINDOW_PROPERTIES ]
+		)
+		fd = X.connection_number(self.dpy)
+		event = X.XEvent()
+
 		self.thread.start()
 		log.debug("AutoSwitcher started")
 		while self.exit_code is None:
-			if self.enabled:
+			changed = False
+			# X.pending has to be checked first, as events already read
+			# by Xlib are not signaled on connection socket
+			if not X.pending(self.dpy):
+				readable, trash, trash = select.select([ fd, self._wakeup_r ], [], [])
+				if self._wakeup_r in readable:
+					os.read(self._wakeup_r, 1024)
+					changed = True
+			while X.pending(self.dpy):
+				X.next_event(self.dpy, event)
+				if event.type == X.PROPERTYNOTIFY and event.xproperty.atom in watched:
+					changed = True
+			if changed and self.enabled:
 				self.check()
-			time.sleep(self.INTERVAL)
 		return 1
 
 
@@ -220,7 +285,7 @@ class Condition(object):
 		if type(self.regexp) is str:
 			self.regexp = re.compile(self.regexp)
 		self.wm_class = wm_class
-		self.empty = not ( title or title or regexp or wm_class )
+		self.empty = not ( exact_title or title or regexp or wm_class )
 
 
 	def __str__(self):
@@ -300,6 +365,81 @@ class Condition(object):
 		return True
 
 
+class ConditionIndex(object):
+	"""
+	Allows to find conditions matching window without testing all of them.
+
+	Conditions are sorted by their most selective part. Those matching exact
+	title or window class are stored in dicts; Title and regexp matching of
+	all others is merged into one regular expression, which filters out
+	conditions that can't match. Everything found is then verified by
+	Condition.matches.
+	"""
+
+	def __init__(self, conds):
+		"""
+		'conds' is dict of {condition: action}, as returned by
+		AutoSwitcher.parse_conditions.
+		"""
+		self.by_exact_title = {}
+		self.by_wm_class = {}
+		self.filtered = []		# (order, condition, action) checked only if self.filter matches
+		self.unfiltered = []	# (order, condition, action) checked always
+		patterns = []
+		for order, (c, action) in enumerate(conds.items()):
+			item = order, c, action
+			if c.empty:
+				continue
+			elif c.exact_title:
+				self.by_exact_title.setdefault(c.exact_title, []).append(item)
+			elif c.wm_class:
+				self.by_wm_class.setdefault(c.wm_class, []).append(item)
+			else:
+				pattern = ConditionIndex._get_pattern(c)
+				if pattern is None:
+					self.unfiltered.append(item)
+				else:
+					patterns.append("(?P<c%s>%s)" % (len(self.filtered), pattern))
+					self.filtered.append(item)
+		self.filter = re.compile("|".join(patterns)) if patterns else None
+
+
+	@staticmethod
+	def _get_pattern(c):
+		"""
+		Returns pattern that matches at least all titles matched by condition,
+		or None if there is no such pattern that can be safely merged
+		with others.
+		"""
+		if c.regexp:
+			if c.regexp.groups or c.regexp.flags & ~re.UNICODE:
+				# Groups would be renumbered and flags applied to
+				# everything after merging
+				return None
+			return "(?:%s)" % (c.regexp.pattern,)
+		return "(?s:.*?)%s" % (re.escape(c.title),)
+
+
+	def matching(self, window_title, wm_class):
+		"""
+		Returns list of actions assigned to all conditions matching window,
+		in same order as conditions were specified.
+		"""
+		candidates = list(self.by_exact_title.get(window_title, ()))
+		candidates += self.by_wm_class.get(wm_class[0], ())
+		if wm_class[1] != wm_class[0]:
+			candidates += self.by_wm_class.get(wm_class[1], ())
+		if self.filter:
+			m = self.filter.match(window_title)
+			if m:
+				# Conditions before first match are known not to match
+				candidates += self.filtered[int(m.lastgroup[1:]):]
+		candidates += self.unfiltered
+		candidates.sort(key=lambda item: item[0])
+		return [ action for order, c, action in candidates
+			if c.matches(window_title, wm_class) ]
+
+
 class AutoswitchOptsMenuGenerator(MenuGenerator):
 	""" Generates entire Autoswich Options submenu """
 	GENERATOR_NAME = "autoswitch"
@@ -31,6 +31,7 @@ from scc.osd.dialog import Dialog
 from scc.osd import OSDWindow
 from scc.osd.menu import Menu
 from scc.osd.area import Area
+from scc.menu_data import MenuDataCache
 from scc.special_actions import OSDAction
 from scc.tools import shsplit
 from scc.config import Config
@@ -39,6 +40,9 @@ from scc.config import Config
 log = logging.getLogger("osd.daemon")
 
 class OSDDaemon(object):
+	# Classes of windows kept prepared in pool
+	POOLED_WINDOWS = ( Menu, RadialMenu, QuickMenu, GridMenu, HorizontalMenu, Dialog )
+
 	def __init__(self):
 		self.exit_code = -1
 		self.mainloop = GLib.MainLoop()
@@ -48,6 +52,8 @@ class OSDDaemon(object):
 		self._hash_of_colors = -1
 		self._visible_messages = {}
 		self._window = None
+		self._menu_cache = MenuDataCache()
+		self._window_pool = {}	# class -> window created and realized in advance
 		self._registered = False
 		self._last_profile_change = 0
 		self._recent_profiles_undo = None
@@ -148,6 +154,30 @@ class OSDDaemon(object):
 			self.daemon.request('Gestured: x', lambda *a : False, lambda *a : False)
 
 
+	def _get_window(self, cls):
+		"""
+		Returns window of given class prepared in pool or, if there is none,
+		creates new one. Pool is refilled once main loop is idle.
+		"""
+		window = self._window_pool.pop(cls, None)
+		if window is None:
+			window = cls()
+		GLib.idle_add(self._refill_window_pool, cls, priority=GLib.PRIORITY_LOW)
+		return window
+
+
+	def _refill_window_pool(self, cls):
+		"""
+		Creates and realizes (but doesn't show) window of given class,
+		so it's ready to be used next time.
+		"""
+		if cls not in self._window_pool:
+			window = cls()
+			window.realize()
+			self._window_pool[cls] = window
+		return False
+
+
 	@staticmethod
 	def _is_menu_message(m):
 		"""
@@ -214,19 +244,21 @@ class OSDDaemon(object):
 				log.warning("Another OSD is already visible - refusing to show menu")
 			else:
 				if message.startswith("OSD: hmenu"):
-					self._window = HorizontalMenu()
+					self._window = self._get_window(HorizontalMenu)
 				elif message.startswith("OSD: radialmenu"):
-					self._window = RadialMenu()
+					self._window = self._get_window(RadialMenu)
 				elif message.startswith("OSD: quickmenu"):
-					self._window = QuickMenu()
+					self._window = self._get_window(QuickMenu)
 				elif message.startswith("OSD: gridmenu"):
-					self._window = GridMenu()
+					self._window = self._get_window(GridMenu)
 				elif message.startswith("OSD: dialog"):
-					self._window = Dialog()
+					self._window = self._get_window(Dialog)
 				else:
-					self._window = Menu()
+					self._window = self._get_window(Menu)
 				self._window.connect('destroy', self.on_menu_closed)
 				self._window.use_config(self.config)
+				if isinstance(self._window, Menu):
+					self._window.use_menu_cache(self._menu_cache)
 				try:
 					if self._window.parse_argumets(args):
 						self._window.show()
@@ -288,6 +320,11 @@ class OSDDaemon(object):
 		if self._hash_of_colors != h:
 			self._hash_of_colors = h
 			OSDWindow._apply_css(self.config)
+			# Pooled windows were colored when they were created
+			pool, self._window_pool = self._window_pool, {}
+			for cls, window in pool.items():
+				window.destroy()
+				GLib.idle_add(self._refill_window_pool, cls, priority=GLib.PRIORITY_LOW)
 			if self._window and isinstance(self._window, Keyboard):
 				self._window.recolor()
 				self._window.update_labels()
@@ -303,6 +340,8 @@ class OSDDaemon(object):
 		self.daemon.connect('profile-changed', self.on_profile_changed)
 		self.daemon.connect('reconfigured', self.on_daemon_reconfigured)
 		self.daemon.connect('unknown-msg', self.on_unknown_message)
+		for cls in OSDDaemon.POOLED_WINDOWS:
+			GLib.idle_add(self._refill_window_pool, cls, priority=GLib.PRIORITY_LOW)
 		self.mainloop.run()
 
 
@@ -0,0 +1,52 @@
+from scc.x11.autoswitcher import Condition, ConditionIndex
+
+
+CONDITIONS = [
+	Condition(exact_title="Terminal"),
+	Condition(wm_class="Firefox"),
+	Condition(wm_class="firefox", title="YouTube"),
+	Condition(title="Steam"),
+	Condition(regexp="Doom.*"),
+	Condition(regexp="(Quake|Heretic) [0-9]+"),
+	Condition(regexp="(?i)hexen"),
+	Condition(title="Steam", regexp=".*Friends"),
+	Condition(title="a.b"),
+	Condition(),
+]
+
+WINDOWS = [
+	("Terminal", ("xterm", "XTerm")),
+	("Terminal - bash", ("xterm", "XTerm")),
+	("YouTube - Mozilla Firefox", ("Navigator", "Firefox")),
+	("YouTube", ("firefox", "Firefox")),
+	("Steam", ("Steam", "Steam")),
+	("Steam - Friends", ("Steam", "Steam")),
+	("Doom II", ("doom", "Doom")),
+	("Ultimate Doom", ("doom", "Doom")),
+	("Quake 3", ("quake", "Quake")),
+	("HEXEN", ("hexen", "Hexen")),
+	("a.b", ("", "")),
+	("axb", ("", "")),
+	("", ("", "")),
+]
+
+
+class TestAutoswitcher(object):
+	"""Tests matching of autoswitcher conditions."""
+
+	def test_index(self):
+		"""
+		Tests if ConditionIndex finds exactly same conditions, in same
+		order, as testing them one by one.
+		"""
+		conds = { c : i for i, c in enumerate(CONDITIONS) }
+		index = ConditionIndex(conds)
+		for title, wm_class in WINDOWS:
+			expected = [ conds[c] for c in conds if c.matches(title, wm_class) ]
+			assert index.matching(title, wm_class) == expected, title
+
+
+	def test_exact_title(self):
+		"""Tests if condition with only exact title specified is not empty."""
+		assert Condition(exact_title="Terminal").matches("Terminal", ("", ""))
+		assert not Condition().matches("Terminal", ("", ""))
@@ -0,0 +1,72 @@
+import socket
+
+from scc.sccdaemon import ClientOutput
+
+
+class TestClientOutput(object):
+	"""Tests queueing of data sent to control socket clients."""
+
+	def _make(self):
+		a, b = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+		backlogged = []
+		output = ClientOutput(a, backlogged.append)
+		a.close()
+		return output, b, backlogged
+
+
+	def _fill(self, output):
+		""" Writes until socket stops accepting data """
+		while not output._queue:
+			output.write(b"x" * 4096)
+
+
+	def _read_all(self, sock):
+		data = b""
+		sock.setblocking(False)
+		try:
+			while True:
+				chunk = sock.recv(65536)
+				if not chunk:
+					break
+				data += chunk
+		except BlockingIOError:
+			pass
+		return data
+
+
+	def test_write(self):
+		"""Tests that data is sent right away if peer is reading."""
+		output, peer, backlogged = self._make()
+		assert output.write(b"Event: 0 A 1\n")
+		assert peer.recv(100) == b"Event: 0 A 1\n"
+		assert not backlogged
+
+
+	def test_coalesce(self):
+		"""Tests that queued message with same key is replaced."""
+		output, peer, backlogged = self._make()
+		self._fill(output)
+		assert backlogged == [ output ]
+		output.write(b"Event: 0 A 1\n")
+		output.write(b"Event: 0 STICK 1 1\n", "stick")
+		output.write(b"Event: 0 STICK 2 2\n", "stick")
+		output.write(b"Event: 0 A 0\n")
+		output.write(b"Event: 0 STICK 3 3\n", "stick")
+		data = b""
+		while not output.send_queued():
+			data += self._read_all(peer)
+		data += self._read_all(peer)
+		assert data.endswith(b"Event: 0 A 1\nEvent: 0 STICK 3 3\nEvent: 0 A 0\n")
+		assert backlogged == [ output ]
+
+
+	def test_drop_slow(self):
+		"""Tests that client not reading its messages is disconnected."""
+		output, peer, backlogged = self._make()
+		self._fill(output)
+		while output.write(b"x" * 4096):
+			pass
+		assert output.closed
+		assert backlogged == [ output, output ]
+		assert not output.write(b"Event: 0 A 1\n")
+		output.release()
@@ -0,0 +1,66 @@
+import json, os
+
+import pytest
+
+from scc.config import Config
+from scc.poller import Poller
+
+
+@pytest.fixture
+def shared_config(tmp_path, monkeypatch):
+	monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path))
+	monkeypatch.setattr(Config, "_shared", None)
+	monkeypatch.setattr(Config, "_listeners", [])
+	monkeypatch.setattr(Config, "_inotify_fd", None)
+	yield os.path.join(str(tmp_path), "scc", "config.json")
+	if Config._inotify_fd is not None:
+		os.close(Config._inotify_fd)
+
+
+def _write(filename, **changes):
+	with open(filename, "r") as f:
+		data = json.load(f)
+	data.update(changes)
+	with open(filename, "w") as f:
+		json.dump(data, f)
+
+
+class TestConfig(object):
+	"""Tests configuration shared by whole process."""
+
+	def test_shared(self, shared_config):
+		"""Tests that shared config is loaded once and can't be modified."""
+		cfg = Config.get_shared()
+		assert os.path.exists(shared_config)
+		assert Config.get_shared() is cfg
+		with pytest.raises(TypeError):
+			cfg["enable_sniffing"] = True
+		assert cfg.get_controller_config("sc1")["name"] == "sc1"
+		assert "sc1" not in cfg["controllers"]
+
+
+	def test_reload(self, shared_config):
+		"""Tests that config is replaced and listeners called only on change."""
+		cfg = Config.get_shared()
+		changes = []
+		Config.add_listener(changes.append)
+		assert not Config.reload_shared()
+		_write(shared_config, enable_sniffing=not cfg["enable_sniffing"])
+		assert Config.reload_shared()
+		assert changes == [ Config.get_shared() ]
+		assert Config.get_shared() is not cfg
+		assert Config.get_shared()["enable_sniffing"] != cfg["enable_sniffing"]
+
+
+	def test_watch(self, shared_config):
+		"""Tests that change is noticed by inotify."""
+		cfg = Config.get_shared()
+		poller = Poller()
+		assert Config.watch_shared(poller)
+		changes = []
+		Config.add_listener(changes.append)
+		_write(shared_config, latency_stats=not cfg["latency_stats"])
+		for i in range(10):
+			poller.poll(0.1)
+			if changes: break
+		assert changes and changes[0]["latency_stats"] != cfg["latency_stats"]
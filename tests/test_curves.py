@@ -0,0 +1,93 @@
+import gc, pickle
+from math import sqrt, atan2, sin, cos
+
+from scc.constants import STICK_PAD_MIN, STICK_PAD_MAX, TRIGGER_MAX
+from scc.constants import CUT, ROUND, LINEAR, MINIMUM
+from scc.constants import POWER, EXPONENTIAL, SCURVE, POINTS
+from scc.actions import Action, XYAction, GyroAbsAction
+from scc.modifiers import DeadzoneModifier, CurveModifier
+from scc.curves import SharedTable, ResponseTable, MAX_DISTANCE
+
+
+class TriggerRecorder(Action):
+	def trigger(self, mapper, position, old_position):
+		self.position = position
+
+
+class TestCurves(object):
+	"""Tests precomputed response tables."""
+
+	def test_linear(self):
+		"""Tests that LINEAR deadzone scales distance without changing direction."""
+		d = DeadzoneModifier(LINEAR, 3000, 30000, XYAction()).compress()
+		for x, y in ((-1000, 20000), (2121.3, 2121.4), (32767, 32767), (100, -100)):
+			# As computed before, through angle
+			distance = min(max(3000, sqrt(x * x + y * y)), 30000)
+			distance = (distance - 3000) / (30000 - 3000) * STICK_PAD_MAX
+			angle = atan2(x, y)
+			a, b = d._convert(x, y, STICK_PAD_MAX)
+			assert abs(a - distance * sin(angle)) < 1e-6
+			assert abs(b - distance * cos(angle)) < 1e-6
+
+
+	def test_curve_table(self):
+		"""Tests that interpolated curve is close to computed one."""
+		for params in ((POWER, 2), (POWER, 0.3), (EXPONENTIAL, 10), (SCURVE, 3),
+				(POINTS, 0.2, 0.1, 0.5, 0.6)):
+			curve = CurveModifier(*(params + (XYAction(),)))
+			# Table is sampled only once first input comes
+			assert curve._table.slopes is None
+			fn = CurveModifier._make_function(*params)
+			for d in range(0, MAX_DISTANCE + 100, 7):
+				assert abs(curve._table.apply(d) - fn(d)) <= ResponseTable.MAX_ERROR
+				assert abs(curve._table.apply(-d - 0.5) + fn(d + 0.5)) <= ResponseTable.MAX_ERROR
+			x, y = curve._table.apply2(3000, -4000)
+			assert abs(x / y + 0.75) < 1e-9
+			assert abs(sqrt(x * x + y * y) - fn(5000)) <= ResponseTable.MAX_ERROR
+
+
+	def test_shared(self):
+		"""Tests that table is built only once and is not copied by pickle."""
+		a = CurveModifier(3, XYAction())
+		b = CurveModifier(3, XYAction())
+		assert a._table is b._table
+		c = pickle.loads(pickle.dumps(a))
+		assert c._table is a._table
+
+
+	def test_trigger_table(self):
+		"""Tests that precomputed trigger response is same as computed one."""
+		positions = list(range(TRIGGER_MAX + 1)) + [ 100.5 ]
+		for mode in (CUT, ROUND, LINEAR, MINIMUM):
+			exact = DeadzoneModifier(mode, 3000, 30000, TriggerRecorder())
+			table = DeadzoneModifier(mode, 3000, 30000, TriggerRecorder()).compress()
+			assert table._trigger_table is not None
+			for p in positions:
+				exact.trigger(None, p, 0)
+				table.trigger(None, p, 0)
+				assert abs(exact.action.position - table.action.position) < 1e-6
+		curve = CurveModifier(SCURVE, 3, TriggerRecorder())
+		fn = CurveModifier._make_function(SCURVE, 3)
+		for p in positions:
+			curve.trigger(None, p, 0)
+			a = fn(float(p) * STICK_PAD_MAX / TRIGGER_MAX) * TRIGGER_MAX / STICK_PAD_MAX
+			assert abs(a - curve.action.position) < 1e-6
+
+
+	def test_gyro_table(self):
+		"""Tests that deadzone applied by GyroAbsAction is computed exactly."""
+		for mode in (CUT, ROUND, LINEAR, MINIMUM):
+			exact = DeadzoneModifier(mode, 3000, 30000)
+			action = DeadzoneModifier(mode, 3000, 30000, GyroAbsAction("ABS_X")).compress()
+			for x in (STICK_PAD_MIN, -30001, -12345, -3000, -1, 0, 4, 2999, 30000, STICK_PAD_MAX):
+				assert int(action._deadzone_table.apply(x)) == int(exact._convert(x, 0, STICK_PAD_MAX)[0])
+
+
+	def test_dropped(self):
+		"""Tests that table is not kept once nothing uses it."""
+		a = CurveModifier(5, XYAction())
+		key = a._table._key
+		assert key in SharedTable._cache
+		del a
+		gc.collect()
+		assert key not in SharedTable._cache
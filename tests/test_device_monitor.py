@@ -0,0 +1,39 @@
+import os
+
+from scc.device_monitor import DeviceMonitor
+
+
+def _make_node(root, name, uniq=""):
+	path = os.path.join(str(root), name)
+	os.makedirs(os.path.join(path, "hidraw", "hidraw3"))
+	with open(os.path.join(path, "uevent"), "w") as f:
+		f.write("DRIVER=hid-generic\nHID_ID=0005:0000054C:00000CE6\n")
+		f.write("HID_NAME=Wireless Controller\nHID_UNIQ=%s\n" % (uniq,))
+	with open(os.path.join(path, "report_descriptor"), "wb") as f:
+		f.write(b"\x05\x01")
+	return path
+
+
+class TestDeviceMonitor(object):
+	"""Tests index of HID nodes kept by device monitor."""
+
+	def test_hid_index(self, tmp_path, monkeypatch):
+		"""Tests looking up and removing HID nodes."""
+		usb = _make_node(tmp_path, "0003:28DE:1142.0001")
+		bt = _make_node(tmp_path, "0005:054C:0CE6.0002", "a0:5a:5d:87:82:17")
+		_make_node(tmp_path, "not-a-hid-node")
+		mon = DeviceMonitor(None, None)
+		nodes = [ usb, bt ]
+		monkeypatch.setattr(mon, "_build_hid_index",
+			lambda: [ mon._index_hid(x) for x in nodes ])
+
+		assert mon.get_report_descriptor_path(0x28DE, 0x1142) == os.path.join(usb, "report_descriptor")
+		assert mon.get_hid_node("A0:5A:5D:87:82:17") == bt
+		mon.bt_addresses["hci0:256"] = "A0:5A:5D:87:82:17"
+		assert mon.get_hidraw("/sys/devices/virtual/bluetooth/hci0/hci0:256") == "hidraw3"
+
+		nodes = []
+		mon._unindex_hid(bt)
+		assert mon.get_hid_node("A0:5A:5D:87:82:17") is None
+		assert mon.get_report_descriptor_path(0x054C, 0x0CE6) is None
+		assert mon.get_report_descriptor_path(0x28DE, 0x1142) is not None
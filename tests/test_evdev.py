@@ -0,0 +1,98 @@
+from evdev import InputEvent, ecodes
+
+from scc.constants import STICK_PAD_MAX, TRIGGER_MAX, SCButtons
+from scc.drivers.evdevdrv import EvdevController, calibrate
+
+CONFIG = {
+	"axes": {
+		str(ecodes.ABS_X): { "axis": "stick_x", "min": 0, "max": 255, "deadzone": 4 },
+		str(ecodes.ABS_RX): { "axis": "lpad_x", "min": -32768, "max": 32767 },
+	},
+	"buttons": {
+		str(ecodes.BTN_SOUTH): "A",
+		str(ecodes.BTN_TL2): "ltrig",
+	},
+	"dpads": {
+		str(ecodes.BTN_DPAD_RIGHT): { "axis": "rpad_x", "min": -32768, "max": 32767, "positive": True },
+	},
+}
+
+
+class FakeDevice(object):
+	path = "/dev/input/fake"
+	name = "Fake Device"
+
+	def __init__(self):
+		self.events = []
+
+	def read(self):
+		events, self.events = self.events, []
+		return events
+
+
+class FakeMapper(object):
+
+	def __init__(self):
+		self.inputs = []
+
+	def input(self, controller, old_state, state):
+		self.inputs.append((old_state.buttons, state.buttons, state.stick_x,
+			state.lpad_x, state.rpad_x, state.ltrig))
+
+	def schedule(self, delay, cb):
+		return cb
+
+	def cancel_task(self, task):
+		pass
+
+
+def _event(type, code, value):
+	return InputEvent(0, 0, type, code, value)
+
+
+SYN = _event(ecodes.EV_SYN, ecodes.SYN_REPORT, 0)
+
+
+class TestEvdev(object):
+	"""Tests translating evdev events to controller state."""
+
+	def test_dispatch(self):
+		"""Tests that every kind of mapping is applied once per SYN_REPORT."""
+		device, mapper = FakeDevice(), FakeMapper()
+		c = EvdevController(None, device, None, CONFIG)
+		c.set_mapper(mapper)
+		device.events = [
+			_event(ecodes.EV_ABS, ecodes.ABS_X, 255),
+			_event(ecodes.EV_KEY, ecodes.BTN_SOUTH, 1),
+			_event(ecodes.EV_KEY, ecodes.BTN_TL2, 1),
+			SYN,
+			_event(ecodes.EV_ABS, ecodes.ABS_RX, 10000),
+			_event(ecodes.EV_KEY, ecodes.BTN_DPAD_RIGHT, 1),
+			_event(ecodes.EV_ABS, ecodes.ABS_X, 128),
+		]
+		c.input()
+		assert mapper.inputs == [ (0, SCButtons.A, STICK_PAD_MAX, 0, 0, TRIGGER_MAX) ]
+		# Rest of events is applied once their SYN_REPORT arrives
+		device.events = [ SYN ]
+		c.input()
+		cal = c._calibrations[ecodes.ABS_RX]
+		dpad_cal = c._calibrations[ecodes.BTN_DPAD_RIGHT]
+		assert mapper.inputs[1] == (SCButtons.A,
+			SCButtons.A | SCButtons.LPAD | SCButtons.LPADTOUCH | SCButtons.RPADTOUCH,
+			0, calibrate(cal, 10000), int(STICK_PAD_MAX * dpad_cal.scale * STICK_PAD_MAX),
+			TRIGGER_MAX)
+		assert (c._state.buttons, c._state.lpad_x) == (mapper.inputs[1][1], mapper.inputs[1][3])
+		# Nothing is sent when nothing changed
+		device.events = [ SYN ]
+		c.input()
+		assert len(mapper.inputs) == 2
+
+
+	def test_calibration_table(self):
+		"""Tests that table gives same values as computing calibration."""
+		c = EvdevController(None, FakeDevice(), None, CONFIG)
+		entry = c._dispatch[ecodes.EV_ABS, ecodes.ABS_X]
+		cal, table, lo = entry[4], entry[2], entry[3]
+		assert table == [ calibrate(cal, x) for x in range(lo, lo + len(table)) ]
+		# Too long to be put into table
+		assert c._dispatch[ecodes.EV_ABS, ecodes.ABS_RX][2] is None
@@ -0,0 +1,60 @@
+from math import pi, sqrt, sin, cos
+
+from scc.gyro import GyroProcessor
+
+
+class TestGyro(object):
+	"""Tests computing orientation from gyro and accelerometer samples."""
+
+	def test_integrate(self):
+		"""Tests that rotation by 90 degrees around z is integrated."""
+		g = GyroProcessor()
+		for i in range(1000):
+			g.update(0, 0, pi / 2, 0, 0, 1, 0.001)
+		w, x, y, z = g.get_quaternion()
+		assert abs(w - sqrt(0.5)) < 1e-6 and abs(z - sqrt(0.5)) < 1e-6
+		assert x == y == 0
+
+
+	def test_bias(self):
+		"""Tests that resting controller doesn't turn because of gyro bias."""
+		g = GyroProcessor(learn_bias=True)
+		for i in range(5000):
+			g.update(0.01, -0.02, 0.005, 0, 0, 1, 0.001)
+		assert abs(g.bias_y + 0.02) < 1e-9
+		w, x, y, z = g.get_quaternion()
+		for i in range(5000):
+			g.update(0.01, -0.02, 0.005, 0, 0, 1, 0.001)
+		assert g.get_quaternion() == (w, x, y, z)
+
+
+	def test_slow_rotation(self):
+		"""Tests that slow rotation is not lost as bias by default."""
+		# 20 degrees at 2 degrees per second, 250 samples per second
+		rate, dt = 2 * pi / 180, 1.0 / 250
+		g = GyroProcessor()
+		for i in range(10 * 250):
+			g.update(0, 0, rate, 0, 0, 1, dt)
+		w, x, y, z = g.get_quaternion()
+		assert abs(w - cos(10 * pi / 180)) < 1e-6 and abs(z - sin(10 * pi / 180)) < 1e-6
+		assert g.bias_z == 0
+
+
+	def test_fusion(self):
+		"""Tests that accelerometer corrects tilt only if fusion is enabled."""
+		# Controller rests tilted by 90 degrees around x, gravity along y
+		for fusion in (False, True):
+			g = GyroProcessor(fusion)
+			g.update(0, 0, 0, 0, 1, 0, 0.001)
+			if fusion:
+				# Orientation is aligned to gravity on first sample
+				w, x, y, z = g.get_quaternion()
+				assert abs(w - sqrt(0.5)) < 1e-6 and abs(x - sqrt(0.5)) < 1e-6
+				g.qw, g.qx = 1.0, 0.0
+			for i in range(60000):
+				g.update(0, 0, 0, 0, 1, 0, 0.001)
+			w, x, y, z = g.get_quaternion()
+			if fusion:
+				assert abs(w - sqrt(0.5)) < 0.01 and abs(x - sqrt(0.5)) < 0.01
+			else:
+				assert (w, x, y, z) == (1, 0, 0, 0)
@@ -39,6 +39,7 @@ def input_test(fn):
 	"""Decorator that creates usable mapper."""
 	def wrapper(*a):
 		_time = time.time
+		_monotonic = time.monotonic
 
 		def fake_time():
 			return fake_time.t
@@ -47,6 +48,7 @@ def input_test(fn):
 		fake_time.t = _time()
 		fake_time.add = add
 		time.time = fake_time
+		time.monotonic = fake_time
 
 		controller = FakeController(0)
 		profile = Profile(parser)
@@ -71,6 +73,7 @@ def input_test(fn):
 			return fn(*a)
 		finally:
 			time.time = _time
+			time.monotonic = _monotonic
 	return wrapper
 
 
@@ -252,3 +255,19 @@ class TestInputs(object):
 		_state, state = state, state._replace(buttons=SCButtons.A)
 		mapper.input(mapper.controller, _state, state)
 		assert Keys["KEY_Y"] in mapper.keyboard.pressed
+
+
+	@input_test
+	def test_rebind(self, mapper: Mapper):
+		"""Test that binding action to previously unbound input is picked up by dispatch plan."""
+		state = ZERO_STATE._replace(buttons=SCButtons.X)
+		mapper.input(mapper.controller, ZERO_STATE, state)
+		mapper.input(mapper.controller, state, ZERO_STATE)
+		assert len(mapper.keyboard.pressed) == 0
+
+		mapper.profile.buttons[SCButtons.X] = (parser.restart("button(Keys.KEY_X)")).parse()
+		mapper.invalidate_plan()
+		mapper.input(mapper.controller, ZERO_STATE, state)
+		assert Keys["KEY_X"] in mapper.keyboard.pressed
+		mapper.input(mapper.controller, state, ZERO_STATE)
+		assert Keys["KEY_X"] not in mapper.keyboard.pressed
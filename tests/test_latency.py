@@ -0,0 +1,46 @@
+from scc import latency
+from scc.controller import Controller
+from scc.latency import Histogram, LatencyTracer
+
+
+class TestLatency(object):
+	"""Tests histogram used to collect latency statistics."""
+
+	def test_percentiles(self):
+		"""Tests if percentiles are reported with expected precision."""
+		h = Histogram()
+		for us in range(1, 1001):
+			h.record(us / 1000000.0)
+		assert h.count == 1000
+		assert abs(h.max - 1000) < 0.001
+		for p in (50, 90, 99):
+			assert abs(h.percentile(p) - p * 10) <= p * 10 / Histogram.SUBBUCKETS
+		assert h.percentile(100) == h.max
+		h.reset()
+		assert h.count == 0
+		assert h.percentile(50) == 0.0
+
+
+	def test_tracer(self):
+		"""Tests if tracer handles missing 'received' time."""
+		t = LatencyTracer()
+		t.record(None, 1.0, 1.001, 1.002, 1.003)
+		report = { x[0] : x for x in t.report() }
+		assert report["decode"][1] == 0
+		assert report["total"][1] == 1
+		assert 2900 <= report["total"][-1] <= 3100
+
+
+	def test_received(self, monkeypatch):
+		"""Tests if received time is kept for every controller separately."""
+		monkeypatch.setattr(latency, "enabled", True)
+		a, b = Controller(), Controller()
+		latency.mark_received(a, 1.0)
+		latency.mark_received(b, 2.0)
+		assert latency.take_received(a) == 1.0
+		assert latency.take_received(a) is None
+		latency.clear_received(b)
+		assert latency.take_received(b) is None
+		monkeypatch.setattr(latency, "enabled", False)
+		latency.mark_received(a)
+		assert latency.take_received(a) is None
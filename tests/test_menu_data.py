@@ -0,0 +1,42 @@
+import json, os
+
+from scc.menu_data import MenuData, MenuDataCache
+
+
+def _write(filename, menu, mtime):
+	with open(filename, "w") as f:
+		json.dump({ "menus" : { "Default.menu" : menu } }, f)
+	os.utime(filename, ns=(mtime, mtime))
+
+
+class TestMenuDataCache(object):
+	"""Tests menus loaded from profile through cache."""
+
+	def test_from_profile(self, tmp_path):
+		"""Tests if MenuData.from_profile is still available."""
+		filename = str(tmp_path / "test.sccprofile")
+		_write(filename, [ { "id" : "a", "name" : "A" } ], 10**18)
+		items = MenuData.from_profile(filename, "Default.menu")
+		assert [ x.id for x in items ] == [ "a" ]
+
+
+	def test_reload(self, tmp_path, monkeypatch):
+		"""Tests if file is parsed only again after its mtime changes."""
+		filename = str(tmp_path / "test.sccprofile")
+		_write(filename, [ { "id" : "a", "name" : "A" } ], 10**18)
+		loads = []
+		original = json.loads
+		monkeypatch.setattr(json, "loads", lambda s: loads.append(s) or original(s))
+		cache = MenuDataCache()
+
+		items = cache.from_profile(filename, "Default.menu")
+		assert [ x.id for x in items ] == [ "a" ]
+		items = cache.from_profile(filename, "Default.menu")
+		assert [ x.id for x in items ] == [ "a" ]
+		assert len(loads) == 1
+
+		# Same size, only mtime differs
+		_write(filename, [ { "id" : "b", "name" : "B" } ], 10**18 + 1)
+		items = cache.from_profile(filename, "Default.menu")
+		assert [ x.id for x in items ] == [ "b" ]
+		assert len(loads) == 2
@@ -0,0 +1,42 @@
+from math import cos, sin
+from math import pi as PI
+
+from scc.constants import STICK_PAD_MAX, STICK_PAD_MIN
+from scc.controller import PadRotation
+
+ANGLES = (0, 15, -15, 45, 90, -90, 135, 180, 270, 33.3)
+POSITIONS = ((0, 0), (1000, 0), (0, -1000), (12345, -6789),
+	(STICK_PAD_MAX, STICK_PAD_MAX), (STICK_PAD_MIN, STICK_PAD_MIN),
+	(STICK_PAD_MIN, STICK_PAD_MAX), (-20000, 25000))
+
+
+def old_rotate(degrees, x, y):
+	""" Rotation as drivers did it before PadRotation was added """
+	angle = float(degrees) * PI / -180.0
+	s, c = sin(angle), cos(angle)
+	return (
+		max(STICK_PAD_MIN, min(STICK_PAD_MAX, int(x * c - y * s))),
+		max(STICK_PAD_MIN, min(STICK_PAD_MAX, int(x * s + y * c))),
+	)
+
+
+class TestPadRotation(object):
+	"""Tests rotation of pad coordinates shared by Steam Controller drivers."""
+
+	def test_same_as_before(self):
+		"""Tests that rotated positions match previous per-driver code."""
+		r = PadRotation()
+		for degrees in ANGLES:
+			r.set_angle(degrees)
+			for x, y in POSITIONS:
+				assert r.rotate(x, y) == old_rotate(degrees, x, y), (degrees, x, y)
+
+
+	def test_bool(self):
+		"""Tests that rotation is skipped only when angle is zero."""
+		assert not PadRotation()
+		assert not PadRotation("0")
+		assert PadRotation(90)
+		r = PadRotation(-10)
+		r.set_angle(0.0)
+		assert not r
@@ -0,0 +1,47 @@
+from scc.parser import ActionParser, ParseError
+from token import NAME, OP, NUMBER, STRING, NEWLINE, NL, INDENT, DEDENT, COMMENT, ERRORTOKEN
+import pytest
+
+
+def lex(s):
+	return [ tuple(t) for t in ActionParser.lex(s) ]
+
+
+class TestLexer(object):
+	"""
+	Tests if lexer produces same tokens as tokenize module,
+	which ActionParser used before.
+	"""
+
+	def test_simple(self):
+		assert lex("") == []
+		assert lex("button(Keys.KEY_A)") == [
+			(NAME, "button"), (OP, "("), (NAME, "Keys"), (OP, "."),
+			(NAME, "KEY_A"), (OP, ")"), (NEWLINE, "") ]
+		assert lex("a and b;\nc") == [
+			(NAME, "a"), (NAME, "and"), (NAME, "b"), (OP, ";"),
+			(NEWLINE, "\n"), (NAME, "c"), (NEWLINE, "") ]
+
+
+	def test_newlines(self):
+		assert lex("m(A,\n B)\n") == [
+			(NAME, "m"), (OP, "("), (NAME, "A"), (OP, ","), (NL, "\n"),
+			(NAME, "B"), (OP, ")"), (NEWLINE, "\n") ]
+		assert lex("  a") == [ (INDENT, "  "), (NAME, "a"), (NEWLINE, ""), (DEDENT, "") ]
+		assert lex("# x\ny") == [ (COMMENT, "# x\ny"), (NL, "") ]
+
+
+	def test_numbers_and_strings(self):
+		assert lex("x(-1.5e3, 0x1F, 1_000, .5)")[2:-2] == [
+			(OP, "-"), (NUMBER, "1.5e3"), (OP, ","), (NUMBER, "0x1F"), (OP, ","),
+			(NUMBER, "1_000"), (OP, ","), (NUMBER, ".5") ]
+		assert lex("'a' r\"b\" '''c\nd'''")[:3] == [
+			(STRING, "'a'"), (STRING, 'r"b"'), (STRING, "'''c\nd'''") ]
+		assert lex("a <= b ** c")[1::2] == [ (OP, "<="), (OP, "**"), (NEWLINE, "") ]
+		assert lex("r'x $")[:3] == [ (NAME, "r"), (ERRORTOKEN, "'"), (NAME, "x") ]
+
+
+	def test_errors(self):
+		for s in ("(unclosed", "closed)", "'''unterminated", "line\\\ncontinued"):
+			with pytest.raises(ParseError):
+				ActionParser.lex(s)
@@ -126,6 +126,21 @@ class TestModifiers(object):
 		assert a.action.id == Axes.ABS_X
 	
 	
+	def test_curve(self):
+		"""
+		Tests if CurveModifier is parsed
+		"""
+		# Default type
+		a = _parse_compressed("curve(3, axis(ABS_X))")
+		assert isinstance(a, CurveModifier)
+		assert a.type == POWER and a.params == [ 3.0 ]
+		assert isinstance(a.action, AxisAction)
+		# Points
+		a = _parse_compressed("curve(POINTS, 0.25, 0.1, 0.75, 0.9, axis(ABS_X))")
+		assert a.type == POINTS and a.params == [ 0.25, 0.1, 0.75, 0.9 ]
+		assert _parses_as_itself(a)
+	
+	
 	def test_mode(self):
 		"""
 		Tests if ModeModifier is parsed
@@ -0,0 +1,116 @@
+from scc.parser import TalkingActionParser
+from scc.constants import SCButtons
+from scc.profile import Profile, ProfileCache
+import os, json, shutil, pytest
+
+PROFILE = os.path.join(os.path.dirname(__file__), "../../default_profiles/XBox Controller.sccprofile")
+
+
+@pytest.fixture(autouse=True)
+def cache_path(tmp_path, monkeypatch):
+	""" Keeps compiled profiles created by tests out of user's cache """
+	monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+
+
+class TestProfileCache(object):
+
+	def test_copies(self):
+		"""
+		Tests if every profile returned from cache is separate copy
+		with same actions.
+		"""
+		cache = ProfileCache()
+		a = cache.get(PROFILE)
+		b = cache.get(PROFILE)
+		assert a is not b
+		assert a.parser is not b.parser
+		for x, y in zip(a.get_all_actions(), b.get_all_actions()):
+			assert x is not y or not x		# NoAction is singleton
+			assert x.to_string() == y.to_string()
+
+
+	def test_reload(self, tmp_path):
+		"""
+		Tests if modified profile is parsed again and if cache is
+		limited to its size.
+		"""
+		filename = str(tmp_path / "test.sccprofile")
+		shutil.copy(PROFILE, filename)
+		cache = ProfileCache(size=1)
+		cache.get(filename)
+		key = cache._cache[filename][0]
+		with open(filename, "a") as f:
+			f.write("\n")
+		cache.get(filename)
+		assert cache._cache[filename][0] != key
+		cache.get(PROFILE)
+		assert list(cache._cache.keys()) == [ PROFILE ]
+
+
+class TestCompiledProfile(object):
+
+	def test_compiled(self, tmp_path):
+		"""
+		Tests if compiled profile is created, used when source is not
+		changed and ignored when it is.
+		"""
+		filename = str(tmp_path / "test.sccprofile")
+		shutil.copy(PROFILE, filename)
+		a = Profile(TalkingActionParser()).load(filename)
+		compiled = a._get_compiled_filename(filename)
+		assert os.path.exists(compiled)
+
+		Profile.USE_COMPILED = False
+		try:
+			b = Profile(TalkingActionParser()).load(filename)
+		finally:
+			Profile.USE_COMPILED = True
+		c = Profile(TalkingActionParser())
+		assert c._load_compiled(compiled, c._get_compiled_header(open(filename, "rb").read()))
+		for x, y in zip(b.get_all_actions(), c.get_all_actions()):
+			assert x.to_string() == y.to_string()
+		assert c.load(filename).filename == filename
+
+		with open(filename, "a") as f:
+			f.write("\n")
+		d = Profile(TalkingActionParser())
+		assert not d._load_compiled(compiled, d._get_compiled_header(open(filename, "rb").read()))
+		d.load(filename)
+		assert d._load_compiled(compiled, d._get_compiled_header(open(filename, "rb").read()))
+
+
+	def test_mode(self, tmp_path):
+		"""
+		Tests if profile using button as 'mode' condition is compiled and if
+		one that can't be compiled is not tried again.
+		"""
+		for condition, compilable in (("A", True), ("shell('true')", False)):
+			filename = str(tmp_path / "test.sccprofile")
+			with open(filename, "w") as f:
+				json.dump({ "buttons" : { "B" : { "action" :
+					"mode(%s, button(KEY_1), button(KEY_2))" % (condition,) } } }, f)
+			a = Profile(TalkingActionParser()).load(filename)
+			compiled = a._get_compiled_filename(filename)
+			header = a._get_compiled_header(open(filename, "rb").read())
+			assert os.path.exists(compiled) == compilable
+			assert (header in Profile._not_compilable) != compilable
+			b = Profile(TalkingActionParser())
+			assert b._load_compiled(compiled, header) == compilable
+			if compilable:
+				assert b.buttons[SCButtons.B].to_string() == a.buttons[SCButtons.B].to_string()
+				os.unlink(compiled)
+
+
+	def test_private(self, tmp_path):
+		""" Tests if compiled profile is ignored when others can modify it """
+		filename = str(tmp_path / "test.sccprofile")
+		shutil.copy(PROFILE, filename)
+		a = Profile(TalkingActionParser()).load(filename)
+		compiled = a._get_compiled_filename(filename)
+		header = a._get_compiled_header(open(filename, "rb").read())
+		assert a._load_compiled(compiled, header)
+		os.chmod(os.path.dirname(compiled), 0o777)
+		assert not a._load_compiled(compiled, header)
+		os.chmod(os.path.dirname(compiled), 0o700)
+		os.chmod(compiled, 0o666)
+		assert not a._load_compiled(compiled, header)
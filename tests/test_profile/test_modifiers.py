@@ -165,6 +165,17 @@ class TestModifiers(object):
 		assert _is_axis_with_value(a.action)
 	
 	
+	def test_curve(self):
+		"""
+		Tests if CurveModifier is parsed correctly from json.
+		"""
+		a = parser.from_json_data({ 'action' : "curve(SCURVE, 1.5, axis(ABS_X))" })
+		
+		assert isinstance(a, CurveModifier)
+		assert a.type == SCURVE and a.params == [ 1.5 ]
+		assert _is_axis_with_value(a.action)
+	
+	
 	def test_sens(self):
 		"""
 		Tests if SensitivityModifier is parsed correctly from json.
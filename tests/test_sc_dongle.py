@@ -0,0 +1,64 @@
+import ctypes, struct
+
+from scc.constants import SCButtons
+from scc.drivers.sc_dongle import STATUS_OFFSET, ControllerInput, SCController, SCStatus
+
+# Packet layout as it was decoded by struct.unpack before ControllerInput
+# became ctypes.Structure
+FORMAT = "<bxBxHxIBB3xhhhh4xhhhhhhhhhh16x"
+NAMES = ("type", "status", "seq", "buttons", "ltrig", "rtrig",
+	"lpad_x", "lpad_y", "rpad_x", "rpad_y",
+	"accel_x", "accel_y", "accel_z", "gpitch", "groll", "gyaw",
+	"q1", "q2", "q3", "q4")
+
+
+def packet(**values):
+	return bytearray(struct.pack(FORMAT, *[ values.get(x, 0) for x in NAMES ]))
+
+
+class FakeMapper(object):
+
+	def __init__(self):
+		self.inputs = []
+
+	def input(self, controller, old_state, state):
+		self.inputs.append((old_state, state))
+
+
+class TestSCDongle(object):
+	"""Tests decoding of Steam Controller input packets."""
+
+	def test_layout(self):
+		"""Tests that raw packet is decoded as struct.unpack used to decode it."""
+		assert struct.calcsize(FORMAT) == ctypes.sizeof(ControllerInput) == 64
+		values = dict(type=1, status=SCStatus.INPUT, seq=0xBEEF,
+			buttons=SCButtons.A | SCButtons.LPADTOUCH, ltrig=200, rtrig=255,
+			lpad_x=-32768, lpad_y=32767, rpad_x=-1, rpad_y=1000,
+			accel_x=-2, accel_y=3, accel_z=-4, gpitch=500, groll=-600,
+			gyaw=700, q1=-8000, q2=9000, q3=-10000, q4=11000)
+		data = packet(**values)
+		assert data[STATUS_OFFSET] == SCStatus.INPUT
+		c = SCController(None, 0, 0)
+		c._decode(data)
+		for name in NAMES:
+			assert getattr(c._state, name) == values[name], name
+
+
+	def test_swap(self):
+		"""Tests that previous state is kept in second buffer."""
+		c = SCController(None, 0, 0)
+		c.mapper = FakeMapper()
+		a, b = c._old_state, c._state
+		c.input(packet(status=SCStatus.INPUT, seq=1, buttons=SCButtons.A, lpad_x=100))
+		c.input(packet(status=SCStatus.INPUT, seq=2, buttons=SCButtons.B, lpad_x=-100))
+		assert len(c.mapper.inputs) == 2
+		old_state, state = c.mapper.inputs[-1]
+		# Only two buffers are ever used, so nothing is allocated per packet
+		assert old_state is a and state is b
+		assert (old_state.seq, old_state.buttons, old_state.lpad_x) == (1, SCButtons.A, 100)
+		assert (state.seq, state.buttons, state.lpad_x) == (2, SCButtons.B, -100)
+		c.input(packet(status=SCStatus.INPUT, seq=3))
+		old_state, state = c.mapper.inputs[-1]
+		assert old_state is b and state is a
+		assert (old_state.seq, state.seq) == (2, 3)
+
@@ -0,0 +1,109 @@
+import time, threading
+
+from scc.scheduler import Scheduler
+from scc.worker import MapperWorker, WorkerScheduler
+
+
+class TestScheduler(object):
+	"""Tests ordering and cancelling of scheduled tasks."""
+
+	def _run_after(self, scheduler, delay):
+		scheduler._now = time.monotonic() + delay
+		_monotonic = time.monotonic
+		time.monotonic = lambda: scheduler._now
+		try:
+			scheduler.run()
+		finally:
+			time.monotonic = _monotonic
+
+
+	def test_order(self):
+		"""Tests if tasks are executed in order of their time, not of scheduling."""
+		s = Scheduler()
+		done = []
+		s.schedule(0.3, done.append, 3)
+		s.schedule(0.1, done.append, 1)
+		s.schedule(0.2, done.append, 2)
+		s.schedule(0.1, done.append, 11)
+		self._run_after(s, 0.15)
+		assert done == [ 1, 11 ]
+		self._run_after(s, 1.0)
+		assert done == [ 1, 11, 2, 3 ]
+		assert s.next_deadline() is None
+
+
+	def test_cancel(self):
+		"""Tests if canceled task is not executed and cancelling is reported correctly."""
+		s = Scheduler()
+		done = []
+		s.schedule(0.1, done.append, 1)
+		t = s.schedule(0.2, done.append, 2)
+		s.schedule(0.3, done.append, 3)
+		assert s.cancel_task(t)
+		assert not s.cancel_task(t)
+		self._run_after(s, 1.0)
+		assert done == [ 1, 3 ]
+		assert not s.cancel_task(t)
+
+
+	def test_next_deadline(self):
+		"""Tests if next_deadline skips canceled tasks."""
+		s = Scheduler()
+		assert s.next_deadline() is None
+		first = s.schedule(0.1, lambda: None)
+		second = s.schedule(0.5, lambda: None)
+		first.cancel()
+		assert s.next_deadline() == second.time
+		s.cancel_task(second)
+		assert s.next_deadline() is None
+		assert len(s._heap) == 0
+
+
+	def test_cancel_from_callback(self):
+		"""Tests if heap compacted by callback is not left with executed tasks."""
+		s = Scheduler()
+		done = []
+		far = [ s.schedule(10.0, done.append, -1) for x in range(6) ]
+		s.schedule(0.1, lambda: [ t.cancel() for t in far ])
+		for i in range(3):
+			s.schedule(0.2, done.append, i)
+		self._run_after(s, 1.0)
+		assert done == [ 0, 1, 2 ]
+		assert s.next_deadline() is None
+		assert s._canceled == 0
+		assert len(s._heap) == 0
+
+
+	def test_worker(self):
+		"""
+		Tests if tasks scheduled and canceled from other thread, events
+		flushed by driver and calls queued by daemon are handled on worker
+		thread.
+		"""
+		class FakeMapper(object):
+			def __init__(self):
+				self.scheduler = WorkerScheduler()
+				self.feedback_sent = False
+				self.threads = []
+				self.done = threading.Event()
+			def flush_events(self):
+				self.threads.append(threading.get_ident())
+				self.done.set()
+
+		mapper = FakeMapper()
+		worker = MapperWorker(mapper, "test")
+		worker.start()
+		assert mapper.flush_events == worker.flush_events
+		tasks = [ mapper.scheduler.schedule(0, lambda: None) for i in range(100) ]
+		for task in tasks:
+			task.cancel()
+		scheduled = threading.Event()
+		mapper.scheduler.schedule(0, lambda: mapper.threads.append(
+			threading.get_ident()) or scheduled.set())
+		mapper.flush_events()
+		called = threading.Event()
+		worker.call(lambda x: mapper.threads.append(x()) or called.set(),
+			threading.get_ident)
+		assert mapper.done.wait(5) and scheduled.wait(5) and called.wait(5)
+		assert mapper.threads == [ worker.ident ] * 3
+		assert mapper.scheduler.next_deadline() is None
@@ -0,0 +1,63 @@
+import os
+
+from scc.constants import SCButtons, ControllerFlags
+from scc.drivers.evdevdrv import EvdevControllerInput
+from scc.drivers.sc_dongle import ControllerInput
+from scc.state_export import StateExporter, StateReader, SEQUENCE, SEQUENCE_OFFSET
+
+
+class TestStateExport(object):
+	"""Tests publishing controller state through memory-mapped file."""
+
+	def test_publish(self, tmp_path):
+		"""Tests that reader sees every published state."""
+		filename = str(tmp_path / "state-test")
+		exporter = StateExporter(filename, ControllerFlags.SEPARATE_STICK)
+		reader = StateReader(filename)
+		assert reader.read() is None
+		state = EvdevControllerInput(*[0] * len(EvdevControllerInput._fields))
+		exporter.publish(state._replace(buttons=SCButtons.A, stick_x=1000))
+		sequence = reader.get_sequence()
+		timestamp, s = reader.read()
+		assert (s.buttons, s.stick_x) == (SCButtons.A, 1000)
+		# Same state is not written again
+		exporter.publish(state._replace(buttons=SCButtons.A, stick_x=1000))
+		assert reader.get_sequence() == sequence
+		exporter.publish(state._replace(rtrig=255))
+		assert reader.get_sequence() != sequence
+		assert reader.read()[1].rtrig == 255
+		exporter.close()
+		assert not os.path.exists(filename)
+		reader.close()
+
+
+	def test_changed_in_place(self, tmp_path):
+		"""Tests that state changed by driver in place is written again."""
+		filename = str(tmp_path / "state-test")
+		exporter = StateExporter(filename, ControllerFlags.NONE)
+		reader = StateReader(filename)
+		state = ControllerInput()
+		exporter.publish(state)
+		sequence = reader.get_sequence()
+		state.buttons = SCButtons.B
+		exporter.publish(state)
+		assert reader.get_sequence() != sequence
+		assert reader.read()[1].buttons == SCButtons.B
+		exporter.close()
+		reader.close()
+
+
+	def test_torn_read(self, tmp_path):
+		"""Tests that state is not returned while writer is changing it."""
+		filename = str(tmp_path / "state-test")
+		exporter = StateExporter(filename, ControllerFlags.SEPARATE_STICK)
+		reader = StateReader(filename)
+		state = EvdevControllerInput(*[0] * len(EvdevControllerInput._fields))
+		exporter.publish(state)
+		# Simulates writer being interrupted in middle of update
+		SEQUENCE.pack_into(exporter._map, SEQUENCE_OFFSET, 3)
+		assert reader.read() is None
+		SEQUENCE.pack_into(exporter._map, SEQUENCE_OFFSET, 4)
+		assert reader.read() is not None
+		exporter.close()
+		reader.close()
@@ -0,0 +1,130 @@
+import math
+
+import pytest
+
+from scc.constants import SCButtons, ControllerFlags, STICKTILT
+from scc.drivers.evdevdrv import EvdevControllerInput
+from scc.drivers.sc_dongle import ControllerInput
+from scc.stream import StateEncoder, FRAME, MARKER, decode
+from scc.sccdaemon import Client, InputStream
+from scc.scheduler import Scheduler
+
+
+class FakeDaemon(object):
+
+	def __init__(self):
+		self.scheduler = Scheduler()
+		self.calls = []
+
+	def call_on_main(self, callback, *data):
+		self.calls.append((callback, data))
+
+	def run_main_calls(self):
+		calls, self.calls = self.calls, []
+		for callback, data in calls:
+			callback(*data)
+
+
+class FakeOutput(object):
+
+	def __init__(self):
+		self.written = []
+
+	def write(self, data, key=None):
+		self.written.append(bytes(data))
+		return True
+
+
+class FakeController(object):
+
+	def get_id(self):
+		return "fake0"
+
+	def get_flags(self):
+		return ControllerFlags.NONE
+
+
+class FakeMapper(object):
+
+	def __init__(self):
+		self.state = ControllerInput()
+
+	def get_controller(self):
+		return FakeController()
+
+
+class TestStream(object):
+	"""Tests encoding of controller states into binary frames."""
+
+	def test_roundtrip(self):
+		"""Tests that fields present in state are decoded back."""
+		enc = StateEncoder(3, ControllerFlags.SEPARATE_STICK)
+		state = EvdevControllerInput(*[0] * len(EvdevControllerInput._fields))
+		state = state._replace(buttons=SCButtons.A | SCButtons.RT, ltrig=200,
+			stick_x=-32768, stick_y=32767, cpad_x=1916, q4=-5)
+		frame = enc.encode(state)
+		assert len(frame) == FRAME.size
+		assert frame[0] == MARKER
+		index, decoded = decode(frame)
+		assert index == 3
+		assert decoded.buttons == SCButtons.A | SCButtons.RT
+		assert (decoded.ltrig, decoded.stick_x, decoded.stick_y) == (200, -32768, 32767)
+		assert (decoded.cpad_x, decoded.q4) == (1916, -5)
+		# Fields that EvdevControllerInput doesn't have
+		assert decoded.rstick_x == decoded.dpad_y == 0
+
+
+	def test_stick_on_lpad(self):
+		"""Tests that stick and left pad sharing same axes are separated."""
+		enc = StateEncoder(0, ControllerFlags.NONE)
+		state = ControllerInput()
+		state.lpad_x, state.lpad_y = 100, 200
+		s = decode(enc.encode(state))[1]
+		assert (s.stick_x, s.stick_y, s.lpad_x, s.lpad_y) == (100, 200, 0, 0)
+		# Pad touched while stick is still tilted
+		state.buttons = SCButtons.LPADTOUCH
+		state.lpad_x, state.lpad_y = 3000, 4000
+		s = decode(enc.encode(state))[1]
+		assert (s.stick_x, s.stick_y, s.lpad_x, s.lpad_y) == (100, 200, 3000, 4000)
+		state.buttons = SCButtons.LPADTOUCH | STICKTILT
+		state.lpad_x, state.lpad_y = 500, 600
+		s = decode(enc.encode(state))[1]
+		assert (s.stick_x, s.stick_y, s.lpad_x, s.lpad_y) == (500, 600, 3000, 4000)
+		assert s.buttons == SCButtons.LPADTOUCH
+
+
+	def test_input_stream_rate(self):
+		"""
+		Tests that invalid rate is refused and that scheduler is touched
+		only from main thread.
+		"""
+		daemon = FakeDaemon()
+		stream = InputStream(None, None, daemon, 0, ControllerFlags.NONE)
+		for rate in (math.nan, math.inf, -math.inf, 0, -1):
+			with pytest.raises(ValueError):
+				stream.start(rate)
+		assert stream.interval is None and not daemon.calls
+
+		stream.start(2000)
+		assert stream.interval == 1.0 / InputStream.MAX_RATE
+		assert stream.task is None
+		daemon.run_main_calls()
+		task = stream.task
+		assert task is not None and task._scheduler is daemon.scheduler
+
+		stream.stop()
+		assert task._scheduler is daemon.scheduler
+		daemon.run_main_calls()
+		assert stream.task is None and task._scheduler is None
+
+
+	def test_index_before_frame(self):
+		"""Tests that stream index is announced before first frame is sent."""
+		daemon, output = FakeDaemon(), FakeOutput()
+		client = Client(None, FakeMapper(), None, output)
+		client.start_stream(daemon, 100)
+		daemon.run_main_calls()
+		daemon.scheduler.run()
+		assert output.written[0] == b"Stream: 0 fake0\n"
+		assert len(output.written) == 2
+		assert decode(output.written[1])[0] == 0
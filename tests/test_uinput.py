@@ -0,0 +1,83 @@
+import ctypes, os, threading
+
+from scc.uinput import (EV_KEY, EV_SYN, EVENT_BUFFER_SIZE, SYN_REPORT,
+	InputEvent, Keys, UInput)
+
+
+class FakeDevice(object):
+	""" Records everything written to uinput device """
+
+	def __init__(self, monkeypatch):
+		self.writes = []
+		monkeypatch.setattr(os, "write", self.write)
+
+	def write(self, fd, data):
+		assert fd == 1234
+		events = (InputEvent * (len(data) // ctypes.sizeof(InputEvent))).from_buffer_copy(data)
+		self.writes.append([ (e.type, e.code, e.value) for e in events ])
+		return len(data)
+
+
+def make_uinput():
+	""" Creates UInput without touching /dev/uinput """
+	u = UInput.__new__(UInput)
+	u._lib = None
+	u._init_buffer()
+	u._fd = 1234
+	return u
+
+
+class TestUInput(object):
+	"""Tests buffering of events written to virtual devices."""
+
+	def test_single_write(self, monkeypatch):
+		"""Tests that events and SYN_REPORT are sent with single write()."""
+		device = FakeDevice(monkeypatch)
+		u = make_uinput()
+		u.keyEvent(Keys.KEY_A, 1)
+		u.keyEvent(Keys.KEY_B, 1)
+		u.keyEvent(Keys.KEY_A, 0)
+		assert device.writes == []
+		u.synEvent()
+		assert device.writes == [[
+			(EV_KEY, Keys.KEY_A, 1), (EV_KEY, Keys.KEY_B, 1),
+			(EV_KEY, Keys.KEY_A, 0), (EV_SYN, SYN_REPORT, 0),
+		]]
+		# Nothing buffered, nothing written
+		u.synEvent()
+		assert len(device.writes) == 1
+
+
+	def test_full_buffer(self, monkeypatch):
+		"""Tests that buffer is written out once it's full."""
+		device = FakeDevice(monkeypatch)
+		u = make_uinput()
+		for i in range(EVENT_BUFFER_SIZE + 2):
+			u.keyEvent(Keys.KEY_A, i % 2)
+		assert len(device.writes) == 1
+		assert len(device.writes[0]) == EVENT_BUFFER_SIZE
+		u.synEvent()
+		assert device.writes[1] == [ (EV_KEY, Keys.KEY_A, 0),
+			(EV_KEY, Keys.KEY_A, 1), (EV_SYN, SYN_REPORT, 0) ]
+
+
+	def test_threads(self, monkeypatch):
+		"""Tests that no event is lost when two threads generate them."""
+		device = FakeDevice(monkeypatch)
+		u = make_uinput()
+		def generate(key):
+			for i in range(5000):
+				u.keyEvent(key, 1)
+				u.keyEvent(key, 0)
+				u.synEvent()
+		threads = [ threading.Thread(target=generate, args=(key,))
+			for key in (Keys.KEY_A, Keys.KEY_B) ]
+		for t in threads:
+			t.start()
+		for t in threads:
+			t.join()
+		events = [ e for w in device.writes for e in w ]
+		for key in (Keys.KEY_A, Keys.KEY_B):
+			assert events.count((EV_KEY, key, 1)) == 5000
+			assert events.count((EV_KEY, key, 0)) == 5000
+		assert all(w[-1] == (EV_SYN, SYN_REPORT, 0) for w in device.writes)